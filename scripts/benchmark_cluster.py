@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+NearMeet Cluster Benchmark
+Measure message throughput of the SO_REUSEPORT server cluster as the
+number of worker processes grows.
+
+Usage:
+    python scripts/benchmark_cluster.py --workers 1 2 4 --clients 32
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import socket
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.network.admission import AdmissionController  # noqa: E402
+from src.network.cluster import ServerCluster  # noqa: E402
+from src.network.protocol import Protocol, TextMessage  # noqa: E402
+
+
+def unlimited(server):
+    """Worker setup: every benchmark connection comes from one IP at full speed"""
+    server.admission = AdmissionController(max_connections=0, max_per_ip=0,
+                                           message_rate=0, byte_rate=0)
+
+
+def load_generator(port: int, clients: int, messages: int, start_at: float, results):
+    """Client process body: send messages in lockstep with their ACK"""
+    handshake = Protocol.pack_message(Protocol.create_handshake())
+    frame = Protocol.pack_message(TextMessage(sender="bench", content="x" * 64))
+    
+    sockets = []
+    for _ in range(clients):
+        sock = socket.create_connection(("127.0.0.1", port))
+        sock.sendall(handshake)
+        sock.recv(4096)
+        sockets.append(sock)
+    
+    time.sleep(max(0, start_at - time.time()))
+    start = time.perf_counter()
+    for _ in range(messages):
+        # One frame in flight per socket, all sockets in parallel
+        for sock in sockets:
+            sock.sendall(frame)
+        for sock in sockets:
+            sock.recv(4096)
+    results.put((clients * messages, time.perf_counter() - start))
+    
+    for sock in sockets:
+        sock.close()
+
+
+def bench_workers(workers: int, engine: str, processes: int, clients: int,
+                  messages: int) -> float:
+    """Benchmark one cluster size; returns messages/s"""
+    cluster = ServerCluster(host="127.0.0.1", port=0, workers=workers, engine=engine,
+                            setup=unlimited)
+    if not cluster.start():
+        raise RuntimeError("Cluster failed to start")
+    
+    try:
+        results = multiprocessing.Queue()
+        start_at = time.time() + 1
+        generators = [
+            multiprocessing.Process(
+                target=load_generator,
+                args=(cluster.port, clients // processes, messages, start_at, results)
+            )
+            for _ in range(processes)
+        ]
+        for generator in generators:
+            generator.start()
+        
+        total, slowest = 0, 0.0
+        for _ in generators:
+            count, elapsed = results.get()
+            total += count
+            slowest = max(slowest, elapsed)
+        
+        for generator in generators:
+            generator.join()
+    finally:
+        cluster.stop()
+    
+    return total / slowest
+
+
+def main():
+    """Main benchmark function"""
+    parser = argparse.ArgumentParser(description="NearMeet cluster benchmark")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--engine", default="asyncio")
+    parser.add_argument("--processes", type=int, default=4, help="load generator processes")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--messages", type=int, default=500, help="messages per client")
+    args = parser.parse_args()
+    
+    logging.disable(logging.WARNING)
+    
+    print("\n" + "="*60)
+    print("  NearMeet Cluster Benchmark")
+    print("="*60)
+    print(f"  {args.clients} clients x {args.messages} messages, engine {args.engine}, "
+          f"{os.cpu_count()} CPUs")
+    
+    print(f"\n  {'workers':<10} {'msg/s':>12} {'speedup':>10}")
+    baseline = None
+    for workers in args.workers:
+        rate = bench_workers(workers, args.engine, args.processes, args.clients, args.messages)
+        baseline = baseline or rate
+        print(f"  {workers:<10} {rate:>12.0f} {rate / baseline:>9.2f}x")
+    
+    print("="*60 + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+NearMeet Codec Benchmark
+Compare the JSON and binary payload codecs: wire size and encode/decode
+time for TEXT, CALL and FILE messages.
+
+Usage:
+    python scripts/benchmark_codec.py --iterations 20000
+"""
+
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.network.codec import CODECS, decode_payload, encode_payload  # noqa: E402
+from src.network.protocol import CallMessage, FileMessage, TextMessage  # noqa: E402
+
+
+def sample_messages() -> dict:
+    """Representative message dicts"""
+    return {
+        "TEXT": TextMessage(sender="alice", content="Are we still on for lunch at noon?").to_dict(),
+        "CALL": CallMessage(sender="bob", call_type="video", action="initiate",
+                            target="alice").to_dict(),
+        "FILE": FileMessage(sender="carol", filename="quarterly-report.pdf", filesize=2483712,
+                            checksum="9f86d081884c7d659a2feaa0c55ad015").to_dict(),
+    }
+
+
+def per_call_us(statement, iterations: int) -> float:
+    """Best-of-3 microseconds per call"""
+    return min(timeit.repeat(statement, number=iterations, repeat=3)) / iterations * 1e6
+
+
+def main():
+    """Main benchmark function"""
+    parser = argparse.ArgumentParser(description="NearMeet codec benchmark")
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+    
+    print("\n" + "="*60)
+    print("  NearMeet Codec Benchmark")
+    print("="*60)
+    print(f"\n  {'message':<8} {'codec':<8} {'bytes':>7} {'encode us':>11} {'decode us':>11}")
+    
+    for name, data in sample_messages().items():
+        for codec in CODECS:
+            payload = encode_payload(data, codec)
+            encode = per_call_us(lambda: encode_payload(data, codec), args.iterations)
+            decode = per_call_us(lambda: decode_payload(payload), args.iterations)
+            print(f"  {name:<8} {codec:<8} {len(payload):>7} {encode:>11.2f} {decode:>11.2f}")
+    
+    print("="*60 + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+NearMeet Message Allocation Benchmark
+Compare the slotted message types with the former dataclass ones (rebuilt
+below): live allocations and bytes per TextMessage, bytes kept by the
+cached serialized form, and time to create and pack one.
+
+Usage:
+    python scripts/benchmark_messages.py --messages 20000
+"""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.network.protocol import Protocol, TextMessage  # noqa: E402
+
+
+@dataclass
+class LegacyMessage:
+    """Message structure before the slotted types"""
+    sender: str
+    timestamp: str
+    message_type: str
+    content: Dict[str, Any]
+    message_id: str = None
+
+
+@dataclass
+class LegacyTextMessage(LegacyMessage):
+    """Text message before the slotted types"""
+    def __init__(self, sender: str, content: str, message_id: str = None):
+        super().__init__(
+            sender=sender,
+            timestamp=datetime.now().isoformat(),
+            message_type="TEXT",
+            content={"text": content},
+            message_id=message_id
+        )
+
+
+def legacy_create(text: str) -> LegacyTextMessage:
+    """Create a message the former way"""
+    return LegacyTextMessage(sender="alice", content=text)
+
+
+def legacy_pack(message: LegacyTextMessage) -> bytes:
+    """Pack a message the former way"""
+    return Protocol.pack_message(json.dumps(asdict(message)).encode('utf-8'))
+
+
+def slotted_create(text: str) -> TextMessage:
+    """Create a slotted message"""
+    return TextMessage(sender="alice", content=text)
+
+
+def slotted_pack(message: TextMessage) -> bytes:
+    """Pack a slotted message"""
+    return Protocol.pack_message(message)
+
+
+def measure(create, pack, count: int) -> tuple:
+    """
+    Per message: live blocks and bytes of the created objects, bytes still
+    held after packing (cached serialized form) and microseconds to create
+    and pack
+    """
+    texts = [f"message number {i}" for i in range(count)]
+    messages = [None] * count
+    
+    tracemalloc.start()
+    blocks = sys.getallocatedblocks()
+    for index, text in enumerate(texts):
+        messages[index] = create(text)
+    live_blocks = sys.getallocatedblocks() - blocks
+    created = tracemalloc.get_traced_memory()[0]
+    for message in messages:
+        pack(message)
+    cached = tracemalloc.get_traced_memory()[0] - created
+    tracemalloc.stop()
+    
+    start = time.perf_counter()
+    for text in texts:
+        pack(create(text))
+    elapsed = time.perf_counter() - start
+    
+    return live_blocks / count, created / count, cached / count, elapsed / count * 1e6
+
+
+def main():
+    """Main benchmark function"""
+    parser = argparse.ArgumentParser(description="NearMeet message allocation benchmark")
+    parser.add_argument("--messages", type=int, default=20000)
+    args = parser.parse_args()
+    
+    print("\n" + "="*60)
+    print("  NearMeet Message Allocation Benchmark")
+    print("="*60)
+    print(f"\n  {'messages':<10} {'blocks':>7} {'bytes':>7} {'cached':>7} {'create+pack us':>15}")
+    
+    for name, create, pack in (("dataclass", legacy_create, legacy_pack),
+                               ("slotted", slotted_create, slotted_pack)):
+        blocks, created, cached, micros = measure(create, pack, args.messages)
+        print(f"  {name:<10} {blocks:>7.1f} {created:>7.0f} {cached:>7.0f} {micros:>15.2f}")
+    
+    print("="*60 + "\n")
+
+
+if __name__ == "__main__":
+    main()
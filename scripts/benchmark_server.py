@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+NearMeet Server Benchmark
+Compare the threaded and asyncio server engines: memory per idle
+connection and request/ACK throughput.
+
+Usage:
+    python scripts/benchmark_server.py --connections 1000 --messages 5000
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.network.protocol import Protocol, TextMessage  # noqa: E402
+
+
+def rss_kb(pid: int) -> int:
+    """Resident set size of a process in KB (Linux only, 0 elsewhere)"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def serve(engine: str, ready, port_value):
+    """Child process body: run a server until terminated"""
+    from src.network.admission import AdmissionController
+    from src.network.server import Server
+    
+    logging.disable(logging.WARNING)
+    # Every benchmark connection comes from one IP at full speed
+    unlimited = AdmissionController(max_connections=0, max_per_ip=0,
+                                    message_rate=0, byte_rate=0)
+    server = Server(host="127.0.0.1", port=0, engine=engine, admission=unlimited)
+    server.start()
+    port_value.value = server.port
+    ready.set()
+    while True:
+        time.sleep(1)
+
+
+def open_idle(port: int, count: int) -> list:
+    """Open idle connections that completed the handshake"""
+    handshake = Protocol.create_handshake().encode('utf-8')
+    sockets = []
+    for _ in range(count):
+        sock = socket.create_connection(("127.0.0.1", port))
+        sock.sendall(handshake)
+        sock.recv(4096)
+        sockets.append(sock)
+    return sockets
+
+
+def blast(port: int, messages: int, senders: int) -> float:
+    """Send messages in lockstep with their ACK; return messages/s"""
+    frame = Protocol.pack_message(TextMessage(sender="bench", content="x" * 64))
+    per_sender = messages // senders
+    sockets = open_idle(port, senders)
+    
+    def run(sock):
+        for _ in range(per_sender):
+            sock.sendall(frame)
+            sock.recv(4096)
+    
+    threads = [threading.Thread(target=run, args=(sock,)) for sock in sockets]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    
+    for sock in sockets:
+        sock.close()
+    return per_sender * senders / elapsed
+
+
+def bench_engine(engine: str, connections: int, messages: int, senders: int) -> dict:
+    """Benchmark one engine in a child process"""
+    ready = multiprocessing.Event()
+    port_value = multiprocessing.Value("i", 0)
+    process = multiprocessing.Process(target=serve, args=(engine, ready, port_value))
+    process.start()
+    ready.wait()
+    time.sleep(0.2)
+    
+    try:
+        base = rss_kb(process.pid)
+        idle = open_idle(port_value.value, connections)
+        time.sleep(0.5)
+        loaded = rss_kb(process.pid)
+        
+        rate = blast(port_value.value, messages, senders)
+        
+        for sock in idle:
+            sock.close()
+    finally:
+        process.terminate()
+        process.join()
+    
+    delta_mb = (loaded - base) / 1024
+    return {
+        "engine": engine,
+        "rss_delta_mb": delta_mb,
+        "conn_per_mb": connections / delta_mb if delta_mb > 0 else float("nan"),
+        "msg_per_s": rate,
+    }
+
+
+def main():
+    """Main benchmark function"""
+    parser = argparse.ArgumentParser(description="NearMeet server engine benchmark")
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--senders", type=int, default=8)
+    parser.add_argument("--engines", nargs="+", default=["threaded", "asyncio"])
+    args = parser.parse_args()
+    
+    print("\n" + "="*60)
+    print("  NearMeet Server Benchmark")
+    print("="*60)
+    print(f"  {args.connections} idle connections, {args.messages} messages, "
+          f"{args.senders} senders (pid {os.getpid()})")
+    
+    print(f"\n  {'engine':<10} {'RSS +MB':>10} {'conn/MB':>10} {'msg/s':>12}")
+    for engine in args.engines:
+        result = bench_engine(engine, args.connections, args.messages, args.senders)
+        print(f"  {result['engine']:<10} {result['rss_delta_mb']:>10.1f} "
+              f"{result['conn_per_mb']:>10.1f} {result['msg_per_s']:>12.0f}")
+    
+    print("="*60 + "\n")
+
+
+if __name__ == "__main__":
+    main()
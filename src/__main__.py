@@ -41,6 +41,13 @@ def main():
         help="Nom d'utilisateur"
     )
     
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Nombre de processus serveur partageant le port (mode serveur, sans interface)"
+    )
+    
     parser.add_argument(
         "--debug",
         action="store_true",
@@ -49,6 +56,14 @@ def main():
     
     args = parser.parse_args()
     
+    if args.mode == "server" and args.workers > 1:
+        from src.config import ServerConfig
+        from src.network.cluster import ServerCluster
+        
+        cluster = ServerCluster(host=ServerConfig.HOST, port=args.port, workers=args.workers)
+        cluster.serve_forever()
+        return
+    
     # Create and run application
     app = NearMeetApp(mode=args.mode)
     app.run()
@@ -29,9 +29,54 @@ class ServerConfig:
     HOST = os.getenv("SERVER_HOST", "0.0.0.0")
     PORT = int(os.getenv("SERVER_PORT", 5000))
     DEBUG = os.getenv("SERVER_DEBUG", "True").lower() == "true"
-    MAX_CLIENTS = 100
+    MAX_CLIENTS = 100  # listen backlog
+    MAX_CONNECTIONS = 10000  # concurrent connections (0: unlimited)
+    MAX_CLIENTS_PER_IP = 16
+    HANDSHAKE_TIMEOUT = 10  # seconds to send the handshake after connecting
+    RATE_MESSAGES = 200  # messages/s per client (0: unlimited)
+    RATE_BURST_MESSAGES = 400
+    RATE_BYTES = 8388608  # payload bytes/s per client (0: unlimited)
+    RATE_BURST_BYTES = 16777216
     BUFFER_SIZE = 4096
     TIMEOUT = 30
+    ENGINE = os.getenv("SERVER_ENGINE", "threaded")  # threaded or asyncio
+    OUTBOUND_QUEUE_SIZE = 1024  # frames per client
+    OUTBOUND_QUEUE_BYTES = 4194304  # 4MB per client
+    # Frames above this many bytes are sent as fragments interleaved with
+    # the others (0: never fragment)...
+    FRAGMENT_SIZE = 65536
+    OUTBOUND_STREAM_BYTES = 268435456  # ...holding at most 256MB per client
+    # drop_oldest, disconnect or coalesce
+    OVERFLOW_POLICY = os.getenv("SERVER_OVERFLOW_POLICY", "drop_oldest")
+    # Stop reading from a client whose outbound queue is above the high
+    # watermark until it drains below the low one (fractions of both bounds)
+    FLOW_HIGH_WATER = 0.5
+    FLOW_LOW_WATER = 0.25
+    WORKERS = int(os.getenv("SERVER_WORKERS", 1))
+    ACK_EVERY = 32  # cumulative ACK after this many frames...
+    ACK_DELAY = 0.01  # ...or this many seconds after the first unacknowledged one
+    ACK_WINDOW = 4096  # out-of-order IDs tracked above the contiguous point
+    # Sequence numbers remembered per client session to drop retransmitted
+    # duplicates, for at most this many sessions
+    DEDUP_WINDOW = 1024
+    MAX_SESSIONS = 4096
+    TIMER_TICK = 1.0  # heartbeat timer wheel resolution (seconds)
+    TIMER_SLOTS = 64
+    # Payload bytes from which frames to clients that negotiated compression
+    # are deflated (0: never compress)
+    COMPRESS_THRESHOLD = 1024
+    HANDLER_QUEUE_SIZE = 1024  # messages queued per handler worker
+    # Server handler threads (0: handlers run on the thread reading the
+    # client), and how long a client whose worker is full stops being read
+    HANDLER_WORKERS = 0
+    HANDLER_RETRY_DELAY = 0.005
+    # Share of the sends and handler runs each priority lane (control,
+    # interactive) gets while both have work waiting
+    LANE_WEIGHTS = (4, 1)
+    # Messages kept per offline user (oldest dropped beyond), forwarded on
+    # reconnect this many per batch frame
+    OFFLINE_QUEUE_SIZE = 1000
+    OFFLINE_BATCH = 64
 
 
 class ClientConfig:
@@ -39,7 +84,23 @@ class ClientConfig:
     AUTO_CONNECT = os.getenv("CLIENT_AUTO_CONNECT", "False").lower() == "true"
     TIMEOUT = int(os.getenv("CLIENT_TIMEOUT", 30))
     RECONNECT_ATTEMPTS = 5
-    RECONNECT_INTERVAL = 2
+    RECONNECT_INTERVAL = 2  # first backoff bound (seconds), doubled per attempt...
+    RECONNECT_MAX_INTERVAL = 30  # ...up to this one
+    ACK_MODE = os.getenv("CLIENT_ACK_MODE", "per_message")  # or cumulative
+    CODEC = os.getenv("CLIENT_CODEC", "json")  # or binary
+    COMPRESSION = os.getenv("CLIENT_COMPRESSION", "zlib")  # or none
+    # Coalesce messages sent within this window into one batch frame
+    # (seconds, 0: send every message immediately)...
+    COALESCE_DELAY = float(os.getenv("CLIENT_COALESCE_DELAY", 0))
+    COALESCE_MAX = 64  # ...or as soon as this many are pending
+    # Unacknowledged frames kept to retransmit after a reconnect (at most
+    # the server's DEDUP_WINDOW)
+    RETRANSMIT_WINDOW = 1024
+    REQUEST_TIMEOUT = 10  # seconds Client.request waits for the reply
+    # Frames waiting for the writer thread; sends beyond either bound fail
+    OUTBOUND_QUEUE_SIZE = 1024
+    OUTBOUND_QUEUE_BYTES = 4194304  # 4MB
+    DRAIN_TIMEOUT = 5  # seconds disconnect() waits for queued frames to be written
 
 
 class AppConfig:
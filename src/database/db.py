@@ -12,9 +12,18 @@ logger = get_logger(__name__)
 class Database:
     """SQLite database manager"""
     
-    def __init__(self, db_path: Optional[Path] = None):
-        """Initialize database"""
+    def __init__(self, db_path: Optional[Path] = None, check_same_thread: bool = True):
+        """
+        Initialize database
+        
+        Args:
+            db_path: Database file (``DatabaseConfig.PATH`` by default)
+            check_same_thread: Refuse use from other threads than the
+                creating one; pass False when the caller serializes access
+                itself (``OfflineQueue``)
+        """
         self.db_path = db_path or DatabaseConfig.PATH
+        self.check_same_thread = check_same_thread
         self.connection: Optional[sqlite3.Connection] = None
         self.init_db()
     
@@ -23,7 +32,8 @@ class Database:
         try:
             self.connection = sqlite3.connect(
                 str(self.db_path),
-                timeout=DatabaseConfig.TIMEOUT
+                timeout=DatabaseConfig.TIMEOUT,
+                check_same_thread=self.check_same_thread
             )
             self.connection.row_factory = sqlite3.Row
             self._create_tables()
@@ -93,6 +103,21 @@ class Database:
                 )
             """)
             
+            # Messages waiting for offline recipients (src.network.offline);
+            # the index serves each recipient's queue in order
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS pending_messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    recipient TEXT NOT NULL,
+                    payload BLOB NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_pending_messages_recipient
+                ON pending_messages (recipient, id)
+            """)
+            
             self.connection.commit()
             logger.info("Database tables created/verified")
         except Exception as e:
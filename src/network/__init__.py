@@ -1,3 +1,6 @@
 """Network module for NearMeet"""
 
-__all__ = ["server", "client", "protocol", "handlers", "security"]
+__all__ = ["server", "async_server", "client", "async_client", "protocol", "handlers",
+           "security", "connection", "rooms", "cluster", "heartbeat", "codec",
+           "admission", "compression", "schema", "capabilities",
+           "correlation", "executor", "lanes", "offline"]
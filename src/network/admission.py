@@ -0,0 +1,205 @@
+"""Connection admission and per-client rate limiting for the NearMeet server
+
+``AdmissionController`` decides whether a new connection is accepted
+(global and per-IP caps), closes connections that do not complete their
+handshake in time, and hands every admitted connection a ``RateLimiter``
+whose token buckets are charged before a frame is decoded. A client over
+its rate is throttled rather than dropped: the server stops reading from it
+until its buckets refill, so TCP pushes back on the sender and no
+acknowledged-or-not frame is ever silently discarded.
+"""
+
+import threading
+import time
+from typing import Optional
+
+from src.config import ServerConfig
+from src.network.heartbeat import TimerWheel
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class TokenBucket:
+    """
+    Token bucket
+    
+    Holds at most ``capacity`` tokens and refills at ``rate`` tokens per
+    second. A request larger than the capacity is allowed once the bucket
+    is full and leaves it in debt, so oversized messages are slowed down
+    rather than rejected forever.
+    """
+    
+    def __init__(self, rate: float, capacity: float):
+        """
+        Initialize bucket
+        
+        Args:
+            rate: Tokens added per second
+            capacity: Burst size
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+    
+    def consume(self, amount: float = 1, now: Optional[float] = None) -> bool:
+        """Take ``amount`` tokens if available; returns False otherwise"""
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        
+        if self.tokens < min(amount, self.capacity):
+            return False
+        self.tokens -= amount
+        return True
+    
+    def take(self, amount: float = 1, now: Optional[float] = None) -> float:
+        """
+        Take ``amount`` tokens, going into debt if needed
+        
+        Returns:
+            Seconds until the debt is paid back (0 if there was none)
+        """
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        
+        self.tokens -= amount
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+
+class RateLimiter:
+    """Messages/s and bytes/s limits of one connection (0 disables a limit)"""
+    
+    def __init__(self, message_rate: float, byte_rate: float,
+                 message_burst: float, byte_burst: float):
+        """Initialize limiter"""
+        self.messages = TokenBucket(message_rate, message_burst) if message_rate else None
+        self.bytes = TokenBucket(byte_rate, byte_burst) if byte_rate else None
+        self.limited = 0
+    
+    def throttle(self, size: int) -> float:
+        """
+        Account for one incoming frame of ``size`` bytes
+        
+        Returns:
+            Seconds to stop reading from the connection for (0: none)
+        """
+        now = time.monotonic()
+        delay = max(self.messages.take(1, now) if self.messages else 0.0,
+                    self.bytes.take(size, now) if self.bytes else 0.0)
+        if delay:
+            self.limited += 1
+        return delay
+
+
+class AdmissionController:
+    """Admission policy shared by every connection of a Server"""
+    
+    def __init__(self, max_connections: int = ServerConfig.MAX_CONNECTIONS,
+                 max_per_ip: int = ServerConfig.MAX_CLIENTS_PER_IP,
+                 handshake_timeout: float = ServerConfig.HANDSHAKE_TIMEOUT,
+                 message_rate: float = ServerConfig.RATE_MESSAGES,
+                 byte_rate: float = ServerConfig.RATE_BYTES,
+                 message_burst: float = ServerConfig.RATE_BURST_MESSAGES,
+                 byte_burst: float = ServerConfig.RATE_BURST_BYTES):
+        """
+        Initialize controller
+        
+        Args:
+            max_connections: Concurrent connections accepted (0: unlimited)
+            max_per_ip: Concurrent connections per remote IP (0: unlimited)
+            handshake_timeout: Seconds a connection has to send its
+                handshake (0: no deadline)
+            message_rate: Messages per second per connection (0: unlimited)
+            byte_rate: Payload bytes per second per connection (0: unlimited)
+            message_burst: Messages accepted in a burst
+            byte_burst: Payload bytes accepted in a burst
+        """
+        self.max_connections = max_connections
+        self.max_per_ip = max_per_ip
+        self.handshake_timeout = handshake_timeout
+        self.message_rate = message_rate
+        self.byte_rate = byte_rate
+        self.message_burst = message_burst
+        self.byte_burst = byte_burst
+        self.rejected = 0
+        self.handshake_timeouts = 0
+        self.wheel = (TimerWheel(tick=min(ServerConfig.TIMER_TICK, handshake_timeout / 4))
+                      if handshake_timeout else None)
+        self._total = 0
+        self._per_ip: dict = {}  # {ip: connection count}
+        self._lock = threading.Lock()
+    
+    @property
+    def tick_interval(self) -> Optional[float]:
+        """How often the engine should call ``tick`` (None: never)"""
+        return self.wheel.tick if self.wheel is not None else None
+    
+    def admit(self, address: tuple) -> bool:
+        """
+        Reserve a slot for a new connection
+        
+        Returns:
+            False if a cap is reached; the caller closes the socket
+        """
+        ip = address[0]
+        with self._lock:
+            if ((self.max_connections and self._total >= self.max_connections)
+                    or (self.max_per_ip and self._per_ip.get(ip, 0) >= self.max_per_ip)):
+                self.rejected += 1
+                logger.warning(f"Connection from {address} refused by admission control")
+                return False
+            
+            self._total += 1
+            self._per_ip[ip] = self._per_ip.get(ip, 0) + 1
+            return True
+    
+    def release(self, address: tuple):
+        """Free the slot of a closed connection"""
+        ip = address[0]
+        with self._lock:
+            self._total -= 1
+            count = self._per_ip.get(ip, 0) - 1
+            if count > 0:
+                self._per_ip[ip] = count
+            else:
+                self._per_ip.pop(ip, None)
+    
+    def watch(self, connection):
+        """Start the handshake deadline of an admitted connection"""
+        if self.wheel is not None:
+            self.wheel.schedule(connection, self.handshake_timeout)
+    
+    def unwatch(self, connection):
+        """Stop the handshake deadline (handshake done or connection closed)"""
+        if self.wheel is not None:
+            self.wheel.cancel(connection)
+    
+    def create_limiter(self) -> Optional[RateLimiter]:
+        """Rate limiter for a new connection, or None when unlimited"""
+        if not self.message_rate and not self.byte_rate:
+            return None
+        return RateLimiter(self.message_rate, self.byte_rate,
+                           self.message_burst, self.byte_burst)
+    
+    def tick(self, now: Optional[float] = None):
+        """Close connections whose handshake deadline passed"""
+        if self.wheel is None:
+            return
+        
+        for connection in self.wheel.advance(now):
+            if not connection.handshake_done:
+                logger.info(f"Handshake timeout, closing {connection.address}")
+                self.handshake_timeouts += 1
+                connection.close()
+    
+    def get_stats(self) -> dict:
+        """Admission counters"""
+        with self._lock:
+            return {
+                "connections": self._total,
+                "rejected": self.rejected,
+                "handshake_timeouts": self.handshake_timeouts
+            }
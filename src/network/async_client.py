@@ -0,0 +1,380 @@
+"""asyncio client for NearMeet
+
+``AsyncClient`` offers the handler API of ``Client`` on an event loop and
+rides out network drops: when the connection is lost it reconnects with
+jittered exponential backoff and resumes its session. The server drops
+what it already received and unacknowledged messages (including those sent
+while reconnecting) go out again. Messages missed in the meantime are not
+fetched by the client: those sent to its ``user`` are kept by the server's
+offline queue and forwarded on reconnection. Every connection state
+transition is reported to the state handlers.
+"""
+
+import asyncio
+import inspect
+import random
+import uuid
+from typing import Callable, Optional, Union
+
+from src.config import ClientConfig
+from src.core.enums import ConnectionStatus
+from src.network import capabilities
+from src.network.codec import CODECS, CODEC_JSON, decode_payload
+from src.network.compression import COMPRESSIONS, COMPRESSION_NONE, COMPRESSION_ZLIB
+from src.network.connection import RetransmitBuffer
+from src.network.correlation import RequestTracker
+from src.network.protocol import (
+    Protocol, FrameDecoder, Frame, Message, FRAME_ACK, ACK_MODES, ACK_PER_MESSAGE,
+    MAX_FRAME_SIZE, MESSAGE_HEADER_SIZE, READ_SIZE
+)
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def backoff_delay(attempt: int, interval: float, max_interval: float) -> float:
+    """Seconds to wait before reconnection attempt ``attempt`` (from 0), with full jitter"""
+    return random.uniform(0, min(max_interval, interval * 2 ** attempt))
+
+
+class AsyncClient:
+    """asyncio TCP client for NearMeet with automatic reconnection"""
+    
+    def __init__(self, host: str, port: int, ack_mode: str = ClientConfig.ACK_MODE,
+                 codec: str = ClientConfig.CODEC,
+                 compression: str = ClientConfig.COMPRESSION,
+                 reconnect_attempts: int = ClientConfig.RECONNECT_ATTEMPTS,
+                 reconnect_interval: float = ClientConfig.RECONNECT_INTERVAL,
+                 reconnect_max_interval: float = ClientConfig.RECONNECT_MAX_INTERVAL,
+                 user: Optional[str] = None):
+        """
+        Initialize client
+        
+        Args:
+            host: Server address
+            port: Server port
+            ack_mode: Requested acknowledgement mode (see ``Client``)
+            codec: Requested payload codec (see ``Client``)
+            compression: Requested frame compression (see ``Client``)
+            reconnect_attempts: Attempts after a drop before giving up
+                (0: retry forever)
+            reconnect_interval: Bound of the first backoff delay, doubled
+                at each attempt (seconds)
+            reconnect_max_interval: Largest backoff delay bound (seconds)
+            user: User name given to the server (see ``Client``)
+        """
+        if ack_mode not in ACK_MODES:
+            raise ValueError(f"Unknown ACK mode: {ack_mode}")
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec: {codec}")
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression: {compression}")
+        
+        self.host = host
+        self.port = port
+        self.user = user
+        self.requested_ack_mode = ack_mode
+        self.requested_codec = codec
+        self.requested_compression = compression
+        self.reconnect_attempts = reconnect_attempts
+        self.reconnect_interval = reconnect_interval
+        self.reconnect_max_interval = reconnect_max_interval
+        self.status = ConnectionStatus.DISCONNECTED
+        self.message_handlers: list[Callable] = []
+        self.state_handlers: list[Callable] = []
+        self.session = uuid.uuid4().hex  # resumed by every reconnection
+        self.unacked = RetransmitBuffer()
+        self.requests = RequestTracker()
+        self.reconnects = 0
+        self.ack_mode = ACK_PER_MESSAGE  # until the server confirms
+        self.codec = CODEC_JSON
+        self.compress_threshold = 0
+        self.fragment_size = 0
+        self.max_frame_size = MAX_FRAME_SIZE
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._decoder: Optional[FrameDecoder] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self._next_message_id = 1
+        self._next_stream_id = 1
+    
+    async def connect(self) -> bool:
+        """Connect to the server; the client then reconnects by itself until ``close()``"""
+        if self._task:
+            return self.status is ConnectionStatus.CONNECTED
+        
+        self._closing = False
+        self._set_status(ConnectionStatus.CONNECTING)
+        if not await self._open():
+            self._set_status(ConnectionStatus.ERROR)
+            return False
+        
+        self._task = asyncio.ensure_future(self._run())
+        return True
+    
+    async def close(self):
+        """Disconnect from the server and stop reconnecting"""
+        self._closing = True
+        self._close_writer()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._set_status(ConnectionStatus.DISCONNECTED)
+    
+    def is_connected(self) -> bool:
+        """Check if connected"""
+        return self.status is ConnectionStatus.CONNECTED
+    
+    async def send_message(self, message: Union[Message, dict, str]) -> bool:
+        """
+        Send a message to the server
+        
+        While reconnecting, the message is kept and sent once the session
+        is resumed; True then only means it was accepted.
+        """
+        if self.status not in (ConnectionStatus.CONNECTED, ConnectionStatus.RECONNECTING):
+            logger.warning("Not connected to server")
+            return False
+        
+        if self.unacked.full:
+            logger.warning("Too many unacknowledged messages")
+            return False
+        
+        message_id = self._next_message_id
+        packed = Protocol.pack_message(message, message_id, codec=self.codec,
+                                       compress_threshold=self.compress_threshold)
+        if (not self._fragmented(packed)
+                and len(packed) - MESSAGE_HEADER_SIZE > self.max_frame_size):
+            logger.warning(f"Message of {len(packed)} bytes exceeds the server's frame size")
+            return False
+        
+        self._next_message_id += 1
+        self.unacked.add(message_id, packed)
+        if self.status is ConnectionStatus.CONNECTED:
+            try:
+                self._write_frame(packed)
+                await self._writer.drain()
+            except (OSError, ConnectionError) as e:
+                logger.debug(f"Send interrupted, resent after reconnecting: {e}")
+        return True
+    
+    async def send_json(self, data: dict) -> bool:
+        """Send a JSON message to the server"""
+        return await self.send_message(data)
+    
+    async def request(self, message: Union[Message, dict],
+                      timeout: float = ClientConfig.REQUEST_TIMEOUT):
+        """
+        Send a message and return the server's reply (see ``Client.request``)
+        
+        Raises:
+            TimeoutError: No reply within ``timeout`` seconds
+            ConnectionError: The request could not be sent
+        """
+        data = message.to_dict() if isinstance(message, Message) else dict(message)
+        request_id, future = self.requests.register(timeout)
+        data["request_id"] = request_id
+        if not await self.send_message(data):
+            self.requests.fail(request_id, ConnectionError("Request could not be sent"))
+        return await asyncio.wrap_future(future)
+    
+    async def join_room(self, room: str) -> bool:
+        """Subscribe to a room on the server"""
+        return await self.send_message(Protocol.create_join(room))
+    
+    async def leave_room(self, room: str) -> bool:
+        """Unsubscribe from a room on the server"""
+        return await self.send_message(Protocol.create_leave(room))
+    
+    def register_message_handler(self, handler: Callable):
+        """Register a handler(message); coroutine handlers are scheduled as tasks"""
+        self.message_handlers.append(handler)
+    
+    def register_state_handler(self, handler: Callable):
+        """Register a handler(previous, status) of ``ConnectionStatus`` transitions"""
+        self.state_handlers.append(handler)
+    
+    def _set_status(self, status: ConnectionStatus):
+        """Record a state transition and report it"""
+        previous, self.status = self.status, status
+        if previous is status:
+            return
+        
+        logger.info(f"Connection {previous.value} -> {status.value}")
+        for handler in self.state_handlers:
+            try:
+                handler(previous, status)
+            except Exception as e:
+                logger.error(f"State handler error: {e}")
+    
+    async def _open(self) -> bool:
+        """Open a connection, negotiate it and resend what the server is missing"""
+        try:
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), ClientConfig.TIMEOUT
+            )
+            self._writer.write(Protocol.pack_message(self._create_handshake()))
+            self._decoder = FrameDecoder()
+            ack = await asyncio.wait_for(self._read_handshake_ack(), ClientConfig.TIMEOUT)
+        except (OSError, ConnectionError, ValueError, asyncio.TimeoutError) as e:
+            logger.error(f"Failed to connect to server: {e}")
+            self._close_writer()
+            return False
+        
+        self.ack_mode = ack.get("ack_mode", ACK_PER_MESSAGE)
+        self.codec = ack.get("codec", CODEC_JSON)
+        self.compress_threshold = (ack.get("compress_threshold", 0)
+                                   if ack.get("compression") == COMPRESSION_ZLIB else 0)
+        self.fragment_size = ack.get("fragment_size", 0)
+        self.max_frame_size = ack.get("max_frame_size", MAX_FRAME_SIZE)
+        
+        if isinstance(ack.get("resume"), int):
+            frames = self.unacked.resume(ack["resume"])
+            if frames:
+                logger.info(f"Retransmitting {len(frames)} unacknowledged messages")
+            for packed in frames:
+                self._write_frame(packed)
+        
+        logger.info(f"Connected to server at {self.host}:{self.port}")
+        self._set_status(ConnectionStatus.CONNECTED)
+        return True
+    
+    def _create_handshake(self) -> str:
+        """Handshake offering the configured options and resuming the session"""
+        compression = (self.requested_compression
+                       if self.requested_compression != COMPRESSION_NONE else None)
+        return Protocol.create_handshake(
+            ack_mode=self.requested_ack_mode,
+            codec=self.requested_codec,
+            compression=compression,
+            fragment=True,
+            session=self.session,
+            user=self.user,
+            capabilities=capabilities.offer(
+                codecs=(self.requested_codec,),
+                ack_modes=(self.requested_ack_mode,),
+                compression=(compression,) if compression else (),
+                fragment=True,
+                max_frame_size=MAX_FRAME_SIZE,
+                receive_batch=True
+            )
+        )
+    
+    async def _read_handshake_ack(self) -> dict:
+        """Read up to the server's handshake ACK, its first frame"""
+        while True:
+            data = await self._reader.read(READ_SIZE)
+            if not data:
+                raise ConnectionError("Connection closed during handshake")
+            self._decoder.feed(data)
+            
+            frames = self._decoder.frames()
+            frame = next(frames, None)
+            frames.close()  # frames after the ACK stay buffered
+            if frame is not None:
+                ack = decode_payload(frame.payload)
+                if not isinstance(ack, dict) or ack.get("type") != "ACK":
+                    raise ValueError("Expected a handshake ACK")
+                return ack
+    
+    async def _run(self):
+        """Read frames, and reconnect whenever the connection is lost"""
+        while not self._closing:
+            try:
+                for frame in Protocol.unbatch(self._decoder.frames()):
+                    self._handle_frame(frame)
+                data = await self._reader.read(READ_SIZE)
+                if data:
+                    self._decoder.feed(data)
+                    continue
+                error = "closed by server"
+            except (OSError, ConnectionError, ValueError) as e:
+                error = e
+            
+            if self._closing:
+                break
+            logger.warning(f"Connection lost: {error}")
+            self._close_writer()
+            if not await self._reconnect():
+                self._set_status(ConnectionStatus.ERROR)
+                self._task = None
+                break
+    
+    async def _reconnect(self) -> bool:
+        """Retry with jittered exponential backoff"""
+        self._set_status(ConnectionStatus.RECONNECTING)
+        attempt = 0
+        while not self._closing and (not self.reconnect_attempts
+                                     or attempt < self.reconnect_attempts):
+            await asyncio.sleep(backoff_delay(attempt, self.reconnect_interval,
+                                              self.reconnect_max_interval))
+            attempt += 1
+            if await self._open():
+                self.reconnects += 1
+                return True
+        return False
+    
+    def _handle_frame(self, frame: Frame):
+        """Process one frame from the server"""
+        if frame.frame_type == FRAME_ACK:
+            ranges = Protocol.unpack_cumulative_ack(frame.payload)
+            self.unacked.acknowledge(frame.message_id, ranges)
+            self._dispatch({"type": "ACK", "message_id": frame.message_id,
+                            "cumulative": True, "ranges": ranges})
+            return
+        
+        try:
+            message = decode_payload(frame.payload)
+        except ValueError:
+            message = str(frame.payload, 'utf-8', 'replace')
+        
+        if isinstance(message, dict):
+            message_type = message.get("type")
+            if message_type == "HEARTBEAT":
+                # Unsequenced: the server does not acknowledge heartbeats
+                self._writer.write(Protocol.pack_message(Protocol.create_heartbeat_ack(),
+                                                         codec=self.codec))
+            elif message_type == "ACK":
+                if isinstance(message.get("message_id"), int):
+                    self.unacked.acknowledge(0, ((message["message_id"],) * 2,))
+            elif "reply_to" in message and self.requests.resolve(message["reply_to"], message):
+                return
+        
+        self._dispatch(message)
+    
+    def _dispatch(self, message):
+        """Call the message handlers"""
+        logger.debug(f"Received message: {message}")
+        for handler in self.message_handlers:
+            try:
+                result = handler(message)
+                if inspect.isawaitable(result):
+                    asyncio.ensure_future(result)
+            except Exception as e:
+                logger.error(f"Handler error: {e}")
+    
+    def _fragmented(self, packed: bytes) -> bool:
+        """Whether a frame is sent as fragments"""
+        return bool(self.fragment_size) and len(packed) > self.fragment_size
+    
+    def _write_frame(self, packed: bytes):
+        """Write a packed frame, as fragments if it is large"""
+        if not self._fragmented(packed):
+            self._writer.write(packed)
+            return
+        
+        stream_id = self._next_stream_id
+        self._next_stream_id = self._next_stream_id % 0xFFFF + 1
+        for fragment in Protocol.fragment(packed, self.fragment_size, stream_id):
+            self._writer.write(fragment)
+    
+    def _close_writer(self):
+        """Close the current transport, if any"""
+        if self._writer:
+            self._writer.close()
+            self._writer = None
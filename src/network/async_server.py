@@ -0,0 +1,272 @@
+"""asyncio engine for the NearMeet server
+
+A single event loop running in one background thread owns every client
+connection, so idle LAN clients cost a transport and a small protocol
+object instead of a dedicated OS thread and its stack.
+"""
+
+import asyncio
+import threading
+from typing import Callable, Optional
+
+from src.config import ServerConfig
+from src.network.connection import Connection, MAX_WRITE_BATCH
+from src.network.protocol import FrameDecoder
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class TransportConnection(Connection):
+    """
+    Client connection of the asyncio engine
+    
+    Frames are queued by ``send`` (from any thread) and moved to the
+    transport by an event-loop callback, which stops while the transport
+    reports its write buffer as full (``pause_writing``). The queue bound
+    and overflow policy then apply exactly as with the threaded engine.
+    """
+    
+    def __init__(self, loop: asyncio.AbstractEventLoop, transport: asyncio.Transport,
+                 address: tuple, policy: str = ServerConfig.OVERFLOW_POLICY):
+        """Initialize connection"""
+        super().__init__(address, policy)
+        self.loop = loop
+        self.transport = transport
+        self.paused = False
+        self.on_resume_reading: Optional[Callable[[], None]] = None
+        self._drain_scheduled = False
+        self._loop_thread = threading.get_ident()
+    
+    def _wake_writer(self):
+        """Drain now on the loop thread, or schedule a drain from elsewhere"""
+        if threading.get_ident() == self._loop_thread:
+            self._drain()
+        elif not self._drain_scheduled and not self.loop.is_closed():
+            self._drain_scheduled = True
+            self.loop.call_soon_threadsafe(self._drain)
+    
+    def close(self):
+        """Drop the client, discarding unsent data a stalled peer would never drain"""
+        self.queue.close()
+        if self.loop.is_closed():
+            return
+        if threading.get_ident() == self._loop_thread:
+            self.transport.abort()
+        else:
+            self.loop.call_soon_threadsafe(self.transport.abort)
+    
+    def _set_reading(self, reading: bool):
+        """Pause or resume the transport's reads (on the loop thread)"""
+        if threading.get_ident() != self._loop_thread:
+            if not self.loop.is_closed():
+                self.loop.call_soon_threadsafe(self._on_saturation)
+            return
+        
+        if self.transport.is_closing():
+            return
+        if reading:
+            self.transport.resume_reading()
+            if self.on_resume_reading:
+                # Frames may already be buffered; handle them outside the
+                # flow lock since they can saturate the queue again
+                self.loop.call_soon(self.on_resume_reading)
+        else:
+            self.transport.pause_reading()
+    
+    def _schedule_resume(self, delay: float):
+        """Re-evaluate reading on the loop once the rate-limit pause ends"""
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.loop.call_later, delay, self._end_throttle)
+    
+    def _end_throttle(self):
+        """Rate-limit pause over (the loop clock may fire a hair early)"""
+        self.throttled_until = 0.0
+        self._on_saturation()
+    
+    def pause_writing(self):
+        """Transport buffer is above its high-water mark"""
+        self.paused = True
+    
+    def resume_writing(self):
+        """Transport buffer drained below its low-water mark"""
+        self.paused = False
+        self._drain()
+    
+    def _drain(self):
+        """Move queued frames to the transport (event loop thread)"""
+        self._drain_scheduled = False
+        while not self.paused and not self.transport.is_closing():
+            frames = self.queue.get_many(MAX_WRITE_BATCH)
+            if not frames:
+                break
+            self.transport.writelines(frames)
+            self._frames_written()
+
+
+class ServerProtocol(asyncio.BufferedProtocol):
+    """Per-connection protocol reading straight into a FrameDecoder"""
+    
+    def __init__(self, server):
+        """Initialize protocol"""
+        self.server = server
+        self.decoder = FrameDecoder(read_size=ServerConfig.BUFFER_SIZE, legacy_handshake=True)
+        self.ack_timer: Optional[asyncio.TimerHandle] = None
+        self.transport: Optional[asyncio.Transport] = None
+        self.connection: Optional[TransportConnection] = None
+        self.client_address = None
+    
+    def connection_made(self, transport: asyncio.Transport):
+        """Register the new client"""
+        self.transport = transport
+        self.client_address = transport.get_extra_info("peername")
+        if not self.server.admission.admit(self.client_address):
+            transport.close()
+            return
+        
+        self.connection = TransportConnection(
+            asyncio.get_running_loop(), transport, self.client_address,
+            self.server.overflow_policy
+        )
+        self.connection.on_resume_reading = self._process_frames
+        logger.info(f"New connection from {self.client_address}")
+        
+        self.server._add_client(self.client_address, self.connection)
+    
+    def get_buffer(self, sizehint: int) -> memoryview:
+        """Hand the event loop the decoder's free space"""
+        return self.decoder.get_buffer(sizehint)
+    
+    def buffer_updated(self, nbytes: int):
+        """Process every frame completed by the last read"""
+        self.decoder.buffer_updated(nbytes)
+        self.connection.touch()
+        self._process_frames()
+    
+    def _process_frames(self):
+        """Handle buffered frames until done or paused by flow control"""
+        if self.transport.is_closing():
+            return
+        
+        try:
+            self.server._handle_frames(self.connection, self.decoder)
+        
+        except Exception as e:
+            logger.error(f"Error handling client {self.client_address}: {e}")
+            self.transport.close()
+            return
+        
+        tracker = self.connection.ack_tracker
+        if tracker and tracker.pending and self.ack_timer is None:
+            self.ack_timer = asyncio.get_running_loop().call_later(
+                ServerConfig.ACK_DELAY, self._flush_acks
+            )
+    
+    def _flush_acks(self):
+        """Send the delayed cumulative ACK"""
+        self.ack_timer = None
+        self.server._flush_acks(self.connection)
+    
+    def pause_writing(self):
+        """Stop draining the outbound queue"""
+        self.connection.pause_writing()
+    
+    def resume_writing(self):
+        """Resume draining the outbound queue"""
+        self.connection.resume_writing()
+    
+    def connection_lost(self, exc: Optional[Exception]):
+        """Remove the client"""
+        if self.connection is None:
+            return  # refused by admission control
+        if self.ack_timer:
+            self.ack_timer.cancel()
+        self.connection.queue.close()
+        self.server._remove_client(self.client_address, self.connection)
+        
+        logger.info(f"Client disconnected: {self.client_address}")
+
+
+class AsyncioEngine:
+    """Runs a Server's connections on an asyncio event loop"""
+    
+    def __init__(self, server):
+        """
+        Initialize engine
+        
+        Args:
+            server: Owning Server (handlers, client table, lock)
+        """
+        self.server = server
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread: Optional[threading.Thread] = None
+        self._listener: Optional[asyncio.AbstractServer] = None
+        self._started = threading.Event()
+        self._error: Optional[BaseException] = None
+    
+    def start(self) -> int:
+        """
+        Start the event loop thread and bind the listening socket
+        
+        Returns:
+            The bound port
+        """
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        self._started.wait()
+        
+        if self._error:
+            raise self._error
+        
+        return self._listener.sockets[0].getsockname()[1]
+    
+    def stop(self):
+        """Stop the event loop and wait for the thread to exit"""
+        if self.loop and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if self.thread:
+            self.thread.join(timeout=5)
+    
+    def _timer_tick(self):
+        """Drive the server's timer wheels from the event loop"""
+        self.server._run_timers()
+        self.loop.call_later(self.server.timer_interval, self._timer_tick)
+    
+    def _run(self):
+        """Event loop thread body"""
+        asyncio.set_event_loop(self.loop)
+        
+        try:
+            self._listener = self.loop.run_until_complete(
+                self.loop.create_server(
+                    lambda: ServerProtocol(self.server),
+                    self.server.host,
+                    self.server.port,
+                    reuse_address=True,
+                    reuse_port=self.server.reuse_port or None,
+                    backlog=ServerConfig.MAX_CLIENTS
+                )
+            )
+        except Exception as e:
+            self._error = e
+            self._started.set()
+            self.loop.close()
+            return
+        
+        self._started.set()
+        
+        if self.server.timer_interval:
+            self.loop.call_later(self.server.timer_interval, self._timer_tick)
+        
+        try:
+            self.loop.run_forever()
+        finally:
+            self._listener.close()
+            tasks = asyncio.all_tasks(self.loop)
+            for task in tasks:
+                task.cancel()
+            self.loop.run_until_complete(
+                asyncio.gather(*tasks, return_exceptions=True)
+            )
+            self.loop.close()
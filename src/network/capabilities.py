@@ -0,0 +1,119 @@
+"""Capability negotiation for the NearMeet handshake
+
+A client lists in its handshake, under ``capabilities``, every option it
+can use for each capability. The server intersects each list with what it
+supports and keeps the fastest option of the intersection according to
+the fixed ranking in ``RANKING``, so both sides can predict the outcome
+and a new, faster option only needs a new entry at the front of its
+ranking to roll out.
+
+Peers that know nothing of a capability fall back to its default. Older
+clients send no ``capabilities`` but the single-option fields of earlier
+handshakes (``codec``, ``ack_mode``...), which are read as one-option
+lists; new clients send both so older servers still honour them.
+"""
+
+from src.network.codec import CODEC_BINARY, CODEC_JSON
+from src.network.compression import COMPRESSION_NONE, COMPRESSION_ZLIB
+from src.network.protocol import ACK_CUMULATIVE, ACK_PER_MESSAGE, MAX_FRAME_SIZE
+
+ENCRYPTION_NONE = "none"
+
+# Options of each list capability, fastest first. The C-accelerated JSON
+# codec costs less CPU than the pure-Python binary one; binary is only
+# chosen for clients that offer nothing else.
+RANKING = {
+    "codecs": (CODEC_JSON, CODEC_BINARY),
+    "ack_modes": (ACK_CUMULATIVE, ACK_PER_MESSAGE),
+    "compression": (COMPRESSION_ZLIB, COMPRESSION_NONE),
+    "encryption": (ENCRYPTION_NONE,),  # no transport cipher suite yet
+}
+
+# What a peer that does not negotiate gets
+DEFAULTS = {
+    "codec": CODEC_JSON,
+    "ack_mode": ACK_PER_MESSAGE,
+    "compression": COMPRESSION_NONE,
+    "encryption": ENCRYPTION_NONE,
+}
+
+# Singular keys of the selection for each list capability
+SELECTED_KEYS = {
+    "codecs": "codec",
+    "ack_modes": "ack_mode",
+    "compression": "compression",
+    "encryption": "encryption",
+}
+
+
+def offer(codecs=(CODEC_JSON,), ack_modes=(ACK_PER_MESSAGE,), compression=(),
+          encryption=(), batch: bool = False, fragment: bool = False,
+          max_frame_size: int = MAX_FRAME_SIZE, receive_batch: bool = False) -> dict:
+    """
+    Capabilities of one side, in handshake form
+    
+    ``batch``: the client sends batch frames; ``receive_batch``: it reads
+    the server's (and, server side, the server sends them).
+    """
+    return {
+        "codecs": list(codecs),
+        "ack_modes": list(ack_modes),
+        "compression": list(compression),
+        "encryption": list(encryption),
+        "batch": batch,
+        "fragment": fragment,
+        "max_frame_size": max_frame_size,
+        "receive_batch": receive_batch,
+    }
+
+
+def from_handshake(message: dict) -> dict:
+    """Capabilities offered by a handshake, older single-option fields included"""
+    offered = message.get("capabilities")
+    if isinstance(offered, dict):
+        return offered
+    
+    return {
+        "codecs": [message["codec"]] if "codec" in message else [],
+        "ack_modes": [message["ack_mode"]] if "ack_mode" in message else [],
+        "compression": [message["compression"]] if "compression" in message else [],
+        "batch": message.get("batch") is True,
+        "fragment": message.get("fragment") is True,
+    }
+
+
+def select(offered: dict, supported: dict) -> dict:
+    """
+    Pick the fastest mutually supported option of every capability
+    
+    Args:
+        offered: Capabilities of the client (``from_handshake``)
+        supported: Capabilities of the server (``offer``)
+    
+    Returns:
+        {codec, ack_mode, compression, encryption, batch, fragment,
+        max_frame_size, receive_batch}
+    """
+    selected = {}
+    for capability, ranking in RANKING.items():
+        key = SELECTED_KEYS[capability]
+        options = offered.get(capability)
+        if not isinstance(options, list):
+            options = []
+        
+        selected[key] = next(
+            (option for option in ranking
+             if option in options and option in supported[capability]),
+            DEFAULTS[key]
+        )
+    
+    selected["batch"] = offered.get("batch") is True and supported["batch"]
+    selected["fragment"] = offered.get("fragment") is True and supported["fragment"]
+    selected["receive_batch"] = (offered.get("receive_batch") is True
+                                 and supported["receive_batch"])
+    
+    max_frame_size = offered.get("max_frame_size")
+    if not isinstance(max_frame_size, int) or max_frame_size <= 0:
+        max_frame_size = supported["max_frame_size"]
+    selected["max_frame_size"] = min(max_frame_size, supported["max_frame_size"])
+    return selected
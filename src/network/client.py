@@ -2,27 +2,97 @@
 
 import socket
 import threading
-import json
-from typing import Callable, Optional
+import time
+import uuid
+from concurrent.futures import Future
+from typing import Callable, Optional, Union
 
 from src.config import ClientConfig
-from src.network.protocol import Protocol
+from src.network import capabilities
+from src.network.codec import CODECS, CODEC_JSON, decode_payload
+from src.network.compression import COMPRESSIONS, COMPRESSION_NONE, COMPRESSION_ZLIB
+from src.network.connection import MAX_WRITE_BATCH, OutboundQueue, RetransmitBuffer, send_frames
+from src.network.correlation import RequestTracker
+from src.network.lanes import LANE_CONTROL, LANE_INTERACTIVE, message_lane
+from src.network.protocol import (
+    Protocol, FrameDecoder, Message, FRAME_ACK, ACK_MODES, ACK_PER_MESSAGE,
+    MAX_FRAME_SIZE, MESSAGE_HEADER_SIZE
+)
 from src.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
 
 class Client:
-    """TCP/IP Client for NearMeet"""
+    """
+    TCP/IP Client for NearMeet
     
-    def __init__(self, host: str, port: int):
-        """Initialize client"""
+    Sending never touches the socket: frames go to an outbound queue
+    drained by a writer thread, so a UI thread calling ``send_message`` or
+    ``submit`` does not block on a slow network.
+    """
+    
+    def __init__(self, host: str, port: int, ack_mode: str = ClientConfig.ACK_MODE,
+                 codec: str = ClientConfig.CODEC,
+                 compression: str = ClientConfig.COMPRESSION,
+                 coalesce_delay: float = ClientConfig.COALESCE_DELAY,
+                 coalesce_max: int = ClientConfig.COALESCE_MAX,
+                 user: Optional[str] = None):
+        """
+        Initialize client
+        
+        Args:
+            host: Server address
+            port: Server port
+            ack_mode: Requested acknowledgement mode, 'per_message' (one
+                JSON ACK per message) or 'cumulative' (compact binary ACKs
+                covering many messages)
+            codec: Requested payload codec for dicts and messages, 'json'
+                or 'binary' (compact, see ``src.network.codec``)
+            compression: Requested frame compression, 'zlib' (large
+                payloads are deflated above the server's threshold) or 'none'
+            coalesce_delay: Seconds messages may wait to be sent together
+                in one batch frame (0: send each message immediately)
+            coalesce_max: Pending messages that flush a batch at once
+            user: User name given to the server, which then forwards the
+                messages stored for it while offline
+        """
+        if ack_mode not in ACK_MODES:
+            raise ValueError(f"Unknown ACK mode: {ack_mode}")
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec: {codec}")
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression: {compression}")
+        
         self.host = host
         self.port = port
+        self.user = user
         self.socket: Optional[socket.socket] = None
         self.connected = False
         self.message_handlers: list[Callable] = []
         self.receive_thread: Optional[threading.Thread] = None
+        self.requested_ack_mode = ack_mode
+        self.ack_mode = ACK_PER_MESSAGE  # until the server confirms
+        self.requested_codec = codec
+        self.codec = CODEC_JSON  # until the server confirms
+        self.requested_compression = compression
+        self.compress_threshold = 0  # until the server confirms
+        self.coalesce_delay = coalesce_delay
+        self.coalesce_max = coalesce_max
+        self.batching = False  # until the server confirms
+        self.batches_sent = 0
+        self.fragment_size = 0  # until the server confirms
+        self.max_frame_size = MAX_FRAME_SIZE  # until the server confirms
+        self.outbound: Optional[OutboundQueue] = None  # one per connection
+        self.writer_thread: Optional[threading.Thread] = None
+        self._next_message_id = 1
+        self._id_lock = threading.Lock()
+        self._batch_cond = threading.Condition()
+        self._pending: list = []  # (message ID, packed frame) waiting for the next batch
+        self._pending_since = 0.0
+        self.session = uuid.uuid4().hex  # lets the server deduplicate across reconnects
+        self.unacked = RetransmitBuffer()
+        self.requests = RequestTracker()  # replies awaited by request()
     
     def connect(self) -> bool:
         """Connect to server"""
@@ -35,8 +105,34 @@ class Client:
             logger.info(f"Connected to server at {self.host}:{self.port}")
             
             # Send handshake
-            handshake = Protocol.create_handshake()
-            self.socket.sendall(handshake.encode('utf-8'))
+            compression = (self.requested_compression
+                           if self.requested_compression != COMPRESSION_NONE else None)
+            handshake = Protocol.create_handshake(
+                ack_mode=self.requested_ack_mode,
+                codec=self.requested_codec,
+                compression=compression,
+                batch=self.coalesce_delay > 0,
+                fragment=True,
+                session=self.session,
+                user=self.user,
+                capabilities=capabilities.offer(
+                    codecs=(self.requested_codec,),
+                    ack_modes=(self.requested_ack_mode,),
+                    compression=(compression,) if compression else (),
+                    batch=self.coalesce_delay > 0,
+                    fragment=True,
+                    max_frame_size=MAX_FRAME_SIZE,
+                    receive_batch=True
+                )
+            )
+            self.socket.sendall(Protocol.pack_message(handshake.encode('utf-8')))
+            
+            self.outbound = OutboundQueue(max_frames=ClientConfig.OUTBOUND_QUEUE_SIZE,
+                                          max_bytes=ClientConfig.OUTBOUND_QUEUE_BYTES,
+                                          policy="reject")
+            self.writer_thread = threading.Thread(target=self._write_loop,
+                                                  args=(self.socket, self.outbound), daemon=True)
+            self.writer_thread.start()
             
             # Start receiving messages in a separate thread
             self.receive_thread = threading.Thread(
@@ -44,74 +140,290 @@ class Client:
                 daemon=True
             )
             self.receive_thread.start()
+            if self.coalesce_delay > 0:
+                threading.Thread(target=self._coalesce_loop, daemon=True).start()
             
             return True
-            
+        
         except Exception as e:
             logger.error(f"Failed to connect to server: {e}")
             return False
     
     def disconnect(self):
-        """Disconnect from server"""
+        """Disconnect from server, once the queued frames are written"""
         try:
+            if self.connected:
+                self._flush_pending()
+                self.outbound.close(drain=True)
+                self.writer_thread.join(ClientConfig.DRAIN_TIMEOUT)
             self.connected = False
+            with self._batch_cond:
+                self._batch_cond.notify()
             if self.socket:
                 self.socket.close()
             logger.info("Disconnected from server")
         except Exception as e:
             logger.error(f"Error disconnecting: {e}")
     
-    def send_message(self, message: str) -> bool:
-        """Send a message to the server"""
+    def send_message(self, message: Union[Message, dict, str]) -> bool:
+        """
+        Queue a message for the server without blocking
+        
+        Returns:
+            False if it could not be queued; use ``submit`` to learn
+            whether and when it was delivered
+        """
+        delivery = self.submit(message)
+        return not delivery.done() or delivery.exception() is None
+    
+    def submit(self, message: Union[Message, dict, str]) -> Future:
+        """
+        Queue a message for the writer thread and return its delivery future
+        
+        Dicts and messages use the negotiated codec. Once the server
+        accepted batch frames, the message waits for the next batch, except
+        control messages (call signalling, heartbeats...). Messages larger
+        than the negotiated fragment size are sent as fragments, letting
+        other messages through in between.
+        
+        Messages stay buffered until acknowledged, and those still
+        unacknowledged when the connection drops are sent again after
+        ``connect()``; the server drops the ones it already received.
+        
+        Returns:
+            Future completed with the message ID once the server
+            acknowledged it. It fails with ``ConnectionError`` when not
+            connected, with ``BufferError`` when ``RETRANSMIT_WINDOW``
+            messages are already unacknowledged or the outbound queue is
+            full, and with ``ValueError`` when the message is larger than
+            the server accepts. A message once accepted is never failed
+            to make room for another.
+        """
+        delivery: Future = Future()
+        delivery.set_running_or_notify_cancel()
+        if not self.connected or self.outbound is None:
+            logger.warning("Not connected to server")
+            delivery.set_exception(ConnectionError("Not connected to server"))
+            return delivery
+        
         try:
-            if not self.connected or not self.socket:
-                logger.warning("Not connected to server")
-                return False
+            with self._id_lock:
+                # Only a message entering the window takes an ID: a gap in
+                # the sequence would hold back the server's cumulative ACKs
+                if self.unacked.full:
+                    raise BufferError("Retransmit window full")
+                message_id = self._next_message_id
+                packed = Protocol.pack_message(message, message_id, codec=self.codec,
+                                               compress_threshold=self.compress_threshold)
+                fragmented = self.fragment_size and len(packed) > self.fragment_size
+                if not fragmented and len(packed) - MESSAGE_HEADER_SIZE > self.max_frame_size:
+                    raise ValueError(f"Message of {len(packed)} bytes is too large")
+                self.unacked.add(message_id, packed, delivery)
+                self._next_message_id += 1
+        except Exception as e:
+            logger.warning(f"Message not sent: {e}")
+            delivery.set_exception(e)
+            return delivery
+        
+        lane = message_lane(message)
+        if self.batching and not fragmented and lane != LANE_CONTROL:
+            self._queue_frame(message_id, packed)
+        elif not self._send_frame(packed, lane):
+            self.unacked.discard(message_id, BufferError("Outbound queue full"))
+        return delivery
+    
+    def _send_frame(self, packed: bytes, lane: int = LANE_INTERACTIVE) -> bool:
+        """Queue a packed frame for the writer (as fragments if it is large)"""
+        outbound = self.outbound
+        return outbound is not None and outbound.put(packed, lane=lane)
+    
+    def _write_loop(self, sock: socket.socket, outbound: OutboundQueue):
+        """Writer thread body: write the queued frames of one connection"""
+        while True:
+            data = outbound.get()
+            if data is None:
+                break
             
-            packed = Protocol.pack_message(message.encode('utf-8'))
-            self.socket.sendall(packed)
-            return True
+            frames = [data]
+            frames.extend(outbound.get_many(MAX_WRITE_BATCH - 1))
             
-        except Exception as e:
-            logger.error(f"Error sending message: {e}")
-            return False
+            try:
+                send_frames(sock, frames)
+            except OSError as e:
+                if self.connected:
+                    logger.error(f"Error sending message: {e}")
+                outbound.close()
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)  # ends the receive thread too
+                except OSError:
+                    pass
+                break
+    
+    def _retransmit(self, received: int):
+        """Resend the frames the server has not received, oldest first"""
+        frames = self.unacked.resume(received)
+        if frames:
+            logger.info(f"Retransmitting {len(frames)} unacknowledged messages")
+        for packed in frames:
+            self._send_frame(packed)
+    
+    def _queue_frame(self, message_id: int, packed: bytes):
+        """Add a frame to the pending batch, flushing it once full"""
+        with self._batch_cond:
+            self._pending.append((message_id, packed))
+            if len(self._pending) == 1:
+                self._pending_since = time.monotonic()
+                self._batch_cond.notify()
+            full = len(self._pending) >= self.coalesce_max
+        
+        if full:
+            self._flush_pending()
+    
+    def _flush_pending(self):
+        """Queue the pending frames as one batch"""
+        # Taken and queued under one lock, so concurrent flushes (a full
+        # batch, the coalescing timer) cannot queue batches out of order
+        with self._batch_cond:
+            pending, self._pending = self._pending, []
+            if not pending:
+                return
+            
+            batch = Protocol.pack_batch([packed for _, packed in pending],
+                                        self.compress_threshold)
+            queued = self._send_frame(batch)
+        
+        if not queued:
+            for message_id, _ in pending:
+                self.unacked.discard(message_id, BufferError("Outbound queue full"))
+        elif len(pending) > 1:
+            self.batches_sent += 1
+    
+    def _coalesce_loop(self):
+        """Flush the pending batch when its coalescing window ends"""
+        while self.connected:
+            with self._batch_cond:
+                if not self._pending:
+                    self._batch_cond.wait()
+                    continue
+                
+                remaining = self._pending_since + self.coalesce_delay - time.monotonic()
+                if remaining > 0:
+                    self._batch_cond.wait(remaining)
+                    continue
+            
+            try:
+                self._flush_pending()
+            except Exception as e:
+                if self.connected:
+                    logger.error(f"Error sending batch: {e}")
+                break
     
     def send_json(self, data: dict) -> bool:
         """Send a JSON message to the server"""
         try:
-            json_str = json.dumps(data)
-            return self.send_message(json_str)
+            return self.send_message(data)
         except Exception as e:
             logger.error(f"Error sending JSON: {e}")
             return False
     
+    def request(self, message: Union[Message, dict],
+                timeout: float = ClientConfig.REQUEST_TIMEOUT) -> Future:
+        """
+        Send a message and return a future of the server's reply
+        
+        The message is sent with a ``request_id`` that the reply echoes in
+        ``reply_to`` (see ``Server.reply``); requests are pipelined, any
+        number may be in flight. The future is completed in the receive
+        thread, or fails with ``TimeoutError`` after ``timeout`` seconds,
+        or with ``ConnectionError`` if the request could not be delivered.
+        Replies completing a future are not passed to the message handlers.
+        """
+        data = message.to_dict() if isinstance(message, Message) else dict(message)
+        request_id, future = self.requests.register(timeout)
+        data["request_id"] = request_id
+        
+        def on_delivery(delivery: Future):
+            if delivery.exception():
+                self.requests.fail(request_id, ConnectionError(
+                    f"Request could not be sent: {delivery.exception()}"))
+        
+        self.submit(data).add_done_callback(on_delivery)
+        return future
+    
+    def join_room(self, room: str) -> bool:
+        """Subscribe to a room on the server"""
+        return self.send_message(Protocol.create_join(room))
+    
+    def leave_room(self, room: str) -> bool:
+        """Unsubscribe from a room on the server"""
+        return self.send_message(Protocol.create_leave(room))
+    
     def _receive_messages(self):
-        """Receive messages from server"""
+        """
+        Receive messages from server
+        
+        Messages are handled in arrival order, as on the server: the
+        server's outbound lanes already put control frames ahead on the wire.
+        """
+        decoder = FrameDecoder()
+        outbound = self.outbound  # of this connection, even after a reconnect
+        
         while self.connected:
             try:
-                # Read header
-                header = self.socket.recv(20)
-                if not header:
+                nbytes = self.socket.recv_into(decoder.get_buffer())
+                if not nbytes:
                     break
+                decoder.buffer_updated(nbytes)
                 
-                # Unpack message
-                msg_id, payload = Protocol.unpack_message(header + b'')
-                
-                # Try to decode as JSON
-                try:
-                    message = json.loads(payload.decode('utf-8'))
-                except:
-                    message = payload.decode('utf-8')
-                
-                logger.debug(f"Received message: {message}")
-                
-                # Call registered handlers
-                for handler in self.message_handlers:
-                    try:
-                        handler(message)
-                    except Exception as e:
-                        logger.error(f"Handler error: {e}")
+                for frame in Protocol.unbatch(decoder.frames()):
+                    if frame.frame_type == FRAME_ACK:
+                        message = {
+                            "type": "ACK",
+                            "message_id": frame.message_id,
+                            "cumulative": True,
+                            "ranges": Protocol.unpack_cumulative_ack(frame.payload)
+                        }
+                        self.unacked.acknowledge(frame.message_id, message["ranges"])
+                    else:
+                        # Try to decode as JSON or binary, else plain text
+                        try:
+                            message = decode_payload(frame.payload)
+                        except ValueError:
+                            message = str(frame.payload, 'utf-8', 'replace')
                         
+                        if isinstance(message, dict) and message.get("type") == "HEARTBEAT":
+                            # Unsequenced: the server does not acknowledge heartbeats
+                            self._send_frame(Protocol.pack_message(
+                                Protocol.create_heartbeat_ack(), codec=self.codec), LANE_CONTROL)
+                        elif (isinstance(message, dict) and message.get("type") == "ACK"
+                                and message.get("message_id") == 0 and "ack_mode" in message):
+                            self.ack_mode = message["ack_mode"]
+                            self.codec = message.get("codec", CODEC_JSON)
+                            if message.get("compression") == COMPRESSION_ZLIB:
+                                self.compress_threshold = message.get("compress_threshold", 0)
+                            self.batching = (self.coalesce_delay > 0
+                                             and message.get("batch") is True)
+                            self.fragment_size = message.get("fragment_size", 0)
+                            outbound.fragment_size = self.fragment_size
+                            self.max_frame_size = message.get("max_frame_size", MAX_FRAME_SIZE)
+                            if isinstance(message.get("resume"), int):
+                                self._retransmit(message["resume"])
+                        elif (isinstance(message, dict) and message.get("type") == "ACK"
+                                and isinstance(message.get("message_id"), int)):
+                            self.unacked.acknowledge(0, ((message["message_id"],) * 2,))
+                    
+                    logger.debug(f"Received message: {message}")
+                    if (isinstance(message, dict) and "reply_to" in message
+                            and self.requests.resolve(message["reply_to"], message)):
+                        continue
+                    
+                    # Call registered handlers
+                    for handler in self.message_handlers:
+                        try:
+                            handler(message)
+                        except Exception as e:
+                            logger.error(f"Handler error: {e}")
+            
             except socket.timeout:
                 # Timeout is normal, continue
                 continue
@@ -121,6 +433,9 @@ class Client:
                 break
         
         self.connected = False
+        outbound.close()
+        with self._batch_cond:
+            self._batch_cond.notify()
     
     def register_message_handler(self, handler: Callable):
         """Register a message handler function"""
@@ -0,0 +1,277 @@
+"""Multi-process server sharding for NearMeet
+
+``ServerCluster`` starts N worker processes that each run a ``Server``
+bound to the same port with SO_REUSEPORT, so the kernel spreads incoming
+connections (and their parsing, JSON and crypto work) across cores.
+
+Workers are linked to the supervisor by a pipe each, forming a star-shaped
+local bus. A worker forwards every broadcast to the supervisor, which relays
+it to the other workers; room publishes are only relayed to workers that
+announced members in that room. Each worker then delivers the message,
+whose JSON frame is already packed, to its own clients.
+"""
+
+import multiprocessing
+import socket
+import threading
+from typing import Callable, Optional
+
+from src.config import ServerConfig
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Bus message kinds
+BUS_READY = "R"
+BUS_BROADCAST = "B"
+BUS_PUBLISH = "P"
+BUS_INTEREST = "I"
+BUS_STOP = "S"
+
+
+class WorkerBus:
+    """Worker side of the inter-worker bus"""
+    
+    def __init__(self, connection, server):
+        """
+        Initialize bus
+        
+        Args:
+            connection: multiprocessing Connection to the supervisor
+            server: Local Server receiving relayed traffic
+        """
+        self.connection = connection
+        self.server = server
+        self._send_lock = threading.Lock()
+        self._reader: Optional[threading.Thread] = None
+    
+    def start(self):
+        """Start relaying traffic from the other workers"""
+        self._reader = threading.Thread(target=self._read_loop, daemon=True)
+        self._reader.start()
+    
+    def join(self):
+        """Wait until the supervisor stops the worker"""
+        if self._reader:
+            self._reader.join()
+    
+    def ready(self, port: int):
+        """Tell the supervisor this worker is accepting connections"""
+        self._send((BUS_READY, port))
+    
+    def broadcast(self, encoded, exclude_address: tuple = None):
+        """Forward an EncodedMessage broadcast to the other workers"""
+        self._send((BUS_BROADCAST, encoded, exclude_address))
+    
+    def publish(self, room: str, encoded, exclude_address: tuple = None):
+        """Forward an EncodedMessage to workers with members in the room"""
+        self._send((BUS_PUBLISH, encoded, exclude_address, room))
+    
+    def set_interest(self, room: str, active: bool):
+        """Announce whether this worker has members in a room"""
+        self._send((BUS_INTEREST, room, active))
+    
+    def _send(self, message: tuple):
+        """Send a bus message (connections are not thread-safe)"""
+        try:
+            with self._send_lock:
+                self.connection.send(message)
+        except (OSError, ValueError) as e:
+            logger.error(f"Worker bus send failed: {e}")
+    
+    def _read_loop(self):
+        """Deliver frames relayed by the supervisor to local clients"""
+        while True:
+            try:
+                message = self.connection.recv()
+            except (EOFError, OSError):
+                break
+            
+            kind = message[0]
+            if kind == BUS_STOP:
+                break
+            elif kind == BUS_BROADCAST:
+                self.server._fan_out(message[1], message[2])
+            elif kind == BUS_PUBLISH:
+                self.server._deliver_to_room(message[3], message[1], message[2])
+
+
+def _worker_main(index: int, host: str, port: int, engine: str, connection,
+                 setup: Optional[Callable]):
+    """Worker process body"""
+    from src.network.server import Server
+    
+    server = Server(host=host, port=port, engine=engine, reuse_port=True)
+    server.bus = WorkerBus(connection, server)
+    
+    if setup:
+        setup(server)
+    
+    if not server.start():
+        connection.close()
+        return
+    
+    server.bus.start()
+    server.bus.ready(server.port)
+    logger.info(f"Worker {index} serving on {host}:{server.port}")
+    
+    # Run until the supervisor stops us
+    server.bus.join()
+    server.stop()
+
+
+class ServerCluster:
+    """Supervisor for N SO_REUSEPORT server workers"""
+    
+    def __init__(self, host: str = ServerConfig.HOST, port: int = ServerConfig.PORT,
+                 workers: int = ServerConfig.WORKERS, engine: str = ServerConfig.ENGINE,
+                 setup: Optional[Callable] = None):
+        """
+        Initialize cluster
+        
+        Args:
+            host: Interface to bind
+            port: Shared port (0 picks a free port)
+            workers: Number of worker processes
+            engine: Server engine used by every worker
+            setup: Called with each worker's Server before it starts, to
+                register handlers (must be picklable)
+        """
+        if workers < 1:
+            raise ValueError("A cluster needs at least one worker")
+        
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.engine = engine
+        self.setup = setup
+        self.processes: list = []
+        self._connections: list = []
+        self._send_locks: list = []
+        self._interest: dict = {}  # {room: set(worker index)}
+        self._interest_lock = threading.Lock()
+    
+    def start(self, timeout: float = 10) -> bool:
+        """Start the workers and wait until they all accept connections"""
+        if not hasattr(socket, "SO_REUSEPORT"):
+            logger.error("Multi-worker mode requires SO_REUSEPORT")
+            return False
+        
+        # Reserve the port for the whole group while the workers bind it
+        reserve = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        reserve.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        reserve.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        
+        try:
+            reserve.bind((self.host, self.port))
+            self.port = reserve.getsockname()[1]
+            
+            for index in range(self.workers):
+                parent_end, child_end = multiprocessing.Pipe()
+                process = multiprocessing.Process(
+                    target=_worker_main,
+                    args=(index, self.host, self.port, self.engine, child_end, self.setup),
+                    daemon=True
+                )
+                process.start()
+                child_end.close()
+                
+                self.processes.append(process)
+                self._connections.append(parent_end)
+                self._send_locks.append(threading.Lock())
+            
+            for index, connection in enumerate(self._connections):
+                if not connection.poll(timeout):
+                    raise TimeoutError(f"Worker {index} did not start")
+                message = connection.recv()
+                if message[0] != BUS_READY:
+                    raise RuntimeError(f"Unexpected message from worker {index}")
+        
+        except Exception as e:
+            logger.error(f"Failed to start cluster: {e}", exc_info=True)
+            self.stop()
+            return False
+        
+        finally:
+            reserve.close()
+        
+        for index, connection in enumerate(self._connections):
+            threading.Thread(target=self._relay, args=(index, connection), daemon=True).start()
+        
+        logger.info(f"Cluster of {self.workers} workers on {self.host}:{self.port}")
+        return True
+    
+    def stop(self):
+        """Stop every worker"""
+        for index in range(len(self._connections)):
+            self._forward(index, (BUS_STOP,))
+        for connection in self._connections:
+            connection.close()
+        
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        
+        self._connections.clear()
+        self._send_locks.clear()
+        self.processes.clear()
+        logger.info("Cluster stopped")
+    
+    def serve_forever(self):
+        """Run until interrupted"""
+        if not self.start():
+            return
+        
+        try:
+            for process in self.processes:
+                process.join()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+    
+    def _relay(self, index: int, connection):
+        """Route bus messages from one worker to the others"""
+        while True:
+            try:
+                message = connection.recv()
+            except (EOFError, OSError):
+                break
+            
+            kind = message[0]
+            if kind == BUS_INTEREST:
+                self._set_interest(index, message[1], message[2])
+                continue
+            
+            if kind == BUS_BROADCAST:
+                targets = range(len(self._connections))
+            elif kind == BUS_PUBLISH:
+                with self._interest_lock:
+                    targets = list(self._interest.get(message[3], ()))
+            else:
+                continue
+            
+            for target in targets:
+                if target != index:
+                    self._forward(target, message)
+    
+    def _set_interest(self, index: int, room: str, active: bool):
+        """Record whether a worker has members in a room"""
+        with self._interest_lock:
+            workers = self._interest.setdefault(room, set())
+            if active:
+                workers.add(index)
+            else:
+                workers.discard(index)
+                if not workers:
+                    del self._interest[room]
+    
+    def _forward(self, target: int, message: tuple):
+        """Send a bus message to one worker"""
+        try:
+            with self._send_locks[target]:
+                self._connections[target].send(message)
+        except (OSError, ValueError, IndexError) as e:
+            logger.error(f"Failed to relay to worker {target}: {e}")
@@ -0,0 +1,275 @@
+"""Payload codecs for NearMeet frames
+
+Messages travel as JSON by default. Peers that negotiate ``binary`` in the
+handshake use a compact tagged encoding instead:
+
+- well-known field names are sent as a one-byte field id
+- integers and lengths are varints
+- ``timestamp`` ISO strings become epoch milliseconds
+- ``message_type`` and ``call_type`` values become enum codes
+
+Binary payloads start with ``BINARY_MARKER``, a byte that never starts
+valid UTF-8, so ``decode_payload`` recognizes the codec of every frame on
+its own and JSON stays readable on the wire for debugging.
+"""
+
+import json
+import struct
+from datetime import datetime, timedelta
+from typing import Any
+
+from src.core.enums import CallType, MessageType
+
+CODEC_JSON = "json"
+CODEC_BINARY = "binary"
+CODECS = (CODEC_JSON, CODEC_BINARY)
+
+BINARY_MARKER = 0xFF
+
+# Value tags
+T_NONE = 0
+T_FALSE = 1
+T_TRUE = 2
+T_INT = 3
+T_FLOAT = 4
+T_STR = 5
+T_LIST = 6
+T_DICT = 7
+T_TIMESTAMP = 8
+T_MESSAGE_TYPE = 9
+T_CALL_TYPE = 10
+
+# Append only: the position is the wire id (id 0 means "name follows")
+FIELD_NAMES = (
+    "type", "sender", "timestamp", "message_type", "content", "message_id",
+    "text", "call_type", "action", "target", "filename", "filesize",
+    "checksum", "room", "protocol_version", "ack_mode", "codec", "ranges",
+    "cumulative", "status", "username", "user", "data", "error",
+)
+MESSAGE_TYPES = (
+    MessageType.TEXT.name, MessageType.IMAGE.name, MessageType.FILE.name,
+    MessageType.AUDIO.name, MessageType.VIDEO.name, MessageType.SYSTEM.name,
+    MessageType.NOTIFICATION.name, "CALL",
+)
+CALL_TYPES = (
+    CallType.AUDIO.value, CallType.VIDEO.value, CallType.SCREEN_SHARE.value,
+    CallType.VOICE_MESSAGE.value,
+)
+
+FIELD_IDS = {name: index + 1 for index, name in enumerate(FIELD_NAMES)}
+MESSAGE_TYPE_CODES = {name: code for code, name in enumerate(MESSAGE_TYPES)}
+CALL_TYPE_CODES = {value: code for code, value in enumerate(CALL_TYPES)}
+
+FLOAT_STRUCT = struct.Struct('>d')
+EPOCH = datetime(1970, 1, 1)
+MILLISECOND = timedelta(milliseconds=1)
+
+
+def encode_payload(data: Any, codec: str = CODEC_JSON) -> bytes:
+    """Serialize a JSON-compatible value with a codec"""
+    if codec == CODEC_BINARY:
+        return BinaryCodec.encode(data)
+    return json.dumps(data).encode('utf-8')
+
+
+def decode_payload(payload) -> Any:
+    """Deserialize a payload, detecting its codec from the first byte"""
+    if len(payload) and payload[0] == BINARY_MARKER:
+        return BinaryCodec.decode(payload)
+    return json.loads(str(payload, 'utf-8'))
+
+
+class BinaryCodec:
+    """Compact tagged binary encoding of JSON-compatible values"""
+    
+    @staticmethod
+    def encode(data: Any) -> bytes:
+        """Encode a value, marker byte included"""
+        out = bytearray((BINARY_MARKER,))
+        _encode_value(out, data, None)
+        return bytes(out)
+    
+    @staticmethod
+    def decode(payload) -> Any:
+        """Decode a payload produced by ``encode``"""
+        data = bytes(payload)  # indexing bytes is cheaper than a memoryview
+        if not data or data[0] != BINARY_MARKER:
+            raise ValueError("Not a binary payload")
+        
+        value, position = _decode_value(data, 1)
+        if position != len(data):
+            raise ValueError("Trailing bytes after binary payload")
+        return value
+
+
+def _write_varint(out: bytearray, value: int):
+    """Append an unsigned LEB128 varint"""
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, position: int) -> tuple[int, int]:
+    """Read an unsigned varint; returns (value, next position)"""
+    value = shift = 0
+    while True:
+        try:
+            byte = data[position]
+        except IndexError:
+            raise ValueError("Truncated varint") from None
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def _write_str(out: bytearray, value: str):
+    """Append a length-prefixed UTF-8 string"""
+    encoded = value.encode('utf-8')
+    _write_varint(out, len(encoded))
+    out += encoded
+
+
+def _read_str(data: bytes, position: int) -> tuple[str, int]:
+    """Read a length-prefixed UTF-8 string"""
+    size = data[position] if position < len(data) else 0x80
+    if size < 0x80:
+        position += 1
+    else:
+        size, position = _read_varint(data, position)
+    end = position + size
+    if end > len(data):
+        raise ValueError("Truncated string")
+    return data[position:end].decode('utf-8'), end
+
+
+def _timestamp_ms(value: str):
+    """Epoch milliseconds of a naive ISO timestamp, or None if not one"""
+    if "T" not in value:
+        return None
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if moment.tzinfo is not None:
+        return None
+    return (moment - EPOCH) // MILLISECOND
+
+
+def _encode_value(out: bytearray, value: Any, key):
+    """Append one tagged value; ``key`` is the field it belongs to"""
+    if value is None:
+        out.append(T_NONE)
+    elif value is True:
+        out.append(T_TRUE)
+    elif value is False:
+        out.append(T_FALSE)
+    elif isinstance(value, int):
+        out.append(T_INT)
+        _write_varint(out, value << 1 if value >= 0 else (-value << 1) - 1)
+    elif isinstance(value, float):
+        out.append(T_FLOAT)
+        out += FLOAT_STRUCT.pack(value)
+    elif isinstance(value, str):
+        millis = _timestamp_ms(value) if key == "timestamp" else None
+        if millis is not None:
+            out.append(T_TIMESTAMP)
+            _write_varint(out, millis << 1 if millis >= 0 else (-millis << 1) - 1)
+        elif key == "message_type" and value in MESSAGE_TYPE_CODES:
+            out.append(T_MESSAGE_TYPE)
+            out.append(MESSAGE_TYPE_CODES[value])
+        elif key == "call_type" and value in CALL_TYPE_CODES:
+            out.append(T_CALL_TYPE)
+            out.append(CALL_TYPE_CODES[value])
+        else:
+            out.append(T_STR)
+            _write_str(out, value)
+    elif isinstance(value, dict):
+        out.append(T_DICT)
+        _write_varint(out, len(value))
+        for name, item in value.items():
+            field_id = FIELD_IDS.get(name)
+            if field_id:
+                out.append(field_id)
+            else:
+                out.append(0)
+                _write_str(out, str(name))
+            _encode_value(out, item, name)
+    elif isinstance(value, (list, tuple)):
+        out.append(T_LIST)
+        _write_varint(out, len(value))
+        for item in value:
+            _encode_value(out, item, None)
+    else:
+        raise TypeError(f"Cannot encode {type(value).__name__}")
+
+
+def _decode_signed(data: bytes, position: int) -> tuple[int, int]:
+    """Read a zigzag-encoded signed varint"""
+    raw, position = _read_varint(data, position)
+    return (raw >> 1) if not raw & 1 else -((raw + 1) >> 1), position
+
+
+def _enum_value(table: tuple, data: bytes, position: int) -> str:
+    """Look up an enum code"""
+    try:
+        return table[data[position]]
+    except IndexError:
+        raise ValueError("Unknown or truncated enum code") from None
+
+
+def _decode_value(data: bytes, position: int) -> tuple[Any, int]:
+    """Read one tagged value; returns (value, next position)"""
+    try:
+        tag = data[position]
+    except IndexError:
+        raise ValueError("Truncated binary payload") from None
+    position += 1
+    
+    if tag == T_STR:
+        return _read_str(data, position)
+    if tag == T_DICT:
+        count, position = _read_varint(data, position)
+        result = {}
+        for _ in range(count):
+            try:
+                field_id = data[position]
+            except IndexError:
+                raise ValueError("Truncated binary payload") from None
+            position += 1
+            if field_id:
+                try:
+                    name = FIELD_NAMES[field_id - 1]
+                except IndexError:
+                    raise ValueError(f"Unknown field id: {field_id}") from None
+            else:
+                name, position = _read_str(data, position)
+            result[name], position = _decode_value(data, position)
+        return result, position
+    if tag == T_INT:
+        return _decode_signed(data, position)
+    if tag == T_NONE:
+        return None, position
+    if tag == T_TRUE:
+        return True, position
+    if tag == T_FALSE:
+        return False, position
+    if tag == T_TIMESTAMP:
+        millis, position = _decode_signed(data, position)
+        return (EPOCH + millis * MILLISECOND).isoformat(), position
+    if tag == T_MESSAGE_TYPE:
+        return _enum_value(MESSAGE_TYPES, data, position), position + 1
+    if tag == T_CALL_TYPE:
+        return _enum_value(CALL_TYPES, data, position), position + 1
+    if tag == T_LIST:
+        count, position = _read_varint(data, position)
+        items = []
+        for _ in range(count):
+            item, position = _decode_value(data, position)
+            items.append(item)
+        return items, position
+    if tag == T_FLOAT:
+        return FLOAT_STRUCT.unpack_from(data, position)[0], position + FLOAT_STRUCT.size
+    raise ValueError(f"Unknown value tag: {tag}")
@@ -0,0 +1,58 @@
+"""Per-frame payload compression for NearMeet
+
+Payloads at or above the threshold negotiated in the handshake are
+deflated with zlib and flagged with ``FLAG_COMPRESSED`` in the frame
+header. A preset dictionary of the JSON fragments every NearMeet message
+repeats lets even a few hundred bytes compress well, while chat lines
+under the threshold are sent as they are.
+"""
+
+import zlib
+
+COMPRESSION_NONE = "none"
+COMPRESSION_ZLIB = "zlib"
+COMPRESSIONS = (COMPRESSION_NONE, COMPRESSION_ZLIB)
+COMPRESSION_LEVEL = 6
+
+# zlib favors the end of the dictionary: most common fragments last
+PRESET_DICTIONARY = "".join((
+    '{"type": "HANDSHAKE", "protocol_version": 1, ',
+    '"action": "initiate", "target": ',
+    '"call_type": "audio", "call_type": "video", ',
+    '"filename": "', '"filesize": ', '"checksum": ',
+    '{"type": "JOIN", "room": "', '{"type": "LEAVE", "room": "',
+    '"message_type": "CALL", "message_type": "FILE", ',
+    '"history": [', '"messages": [', '"status": "', '"username": "',
+    '"message_id": null}', '"message_id": ',
+    '"content": {"text": "',
+    '"message_type": "TEXT", ',
+    '"timestamp": "2026-01-01T00:00:00.000000", ',
+    '{"sender": "',
+)).encode('utf-8')
+
+
+def compress_payload(payload: bytes) -> bytes:
+    """Deflate a payload with the preset dictionary"""
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, zlib.MAX_WBITS,
+                                  zdict=PRESET_DICTIONARY)
+    return compressor.compress(payload) + compressor.flush()
+
+
+def decompress_payload(payload: bytes, max_size: int) -> bytes:
+    """
+    Inflate a payload produced by ``compress_payload``
+    
+    Raises:
+        ValueError: On corrupt data or if it inflates beyond ``max_size``
+    """
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS, zdict=PRESET_DICTIONARY)
+    try:
+        data = decompressor.decompress(payload, max_size)
+    except zlib.error as e:
+        raise ValueError(f"Corrupt compressed payload: {e}") from None
+    
+    if decompressor.unconsumed_tail:
+        raise ValueError(f"Compressed payload inflates beyond {max_size} bytes")
+    if not decompressor.eof:
+        raise ValueError("Truncated compressed payload")
+    return data
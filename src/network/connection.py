@@ -0,0 +1,770 @@
+"""Per-connection state, outbound queues and ACK tracking for the NearMeet server"""
+
+import socket
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Any, Callable, Optional
+
+from src.config import ClientConfig, ServerConfig
+from src.network.codec import CODEC_JSON
+from src.network.lanes import LANE_INTERACTIVE, LANES, LaneScheduler
+from src.network.protocol import (
+    Protocol, MAX_FRAME_SIZE, MAX_SACK_RANGES, MESSAGE_HEADER_SIZE
+)
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+OVERFLOW_POLICIES = ("drop_oldest", "disconnect", "coalesce", "reject")
+MAX_WRITE_BATCH = 64  # frames gathered into one vectored write
+
+
+def send_frames(sock: socket.socket, frames: list):
+    """
+    Write several frames with as few syscalls as possible
+    
+    Uses a vectored ``sendmsg`` where the platform has it, so the frames
+    (often the very same shared broadcast buffer) are never concatenated.
+    """
+    if len(frames) == 1:
+        sock.sendall(frames[0])
+        return
+    
+    if not hasattr(sock, "sendmsg"):
+        sock.sendall(b"".join(frames))
+        return
+    
+    views = [memoryview(frame) for frame in frames]
+    index = 0
+    while index < len(views):
+        sent = sock.sendmsg(views[index:])
+        while index < len(views) and sent >= len(views[index]):
+            sent -= len(views[index])
+            index += 1
+        if sent:
+            views[index] = views[index][sent:]
+
+
+class OutboundQueue:
+    """
+    Bounded queue of encoded frames waiting to be written to one client
+    
+    Frames wait in one FIFO per priority lane (see ``src.network.lanes``),
+    served by weighted round-robin.
+    
+    When a frame does not fit (too many frames or too many bytes), the
+    overflow policy decides what happens:
+    
+    - ``drop_oldest``: discard queued frames, oldest of the lowest priority
+      lane first, until it fits
+    - ``disconnect``: refuse the frame and close the queue; the caller drops
+      the client
+    - ``coalesce``: replace the queued frame carrying the same coalesce key
+      (presence, typing indicators...), otherwise behave like ``drop_oldest``
+    - ``reject``: refuse the frame and keep the queue open (``Client``, whose
+      callers learn it through their delivery future)
+    
+    Well before it overflows, the queue turns ``saturated`` at the high
+    watermark and stays so until it drains to the low watermark. Every
+    transition calls ``on_saturation`` (outside the lock), which connections
+    use to stop reading from the peer in the meantime.
+    
+    With a ``fragment_size``, frames larger than it become fragment streams
+    kept apart from the FIFO: readers get one fragment at a time, after the
+    regular frames queued meanwhile and round-robin between streams, so a
+    large payload never holds chat frames back. Streams are bounded by
+    ``max_stream_bytes`` and do not count towards the watermarks.
+    
+    A frame queued with ``on_written`` keeps that callback in its entry.
+    Once the frame (its last fragment, for a stream) is handed to the
+    writer, the callback moves to a list the writer collects with
+    ``pop_written`` after the write; it is discarded with the frame when
+    the frame is dropped, coalesced away or the queue closes.
+    """
+    
+    def __init__(self, max_frames: int = ServerConfig.OUTBOUND_QUEUE_SIZE,
+                 max_bytes: int = ServerConfig.OUTBOUND_QUEUE_BYTES,
+                 policy: str = ServerConfig.OVERFLOW_POLICY,
+                 high_water: float = ServerConfig.FLOW_HIGH_WATER,
+                 low_water: float = ServerConfig.FLOW_LOW_WATER,
+                 on_saturation: Optional[Callable[[], None]] = None,
+                 fragment_size: int = 0,
+                 max_stream_bytes: int = ServerConfig.OUTBOUND_STREAM_BYTES,
+                 lane_weights: tuple = ServerConfig.LANE_WEIGHTS):
+        """
+        Initialize queue
+        
+        Args:
+            max_frames: Frame bound
+            max_bytes: Byte bound
+            policy: Overflow policy
+            high_water: Fraction of the bounds at which the queue saturates
+            low_water: Fraction of the bounds it must drain to afterwards
+            on_saturation: Called after ``saturated`` changed
+            fragment_size: Payload bytes per fragment (0: never fragment)
+            max_stream_bytes: Byte bound of the fragment streams
+            lane_weights: Lane scheduler weights (control, interactive)
+        """
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {policy}")
+        if not 0 <= low_water < high_water <= 1:
+            raise ValueError("Watermarks must satisfy 0 <= low < high <= 1")
+        
+        self.max_frames = max_frames
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.closed = False
+        self.draining = False
+        self.overflowed = False
+        self.dropped = 0
+        self.saturated = False
+        self.saturation_events = 0
+        self.on_saturation = on_saturation
+        self._high_frames = max(1, int(max_frames * high_water))
+        self._high_bytes = max(1, int(max_bytes * high_water))
+        self._low_frames = int(max_frames * low_water)
+        self._low_bytes = int(max_bytes * low_water)
+        self._lanes = tuple(deque() for _ in LANES)  # [data, key, on_written] entries per lane
+        self._count = 0
+        self._scheduler = LaneScheduler(lane_weights)
+        self._keys: dict = {}  # {coalesce_key: entry}
+        self._bytes = 0
+        self.fragment_size = fragment_size
+        self.max_stream_bytes = max_stream_bytes
+        self._streams: deque = deque()  # [frame, next fragment offset, stream ID, on_written]
+        self._stream_bytes = 0
+        self._next_stream_id = 1
+        self._written: list = []  # on_written callbacks of the frames handed out
+        self._ready = threading.Condition()
+    
+    def __len__(self) -> int:
+        return self._count + len(self._streams)
+    
+    @property
+    def buffered_bytes(self) -> int:
+        """Bytes currently queued"""
+        return self._bytes + self._stream_bytes
+    
+    def put(self, data: bytes, key: Any = None, lane: int = LANE_INTERACTIVE,
+            on_written: Optional[Callable[[], None]] = None) -> bool:
+        """
+        Queue a frame without blocking
+        
+        Args:
+            data: Encoded frame
+            key: Optional coalesce key
+            lane: Priority lane
+            on_written: Called by the writer once the whole frame is written
+        
+        Returns:
+            False if the queue is closed or the disconnect policy tripped
+        """
+        with self._ready:
+            queued = self._put(data, key, lane, on_written)
+            changed = self._update_saturation()
+        
+        if changed:
+            self._notify_saturation()
+        return queued
+    
+    def get(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        """
+        Wait for the next frame
+        
+        Returns:
+            The frame, or None once the queue is closed (or on timeout)
+        """
+        with self._ready:
+            while not self._count and not self._streams and not self.closed:
+                if self.draining or not self._ready.wait(timeout):
+                    return None
+            
+            if self.closed:
+                return None
+            
+            data = self._pop_entry() if self._count else self._pop_fragment()
+            changed = self._update_saturation()
+        
+        if changed:
+            self._notify_saturation()
+        return data
+    
+    def get_nowait(self) -> Optional[bytes]:
+        """Pop the next frame, or None if the queue is empty or closed"""
+        with self._ready:
+            if self.closed:
+                return None
+            if self._count:
+                data = self._pop_entry()
+            elif self._streams:
+                data = self._pop_fragment()
+            else:
+                return None
+            changed = self._update_saturation()
+        
+        if changed:
+            self._notify_saturation()
+        return data
+    
+    def get_many(self, limit: int) -> list:
+        """Pop up to ``limit`` frames without waiting, at most one of them a fragment"""
+        with self._ready:
+            if self.closed:
+                return []
+            count = min(limit - 1 if self._streams else limit, self._count)
+            frames = [self._pop_entry() for _ in range(count)]
+            if self._streams and len(frames) < limit:
+                frames.append(self._pop_fragment())
+            changed = self._update_saturation()
+        
+        if changed:
+            self._notify_saturation()
+        return frames
+    
+    def pop_written(self) -> list:
+        """Take the ``on_written`` callbacks of the frames handed out so far"""
+        if not self._written:
+            return []
+        with self._ready:
+            callbacks, self._written = self._written, []
+        return callbacks
+    
+    def close(self, drain: bool = False):
+        """
+        Close the queue and wake the writer
+        
+        Args:
+            drain: Only refuse new frames; ``get`` returns the queued ones
+                and None once they are all out
+        """
+        with self._ready:
+            if drain:
+                self.draining = True
+                self._ready.notify_all()
+                return
+            
+            self.closed = True
+            for frames in self._lanes:
+                frames.clear()
+            self._count = 0
+            self._keys.clear()
+            self._bytes = 0
+            self._streams.clear()
+            self._stream_bytes = 0
+            self._written = []
+            changed = self._update_saturation()
+            self._ready.notify_all()
+        
+        if changed:
+            self._notify_saturation()
+    
+    def _put(self, data: bytes, key: Any, lane: int,
+             on_written: Optional[Callable[[], None]]) -> bool:
+        """Queue a frame (lock held)"""
+        if self.closed or self.draining:
+            return False
+        
+        if self.fragment_size and len(data) > self.fragment_size:
+            return self._put_stream(data, on_written)
+        
+        if self._is_full(len(data)):
+            if self.policy == "disconnect":
+                self.closed = True
+                self.overflowed = True
+                self._ready.notify_all()
+                return False
+            if self.policy == "reject":
+                self.dropped += 1
+                return False
+            
+            entry = self._keys.get(key) if key is not None else None
+            if self.policy == "coalesce" and entry is not None:
+                self._bytes += len(data) - len(entry[0])
+                entry[0] = data
+                entry[2] = on_written
+                self.dropped += 1
+                return True
+            
+            while self._count and self._is_full(len(data)):
+                self._drop_entry()
+                self.dropped += 1
+        
+        entry = [data, key, on_written]
+        self._lanes[lane].append(entry)
+        self._count += 1
+        self._bytes += len(data)
+        if key is not None:
+            self._keys[key] = entry
+        
+        self._ready.notify()
+        return True
+    
+    def _put_stream(self, data: bytes, on_written: Optional[Callable[[], None]]) -> bool:
+        """Queue a frame to be sent as fragments (lock held)"""
+        if self._stream_bytes and self._stream_bytes + len(data) > self.max_stream_bytes:
+            if self.policy == "disconnect":
+                self.closed = True
+                self.overflowed = True
+                self._ready.notify_all()
+                return False
+            if self.policy == "reject":
+                self.dropped += 1
+                return False
+            
+            # Streams already partly sent must complete for the peer to
+            # reassemble them; drop waiting ones instead
+            for entry in [entry for entry in self._streams if entry[1] == 0]:
+                if self._stream_bytes + len(data) <= self.max_stream_bytes:
+                    break
+                self._streams.remove(entry)
+                self._stream_bytes -= len(entry[0])
+                self.dropped += 1
+        
+        self._streams.append([data, 0, self._next_stream_id, on_written])
+        self._next_stream_id = self._next_stream_id % 0xFFFF + 1
+        self._stream_bytes += len(data)
+        self._ready.notify()
+        return True
+    
+    def _is_full(self, size: int) -> bool:
+        """Whether a frame of ``size`` bytes would exceed a bound"""
+        return (self._count >= self.max_frames
+                or (bool(self._count) and self._bytes + size > self.max_bytes))
+    
+    def _update_saturation(self) -> bool:
+        """Apply the watermarks (lock held); returns True on a transition"""
+        if self.closed:
+            saturated = False
+        elif self.saturated:
+            saturated = self._count > self._low_frames or self._bytes > self._low_bytes
+        else:
+            saturated = self._count >= self._high_frames or self._bytes >= self._high_bytes
+        
+        if saturated == self.saturated:
+            return False
+        
+        self.saturated = saturated
+        if saturated:
+            self.saturation_events += 1
+        return True
+    
+    def _notify_saturation(self):
+        """Run the saturation callback"""
+        if self.on_saturation:
+            self.on_saturation()
+    
+    def _pop_entry(self) -> bytes:
+        """Hand out the head entry of the lane scheduled next (lock held)"""
+        data, on_written = self._remove(self._lanes[self._scheduler.pick(self._lanes)])
+        if on_written is not None:
+            self._written.append(on_written)
+        return data
+    
+    def _drop_entry(self):
+        """Remove the oldest entry of the lowest priority lane holding any (lock held)"""
+        self._remove(next(frames for frames in reversed(self._lanes) if frames))
+    
+    def _remove(self, frames: deque) -> tuple:
+        """Remove the head entry of a lane, returning (data, on_written) (lock held)"""
+        entry = frames.popleft()
+        self._count -= 1
+        data, key, on_written = entry
+        self._bytes -= len(data)
+        if key is not None and self._keys.get(key) is entry:
+            del self._keys[key]
+        return data, on_written
+    
+    def _pop_fragment(self) -> bytes:
+        """Pack the next fragment, rotating between streams (lock held)"""
+        entry = self._streams[0]
+        data, offset, stream_id, on_written = entry
+        fragment, entry[1] = Protocol.pack_fragment(data, offset, self.fragment_size, stream_id)
+        self._stream_bytes -= entry[1] - offset
+        
+        if entry[1] == len(data):
+            self._streams.popleft()
+            if on_written is not None:
+                self._written.append(on_written)
+        else:
+            self._streams.rotate(-1)
+        return fragment
+
+
+class AckTracker:
+    """
+    Receiver side of cumulative acknowledgements
+    
+    Tracks the highest contiguous message ID received plus the IDs received
+    above it, and decides when a cumulative ACK is due: every ``every``
+    frames, or when the engine's short ACK timer fires.
+    """
+    
+    def __init__(self, every: int = ServerConfig.ACK_EVERY,
+                 window: int = ServerConfig.ACK_WINDOW):
+        """Initialize tracker"""
+        self.every = every
+        self.window = window
+        self.highest = 0
+        self.pending = 0
+        self._above: set = set()
+    
+    def record(self, message_id: int) -> bool:
+        """
+        Record a received message ID
+        
+        Returns:
+            True if a cumulative ACK should be sent now
+        """
+        if message_id == self.highest + 1:
+            self.highest = message_id
+            while self.highest + 1 in self._above:
+                self._above.remove(self.highest + 1)
+                self.highest += 1
+        elif self.highest < message_id <= self.highest + self.window:
+            self._above.add(message_id)
+        
+        # Duplicates still count, so the sender learns they arrived
+        self.pending += 1
+        return self.pending >= self.every
+    
+    def ranges(self) -> list:
+        """Runs of IDs received above the contiguous point, lowest first"""
+        runs = []
+        for message_id in sorted(self._above):
+            if runs and runs[-1][1] == message_id - 1:
+                runs[-1][1] = message_id
+            else:
+                if len(runs) == MAX_SACK_RANGES:
+                    break
+                runs.append([message_id, message_id])
+        return [tuple(run) for run in runs]
+    
+    def build_frame(self) -> bytes:
+        """Pack a cumulative ACK frame and reset the pending count"""
+        self.pending = 0
+        return Protocol.pack_cumulative_ack(self.highest, self.ranges())
+
+
+class SequenceWindow:
+    """
+    Receiver side of exactly-once delivery
+    
+    Remembers which of the last ``size`` sequence numbers (header message
+    IDs) arrived as the bits of one integer, bit 0 standing for the highest
+    one, so duplicates are spotted in constant memory. Sequences older than
+    the window are treated as duplicates; senders keep at most ``size``
+    frames unacknowledged. Sequence 0 (legacy senders) is never deduplicated.
+    """
+    
+    def __init__(self, size: int = ServerConfig.DEDUP_WINDOW):
+        """Initialize window"""
+        self.size = size
+        self.highest = 0
+        self._bits = 0
+        self._mask = (1 << size) - 1
+    
+    def accept(self, sequence: int) -> bool:
+        """
+        Record a received sequence number
+        
+        Returns:
+            False if it was already received (or is too old to tell)
+        """
+        if sequence > self.highest:
+            shift = sequence - self.highest
+            if shift >= self.size:
+                self._bits = 1  # a jump past the window forgets it all
+            else:
+                self._bits = ((self._bits << shift) | 1) & self._mask
+            self.highest = sequence
+            return True
+        if sequence == 0:
+            return True
+        
+        if self.highest - sequence >= self.size:
+            return False
+        bit = 1 << (self.highest - sequence)
+        if self._bits & bit:
+            return False
+        self._bits |= bit
+        return True
+    
+    def contiguous(self) -> int:
+        """Highest sequence number below which everything in the window arrived"""
+        for offset in range(min(self.highest, self.size) - 1, -1, -1):
+            if not self._bits >> offset & 1:
+                return self.highest - offset - 1
+        return self.highest
+
+
+class RetransmitBuffer:
+    """
+    Sender side of exactly-once delivery
+    
+    Packed frames by sequence number until they are acknowledged, to be
+    sent again on a new connection of the same session. At most ``size``
+    are kept, the server's dedup window would not recognize older ones:
+    senders check ``full`` before numbering a new frame, and ``add``
+    refuses one beyond the window rather than forget a frame in flight.
+    A frame may come with a delivery future, completed with its sequence
+    number once acknowledged.
+    """
+    
+    def __init__(self, size: int = ClientConfig.RETRANSMIT_WINDOW):
+        """Initialize buffer"""
+        self.size = size
+        self._frames: OrderedDict = OrderedDict()  # {sequence: packed frame}, oldest first
+        self._futures: dict = {}  # {sequence: delivery future}
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._frames)
+    
+    def sequences(self) -> list:
+        """Sequence numbers still unacknowledged, oldest first"""
+        with self._lock:
+            return list(self._frames)
+    
+    @property
+    def full(self) -> bool:
+        """Whether the window has no room for another frame"""
+        return len(self._frames) >= self.size
+    
+    def add(self, sequence: int, packed: bytes, future: Optional[Future] = None):
+        """
+        Keep a frame until it is acknowledged
+        
+        Raises:
+            BufferError: The window is full
+        """
+        with self._lock:
+            if len(self._frames) >= self.size:
+                raise BufferError("Retransmit window full")
+            self._frames[sequence] = packed
+            if future is not None:
+                self._futures[sequence] = future
+    
+    def discard(self, sequence: int, error: Exception):
+        """Forget a frame that could not be sent, failing its delivery future"""
+        with self._lock:
+            self._frames.pop(sequence, None)
+            future = self._futures.pop(sequence, None)
+        if future:
+            future.set_exception(error)
+    
+    def acknowledge(self, highest: int, ranges: list = ()):
+        """Forget the frames up to ``highest`` and in the (first, last) ranges"""
+        delivered = []
+        with self._lock:
+            frames = self._frames
+            while frames:
+                sequence = next(iter(frames))
+                if sequence > highest:
+                    break
+                del frames[sequence]
+                delivered.append(sequence)
+            for first, last in ranges:
+                for sequence in range(first, last + 1):
+                    if frames.pop(sequence, None) is not None:
+                        delivered.append(sequence)
+            futures = [(sequence, self._futures.pop(sequence)) for sequence in delivered
+                       if sequence in self._futures]
+        
+        for sequence, future in futures:
+            future.set_result(sequence)
+    
+    def resume(self, received: int) -> list:
+        """Frames to send again once the server reports everything up to ``received``"""
+        self.acknowledge(received)
+        with self._lock:
+            return list(self._frames.values())
+
+
+class Connection:
+    """
+    Client connection state shared by both server engines
+    
+    Subclasses provide the writer that drains ``queue``, ``close`` and the
+    ``_set_reading`` hook used for flow control: reading from the peer stops
+    while its outbound queue is saturated, so a client that floods requests
+    without reading the replies cannot grow server memory, and while
+    ``throttle`` holds it back for exceeding its rate limit.
+    
+    ``on_drained`` is called once, and then cleared, the next time the
+    queue leaves the saturated state. A frame sent with ``on_written`` has
+    that callback run by the writer once the frame is written out (see
+    ``OutboundQueue``); it is never run for a frame dropped from the queue.
+    """
+    
+    def __init__(self, address: tuple, policy: str = ServerConfig.OVERFLOW_POLICY):
+        """Initialize connection"""
+        self.address = address
+        self.queue = OutboundQueue(policy=policy, on_saturation=self._on_saturation)
+        self.handshake_done = False
+        self.ack_tracker: Optional[AckTracker] = None  # None: one ACK per message
+        self.last_activity = time.monotonic()
+        self.heartbeat_sent_at = 0.0
+        self.rate_limiter = None  # RateLimiter when limits are configured
+        self.throttled_until = 0.0  # monotonic time reads resume after a rate-limit pause
+        self.codec = CODEC_JSON  # payload codec negotiated at handshake
+        self.compress_threshold = 0  # compression negotiated at handshake (0: off)
+        self.max_frame_size = MAX_FRAME_SIZE  # largest frame the client accepts
+        self.sequences: Optional[SequenceWindow] = None  # the session's, if it has one
+        self.session: Optional[str] = None  # session ID given at handshake
+        self.user: Optional[str] = None  # user name given at handshake
+        self.receive_batch = False  # whether the client reads batch frames
+        self.offline_backlog = False  # stored messages not all queued yet
+        self.offline_cursor = 0  # ID of the last stored message queued
+        self.deferred: deque = deque()  # messages waiting for room on their handler worker
+        self.on_drained: Optional[Callable[[], None]] = None
+        self._flow_lock = threading.Lock()
+    
+    def touch(self):
+        """Record inbound activity (checked lazily by the heartbeat monitor)"""
+        self.last_activity = time.monotonic()
+    
+    def send(self, data: bytes, key: Any = None, lane: int = LANE_INTERACTIVE,
+             on_written: Optional[Callable[[], None]] = None) -> bool:
+        """
+        Queue a frame in a priority lane
+        
+        Returns:
+            False if the client is being dropped, or does not accept a frame
+            that large
+        """
+        if not self.fits(data):
+            logger.warning(f"Frame of {len(data)} bytes exceeds the frame size of {self.address}")
+            return False
+        if self.queue.put(data, key, lane, on_written):
+            self._wake_writer()
+            return True
+        
+        if self.queue.overflowed:
+            logger.warning(f"Outbound queue overflow, disconnecting {self.address}")
+            self.close()
+        return False
+    
+    def fits(self, data: bytes) -> bool:
+        """Whether the client accepts a frame, whole or (if negotiated) as fragments"""
+        return (bool(self.queue.fragment_size)
+                or len(data) - MESSAGE_HEADER_SIZE <= self.max_frame_size)
+    
+    @property
+    def throttled(self) -> bool:
+        """Whether reading is paused by the rate limit"""
+        return self.throttled_until > time.monotonic()
+    
+    def throttle(self, delay: float):
+        """Stop reading from the peer for ``delay`` seconds"""
+        self.throttled_until = time.monotonic() + delay
+        self._on_saturation()
+        self._schedule_resume(delay)
+    
+    @property
+    def pause_events(self) -> int:
+        """Number of times reading was paused by flow control"""
+        return self.queue.saturation_events
+    
+    def close(self):
+        """Close the connection"""
+        raise NotImplementedError
+    
+    def _wake_writer(self):
+        """Hook called after a frame was queued"""
+    
+    def _on_saturation(self):
+        """Pause or resume reading to follow the queue's current state"""
+        with self._flow_lock:
+            # Read the state under the lock: callbacks from different
+            # threads may run out of order, the last one must win
+            self._set_reading(not self.queue.saturated and not self.throttled)
+            callback = None
+            if not self.queue.saturated and self.on_drained:
+                callback, self.on_drained = self.on_drained, None
+        
+        if callback:
+            callback()
+    
+    def _frames_written(self):
+        """Run the ``on_written`` callbacks of the frames the writer just wrote"""
+        for callback in self.queue.pop_written():
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Write callback failed for {self.address}: {e}")
+    
+    def _set_reading(self, reading: bool):
+        """Hook pausing (False) or resuming (True) reads from the peer"""
+    
+    def _schedule_resume(self, delay: float):
+        """Hook resuming reads once a rate-limit pause of ``delay`` seconds ends"""
+
+
+class SocketConnection(Connection):
+    """
+    Client connection of the threaded engine
+    
+    Frames are queued by ``send`` and written by a dedicated writer thread,
+    so a stalled client never blocks broadcasts, accepts or its own reader.
+    """
+    
+    def __init__(self, client_socket: socket.socket, address: tuple,
+                 policy: str = ServerConfig.OVERFLOW_POLICY):
+        """Initialize connection"""
+        super().__init__(address, policy)
+        self.socket = client_socket
+        self.writer_thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._readable = threading.Event()
+        self._readable.set()
+        self._closed = threading.Event()
+    
+    def start(self):
+        """Start the writer thread"""
+        self.writer_thread.start()
+    
+    def wait_readable(self):
+        """Block the reader while flow control or the rate limit pauses the connection"""
+        if self.throttled_until:
+            delay = self.throttled_until - time.monotonic()
+            while delay > 0 and not self._closed.wait(delay):
+                delay = self.throttled_until - time.monotonic()
+            self.throttled_until = 0.0
+            self._on_saturation()
+        self._readable.wait()
+    
+    def close(self):
+        """Stop the writer and unblock the reader"""
+        self.queue.close()
+        self._closed.set()
+        self._readable.set()
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    
+    def _set_reading(self, reading: bool):
+        """Let the reader thread continue or make it wait"""
+        if reading:
+            self._readable.set()
+        else:
+            self._readable.clear()
+    
+    def _write_loop(self):
+        """Writer thread body"""
+        while True:
+            data = self.queue.get()
+            if data is None:
+                break
+            
+            frames = [data]
+            frames.extend(self.queue.get_many(MAX_WRITE_BATCH - 1))
+            
+            try:
+                send_frames(self.socket, frames)
+            except OSError as e:
+                logger.error(f"Failed to send message to {self.address}: {e}")
+                self.close()
+                break
+            self._frames_written()
@@ -0,0 +1,120 @@
+"""Request/response correlation for NearMeet clients
+
+A request is an ordinary message carrying a ``request_id``; the server
+answers it with a message whose ``reply_to`` holds the same ID (see
+``Server.reply``). ``RequestTracker`` maps the IDs in flight to futures,
+so any number of requests can be pipelined on one connection and
+answered in any order, and keeps their deadlines in a heap served by a
+single timer thread.
+"""
+
+import heapq
+import threading
+import time
+from concurrent.futures import Future
+from typing import Optional
+
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+RTT_SMOOTHING = 0.125  # weight of the newest sample in the average round trip
+
+
+class RequestTracker:
+    """
+    Futures of the requests in flight and their timeouts
+    
+    Metrics: ``in_flight``, ``completed``, ``timed_out``, and the smoothed
+    (``rtt_avg``) and largest (``rtt_max``) round-trip times in seconds.
+    """
+    
+    def __init__(self):
+        """Initialize tracker"""
+        self.completed = 0
+        self.timed_out = 0
+        self.rtt_avg = 0.0
+        self.rtt_max = 0.0
+        self._pending: dict = {}  # {request ID: (future, sent at)}
+        self._deadlines: list = []  # heap of (deadline, request ID)
+        self._next_id = 1
+        self._cond = threading.Condition()
+        self._timer: Optional[threading.Thread] = None
+    
+    @property
+    def in_flight(self) -> int:
+        """Requests sent and not yet answered or expired"""
+        return len(self._pending)
+    
+    def register(self, timeout: float) -> tuple:
+        """
+        Allocate a request ID
+        
+        Returns:
+            (request_id, future); the future fails with ``TimeoutError``
+            if no reply arrives within ``timeout`` seconds
+        """
+        future: Future = Future()
+        future.set_running_or_notify_cancel()
+        now = time.monotonic()
+        with self._cond:
+            request_id = self._next_id
+            self._next_id += 1
+            self._pending[request_id] = (future, now)
+            heapq.heappush(self._deadlines, (now + timeout, request_id))
+            if self._timer is None:
+                self._timer = threading.Thread(target=self._expire_loop, daemon=True)
+                self._timer.start()
+            elif self._deadlines[0][1] == request_id:
+                self._cond.notify()
+        return request_id, future
+    
+    def resolve(self, request_id, message) -> bool:
+        """
+        Complete the future of a request with its reply
+        
+        Returns:
+            False if the request is unknown or already expired
+        """
+        with self._cond:
+            entry = self._pending.pop(request_id, None)
+            if entry is None:
+                return False
+            
+            rtt = time.monotonic() - entry[1]
+            self.rtt_avg += (rtt - self.rtt_avg) * (RTT_SMOOTHING if self.completed else 1)
+            self.rtt_max = max(self.rtt_max, rtt)
+            self.completed += 1
+        
+        entry[0].set_result(message)
+        return True
+    
+    def fail(self, request_id, error: Exception):
+        """Complete the future of a request with an error"""
+        with self._cond:
+            entry = self._pending.pop(request_id, None)
+        if entry:
+            entry[0].set_exception(error)
+    
+    def _expire_loop(self):
+        """Fail the requests whose deadline passed (entries of answered ones are skipped)"""
+        while True:
+            expired = []
+            with self._cond:
+                while not self._deadlines:
+                    self._cond.wait()
+                
+                now = time.monotonic()
+                while self._deadlines and self._deadlines[0][0] <= now:
+                    _, request_id = heapq.heappop(self._deadlines)
+                    entry = self._pending.pop(request_id, None)
+                    if entry:
+                        self.timed_out += 1
+                        expired.append((request_id, entry[0]))
+                
+                if not expired and self._deadlines:
+                    self._cond.wait(self._deadlines[0][0] - now)
+            
+            for request_id, future in expired:
+                logger.debug(f"Request {request_id} timed out")
+                future.set_exception(TimeoutError(f"No reply to request {request_id}"))
@@ -0,0 +1,148 @@
+"""Keyed worker pool for NearMeet message handlers
+
+``KeyedExecutor`` runs tasks on a fixed set of worker threads, each with
+its own bounded queue. A task's key (sender, room...) always hashes to the
+same worker, so tasks sharing a key run one at a time in submission order
+while other keys proceed on the other workers. Handlers that block on I/O
+or release the GIL (database writes, decryption) then no longer stall the
+thread that submitted them.
+
+Each worker keeps one FIFO per priority lane (see ``src.network.lanes``)
+and picks its next task by weighted round-robin, so call signalling is not
+stuck behind a backlog of chat or file messages; order is only preserved
+between tasks of the same key and lane.
+
+``submit`` blocks while the worker is full, which is the backpressure the
+threaded engine wants on a client's reader thread. The asyncio engine's
+event loop must never block: submit from it with ``block=False`` and treat
+``queue.Full`` as a signal to pause reading from that client.
+"""
+
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Hashable
+
+from src.config import ServerConfig
+from src.network.lanes import LANE_INTERACTIVE, LANES, LaneScheduler
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class _WorkerQueue:
+    """Bounded lane FIFOs of one worker"""
+    
+    def __init__(self, max_pending: int, lane_weights: tuple):
+        """Initialize queue"""
+        self.max_pending = max_pending
+        self.lanes = tuple(deque() for _ in LANES)
+        self.count = 0
+        self.closed = False
+        self.scheduler = LaneScheduler(lane_weights)
+        self.cond = threading.Condition()
+    
+    def put(self, task: tuple, lane: int, block: bool = True):
+        """Queue a task, waiting while the worker is full (or raising ``queue.Full``)"""
+        with self.cond:
+            while self.count >= self.max_pending and not self.closed:
+                if not block:
+                    raise queue.Full
+                self.cond.wait()
+            if self.closed:
+                raise RuntimeError("Executor is shut down")
+            self.lanes[lane].append(task)
+            self.count += 1
+            self.cond.notify_all()
+    
+    def get(self):
+        """Next task by lane weight, or None once closed and drained"""
+        with self.cond:
+            while not self.count:
+                if self.closed:
+                    return None
+                self.cond.wait()
+            task = self.lanes[self.scheduler.pick(self.lanes)].popleft()
+            self.count -= 1
+            self.cond.notify_all()
+            return task
+    
+    def close(self):
+        """Refuse new tasks; the queued ones still run"""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+
+class KeyedExecutor:
+    """Bounded worker pool preserving the order of tasks with the same key"""
+    
+    def __init__(self, workers: int, max_pending: int = ServerConfig.HANDLER_QUEUE_SIZE,
+                 name: str = "handler", lane_weights: tuple = ServerConfig.LANE_WEIGHTS):
+        """
+        Initialize executor and start its workers
+        
+        Args:
+            workers: Number of worker threads
+            max_pending: Tasks each worker may have queued; ``submit``
+                blocks or fails beyond that (backpressure on the submitter)
+            name: Prefix of the worker thread names
+            lane_weights: Lane scheduler weights (control, interactive)
+        """
+        if workers < 1:
+            raise ValueError(f"Invalid worker count: {workers}")
+        
+        self._queues = [_WorkerQueue(max_pending, lane_weights) for _ in range(workers)]
+        self._threads = [
+            threading.Thread(target=self._work, args=(tasks,), name=f"{name}-{index}",
+                             daemon=True)
+            for index, tasks in enumerate(self._queues)
+        ]
+        for thread in self._threads:
+            thread.start()
+    
+    @property
+    def pending(self) -> int:
+        """Tasks queued and not yet started"""
+        return sum(tasks.count for tasks in self._queues)
+    
+    def submit(self, key: Hashable, fn: Callable, *args, lane: int = LANE_INTERACTIVE,
+               block: bool = True) -> Future:
+        """
+        Queue ``fn(*args)`` behind the earlier tasks of ``key`` in ``lane``
+        
+        Raises:
+            queue.Full: The key's worker is full and ``block`` is False
+            RuntimeError: The executor is shut down
+        """
+        future: Future = Future()
+        self._queues[hash(key) % len(self._queues)].put((future, fn, args), lane, block)
+        return future
+    
+    def shutdown(self, wait: bool = True):
+        """Stop the workers once the tasks already queued are done"""
+        for tasks in self._queues:
+            tasks.close()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+    
+    @staticmethod
+    def _work(tasks: _WorkerQueue):
+        """Run the tasks of one worker in order"""
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            
+            future, fn, args = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result: Any = fn(*args)
+            except BaseException as e:
+                logger.error(f"Task failed: {e}")
+                future.set_exception(e)
+            else:
+                future.set_result(result)
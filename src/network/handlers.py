@@ -1,31 +1,95 @@
 """Network handlers for message processing"""
 
-import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
 from typing import Callable, Dict, Any
 
+from src.config import ServerConfig
+from src.network.executor import KeyedExecutor
+from src.network.lanes import message_lane
+from src.network.schema import (
+    REGISTRY, AckPayload, HeartbeatPayload, MessageRegistry, TextPayload
+)
 from src.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
 
 class MessageHandler:
-    """Handles different types of messages"""
+    """
+    Handles different types of messages
     
-    def __init__(self):
-        """Initialize message handler"""
+    Types with a schema in the registry (see ``src.network.schema``) are
+    dispatched through a table indexed by their type code, and their
+    handlers receive the typed object built by the generated decoder;
+    malformed messages are rejected before any handler runs. Other types
+    are looked up by name and handled as raw dicts.
+    
+    Middleware (``use``) wraps the handlers of one type or of all types.
+    It is composed with each handler into a single callable whenever either
+    is registered, so dispatch never walks a list and a type without
+    middleware calls its handler directly.
+    
+    ``handle`` runs the handler in the calling thread. With ``workers``,
+    ``submit`` runs it on a keyed worker pool instead: messages of the
+    same room, or else the same sender, are handled strictly in order.
+    """
+    
+    def __init__(self, registry: MessageRegistry = REGISTRY, workers: int = 0,
+                 max_pending: int = ServerConfig.HANDLER_QUEUE_SIZE):
+        """
+        Initialize message handler
+        
+        Args:
+            registry: Message schemas
+            workers: Worker threads of ``submit`` (0: handle in the caller)
+            max_pending: Messages each worker may have queued before
+                ``submit`` blocks or fails
+        """
+        self.registry = registry
         self.handlers: Dict[str, Callable] = {}
+        self.middleware: list = []  # global, outermost first
+        self.type_middleware: Dict[str, list] = {}
+        self._chains: Dict[str, Callable] = {}  # {type: handler composed with middleware}
+        self._table: list = [None] * len(registry.classes)  # [chain] by type code
+        self.executor = KeyedExecutor(workers, max_pending) if workers else None
+        self._stats: Dict[str, list] = {}  # {type: [queued, handled, total s, max s]}
+        self._stats_lock = threading.Lock()
     
     def register(self, message_type: str, handler: Callable):
         """Register a handler for a message type"""
         self.handlers[message_type] = handler
+        self._compose(message_type)
         logger.debug(f"Handler registered for message type: {message_type}")
     
     def unregister(self, message_type: str):
         """Unregister a handler for a message type"""
         if message_type in self.handlers:
             del self.handlers[message_type]
+            self._compose(message_type)
             logger.debug(f"Handler unregistered for message type: {message_type}")
     
+    def use(self, middleware: Callable, message_type: str = None):
+        """
+        Add middleware around the handlers of a message type, or of all
+        types if None
+        
+        ``middleware(message, call_next)`` receives the message (typed for
+        types with a schema) and returns the result; it may change the
+        message passed to ``call_next``, or return without calling it to
+        stop the message there. Global middleware runs before per-type
+        middleware, each in the order added.
+        """
+        if message_type is None:
+            self.middleware.append(middleware)
+            for registered in self.handlers:
+                self._compose(registered)
+        else:
+            self.type_middleware.setdefault(message_type, []).append(middleware)
+            self._compose(message_type)
+    
     def handle(self, message: Dict[str, Any]) -> Any:
         """Handle a message"""
         try:
@@ -35,23 +99,143 @@ class MessageHandler:
                 logger.warning(f"Message type not found in: {message}")
                 return None
             
-            handler = self.handlers.get(message_type)
+            code = self.registry.codes.get(message_type)
+            if code is not None:
+                return self.handle_typed(code, message)
+            
+            handler = self._chains.get(message_type)
             
             if not handler:
                 logger.warning(f"No handler found for message type: {message_type}")
                 return None
             
             return handler(message)
-            
+        
         except Exception as e:
             logger.error(f"Error handling message: {e}", exc_info=True)
             return None
     
+    def submit(self, message: Dict[str, Any], block: bool = True) -> Future:
+        """
+        Handle a message on the worker pool, after the earlier messages of
+        its room or sender in the same priority lane
+        
+        Waits while that worker is full; from an event loop (asyncio
+        engine), pass ``block=False`` and pause the client on ``queue.Full``.
+        
+        Returns:
+            Future of the handler's result (already done without workers)
+        
+        Raises:
+            queue.Full: The worker is full and ``block`` is False
+        """
+        message_type = message.get("type") or message.get("message_type")
+        with self._stats_lock:
+            stats = self._stats.get(message_type)
+            if stats is None:
+                stats = self._stats[message_type] = [0, 0, 0.0, 0.0]
+            stats[0] += 1
+        
+        if self.executor is None:
+            future: Future = Future()
+            future.set_result(self._timed_handle(stats, message))
+            return future
+        
+        key = message.get("room") or message.get("sender") or message_type
+        try:
+            return self.executor.submit(key, self._timed_handle, stats, message,
+                                        lane=message_lane(message), block=block)
+        except queue.Full:
+            with self._stats_lock:
+                stats[0] -= 1
+            raise
+    
+    def _timed_handle(self, stats: list, message: Dict[str, Any]) -> Any:
+        """Handle a submitted message and account for it"""
+        start = time.perf_counter()
+        try:
+            return self.handle(message)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._stats_lock:
+                stats[0] -= 1
+                stats[1] += 1
+                stats[2] += elapsed
+                stats[3] = max(stats[3], elapsed)
+    
+    def get_dispatch_stats(self) -> dict:
+        """
+        Per message type counters of ``submit``
+        
+        Returns:
+            {type: {``queued``: submitted and not yet handled, ``handled``,
+            ``latency_avg`` and ``latency_max``: handler run time in seconds}}
+        """
+        with self._stats_lock:
+            return {
+                message_type: {
+                    "queued": queued,
+                    "handled": handled,
+                    "latency_avg": total / handled if handled else 0.0,
+                    "latency_max": longest,
+                }
+                for message_type, (queued, handled, total, longest) in self._stats.items()
+            }
+    
+    def shutdown(self):
+        """Stop the worker pool once the submitted messages are handled"""
+        if self.executor:
+            self.executor.shutdown()
+    
+    def handle_typed(self, code: int, message: Dict[str, Any]) -> Any:
+        """Decode and handle a message whose type code is already known"""
+        handler = self._table[code] if code < len(self._table) else None
+        if not handler:
+            message_type = self.registry.classes[code].type_name
+            logger.warning(f"No handler found for message type: {message_type}")
+            return None
+        
+        try:
+            typed = self.registry.decoders[code](message)
+        except ValueError as e:
+            logger.warning(f"Rejected malformed message: {e}")
+            return None
+        
+        return handler(typed)
+    
+    def _compose(self, message_type: str):
+        """Rebuild the dispatch entry of a type from its handler and middleware"""
+        chain = self.handlers.get(message_type)
+        if chain is not None:
+            for middleware in reversed(self.middleware
+                                       + self.type_middleware.get(message_type, [])):
+                chain = _link(middleware, chain)
+            self._chains[message_type] = chain
+        else:
+            self._chains.pop(message_type, None)
+        self._set_entry(message_type, chain)
+    
+    def _set_entry(self, message_type: str, handler):
+        """Update the dispatch table of a type with a schema"""
+        code = self.registry.code(message_type)
+        if code is None:
+            return
+        if code >= len(self._table):
+            self._table.extend([None] * (code + 1 - len(self._table)))
+        self._table[code] = handler
+    
     def get_handler(self, message_type: str) -> Callable:
         """Get handler for a message type"""
         return self.handlers.get(message_type)
 
 
+def _link(middleware: Callable, call_next: Callable) -> Callable:
+    """One layer of a middleware chain"""
+    def layer(message):
+        return middleware(message, call_next)
+    return layer
+
+
 # Global message handler instance
 _message_handler = MessageHandler()
 
@@ -64,17 +248,17 @@ def get_message_handler() -> MessageHandler:
 def setup_default_handlers(handler: MessageHandler):
     """Setup default message handlers"""
     
-    def handle_text(message: Dict[str, Any]):
+    def handle_text(message: TextPayload):
         """Handle text message"""
-        logger.debug(f"Text message from {message.get('sender')}: {message.get('content')}")
-        return {"status": "received", "message_id": message.get("message_id")}
+        logger.debug(f"Text message from {message.sender}: {message.text}")
+        return {"status": "received", "message_id": message.message_id}
     
-    def handle_ack(message: Dict[str, Any]):
+    def handle_ack(message: AckPayload):
         """Handle acknowledgment"""
-        logger.debug(f"ACK received for message {message.get('message_id')}")
+        logger.debug(f"ACK received for message {message.message_id}")
         return None
     
-    def handle_heartbeat(message: Dict[str, Any]):
+    def handle_heartbeat(message: HeartbeatPayload):
         """Handle heartbeat"""
         return {"type": "HEARTBEAT_ACK"}
     
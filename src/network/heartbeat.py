@@ -0,0 +1,168 @@
+"""Heartbeats and idle-connection reaping for the NearMeet server
+
+Connections only stamp their last activity when they read data, which is
+O(1) and never touches shared structures. A hashed timer wheel holds one
+deadline per connection; when it fires, the connection is checked and
+either rescheduled (it was active meanwhile), sent a heartbeat (idle for
+``interval``) or closed (still silent ``timeout`` seconds later). Each
+tick only visits the wheel slot that expires, never the whole client table.
+"""
+
+import math
+import threading
+import time
+from typing import Hashable, Optional
+
+from src.config import ServerConfig
+from src.constants import HEARTBEAT_INTERVAL
+from src.network.lanes import LANE_CONTROL
+from src.network.protocol import Protocol
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class TimerWheel:
+    """
+    Hashed timer wheel
+    
+    Deadlines are rounded up to whole ticks and hashed into ``slots``
+    buckets; a deadline further away than one revolution keeps a round
+    counter. Scheduling and cancelling are O(1), and each tick only looks
+    at the entries of a single bucket.
+    """
+    
+    def __init__(self, tick: float = ServerConfig.TIMER_TICK,
+                 slots: int = ServerConfig.TIMER_SLOTS):
+        """
+        Initialize wheel
+        
+        Args:
+            tick: Resolution in seconds
+            slots: Number of buckets
+        """
+        if tick <= 0 or slots < 1:
+            raise ValueError("Timer wheel needs a positive tick and at least one slot")
+        
+        self.tick = tick
+        self._slots = [{} for _ in range(slots)]  # [{key: remaining rounds}]
+        self._where: dict = {}  # {key: slot index}
+        self._cursor = 0
+        self._next_tick: Optional[float] = None
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._where)
+    
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._where
+    
+    def schedule(self, key: Hashable, delay: float):
+        """Set (or move) the deadline of ``key`` to ``delay`` seconds from now"""
+        ticks = max(1, math.ceil(delay / self.tick))
+        with self._lock:
+            self._remove(key)
+            index = (self._cursor + ticks) % len(self._slots)
+            self._slots[index][key] = (ticks - 1) // len(self._slots)
+            self._where[key] = index
+    
+    def cancel(self, key: Hashable) -> bool:
+        """Drop the deadline of ``key``; returns False if it had none"""
+        with self._lock:
+            return self._remove(key)
+    
+    def advance(self, now: Optional[float] = None) -> list:
+        """
+        Move the wheel up to ``now``
+        
+        Returns:
+            Keys whose deadline passed, in expiry order
+        """
+        now = time.monotonic() if now is None else now
+        expired = []
+        
+        with self._lock:
+            if self._next_tick is None:
+                self._next_tick = now + self.tick
+            
+            while self._next_tick <= now:
+                self._next_tick += self.tick
+                self._cursor = (self._cursor + 1) % len(self._slots)
+                
+                slot = self._slots[self._cursor]
+                for key, rounds in list(slot.items()):
+                    if rounds:
+                        slot[key] = rounds - 1
+                    else:
+                        del slot[key]
+                        del self._where[key]
+                        expired.append(key)
+        
+        return expired
+    
+    def _remove(self, key: Hashable) -> bool:
+        """Remove a key (lock held)"""
+        index = self._where.pop(key, None)
+        if index is None:
+            return False
+        del self._slots[index][key]
+        return True
+
+
+class HeartbeatMonitor:
+    """Sends heartbeats to idle connections and closes unresponsive ones"""
+    
+    def __init__(self, interval: float = HEARTBEAT_INTERVAL,
+                 timeout: float = ServerConfig.TIMEOUT):
+        """
+        Initialize monitor
+        
+        Args:
+            interval: Idle seconds before a heartbeat is sent
+            timeout: Seconds without any traffic after the heartbeat before
+                the connection is closed
+        """
+        self.interval = interval
+        self.timeout = timeout
+        self.wheel = TimerWheel(tick=min(ServerConfig.TIMER_TICK, interval / 4))
+        self.reaped = 0
+    
+    @property
+    def tick_interval(self) -> float:
+        """How often the engine should call ``tick``"""
+        return self.wheel.tick
+    
+    def add(self, connection):
+        """Start watching a connection"""
+        connection.touch()
+        self.wheel.schedule(connection, self.interval)
+    
+    def remove(self, connection):
+        """Stop watching a connection"""
+        self.wheel.cancel(connection)
+    
+    def tick(self, now: Optional[float] = None):
+        """Check the connections whose deadline passed"""
+        now = time.monotonic() if now is None else now
+        for connection in self.wheel.advance(now):
+            self._check(connection, now)
+    
+    def _check(self, connection, now: float):
+        """Reschedule, ping or reap one connection"""
+        idle = now - connection.last_activity
+        
+        if idle >= self.interval + self.timeout:
+            logger.info(f"Closing unresponsive client {connection.address}")
+            self.reaped += 1
+            connection.close()
+            return
+        
+        if idle < self.interval:
+            # Active since the deadline was set
+            self.wheel.schedule(connection, self.interval - idle)
+            return
+        
+        if connection.heartbeat_sent_at < connection.last_activity:
+            connection.send(Protocol.pack_message(Protocol.create_heartbeat()), lane=LANE_CONTROL)
+            connection.heartbeat_sent_at = now
+        self.wheel.schedule(connection, self.interval + self.timeout - idle)
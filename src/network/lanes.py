@@ -0,0 +1,68 @@
+"""Priority lanes for NearMeet traffic
+
+Every message travels in one of two lanes, chosen by its type only:
+``control`` (handshakes, ACKs, heartbeats, call signalling) and
+``interactive`` (chat, files and the rest). Queues keep one FIFO per lane
+and serve them with a ``LaneScheduler``, so a call "accept" or a heartbeat
+overtakes a burst of chat or a history dump instead of waiting behind it.
+Everything else a sender emits stays in one FIFO: a file never overtakes
+the chat sent before it, nor the reverse. Large payloads are kept from
+holding the FIFO back by fragmentation, not by a lane.
+"""
+
+from typing import Union
+
+from src.config import ServerConfig
+from src.network.protocol import Message
+
+LANE_CONTROL = 0
+LANE_INTERACTIVE = 1
+LANES = (LANE_CONTROL, LANE_INTERACTIVE)
+LANE_NAMES = ("control", "interactive")
+
+CONTROL_TYPES = frozenset({"HANDSHAKE", "ACK", "HEARTBEAT", "HEARTBEAT_ACK", "CALL"})
+
+
+def message_lane(message: Union[Message, dict, str, bytes]) -> int:
+    """Lane of a message, from its type (raw strings and bytes are interactive)"""
+    if isinstance(message, Message):
+        message_type = message.message_type
+    elif isinstance(message, dict):
+        message_type = message.get("type") or message.get("message_type")
+    else:
+        return LANE_INTERACTIVE
+    
+    return LANE_CONTROL if message_type in CONTROL_TYPES else LANE_INTERACTIVE
+
+
+class LaneScheduler:
+    """
+    Smooth weighted round-robin between lanes
+    
+    While all lanes have work, out of every ``sum(weights)`` picks lane
+    ``i`` gets ``weights[i]``, spread out rather than in runs; idle lanes
+    leave their share to the others, so a flood of control frames never
+    starves the interactive lane.
+    """
+    
+    def __init__(self, weights: tuple = ServerConfig.LANE_WEIGHTS):
+        """Initialize scheduler with one positive weight per lane"""
+        if len(weights) != len(LANES) or min(weights) < 1:
+            raise ValueError(f"Invalid lane weights: {weights}")
+        self.weights = tuple(weights)
+        self._current = [0] * len(LANES)
+    
+    def pick(self, lanes) -> int:
+        """Index of the lane to serve next among ``lanes`` (one FIFO per lane, not all empty)"""
+        best = -1
+        total = 0
+        for index, lane in enumerate(lanes):
+            if lane:
+                weight = self.weights[index]
+                total += weight
+                self._current[index] += weight
+                if best < 0 or self._current[index] > self._current[best]:
+                    best = index
+        
+        self._current[best] -= total
+        return best
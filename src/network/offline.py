@@ -0,0 +1,116 @@
+"""Store-and-forward queue for offline NearMeet recipients
+
+Messages sent to a user with no live connection (``Server.send_to_user``)
+are kept in the ``pending_messages`` table of the SQLite ``Database``, in
+the JSON form, and forwarded in batch frames when the user connects again,
+so a reconnecting client catches up in one burst instead of re-fetching
+its whole history. A message leaves the table only once the frame
+carrying it was written to the recipient's socket; one dropped from a full
+outbound queue, or still queued when the connection closes, is forwarded
+again on the next connection. The table is indexed on (recipient, id):
+storing, trimming and reading one user's queue are B-tree range
+operations, whatever the number of users and messages in the table.
+
+User names are not authenticated: a client gets the messages of whatever
+name its handshake claims. The server only refuses a name that already
+has a live connection from another session, so this is a convenience for
+a trusted LAN, not access control.
+"""
+
+import json
+import threading
+from typing import Optional, Union
+
+from src.config import ServerConfig
+from src.database.db import Database
+from src.network.protocol import Message
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class OfflineQueue:
+    """
+    Persistent per-recipient queue of undelivered messages
+    
+    Each recipient keeps at most ``max_per_user`` messages; storing more
+    drops that recipient's oldest ones. The database is used from the
+    server's connection threads, so it must be opened with
+    ``check_same_thread=False`` (the default one is); this class serializes
+    access to it.
+    
+    Counters: ``stored``, ``dropped`` and ``forwarded`` messages.
+    """
+    
+    def __init__(self, database: Optional[Database] = None,
+                 max_per_user: int = ServerConfig.OFFLINE_QUEUE_SIZE):
+        """Initialize queue"""
+        if max_per_user < 1:
+            raise ValueError(f"Invalid per-user limit: {max_per_user}")
+        
+        self.database = database or Database(check_same_thread=False)
+        self.max_per_user = max_per_user
+        self.stored = 0
+        self.dropped = 0
+        self.forwarded = 0
+        self._lock = threading.Lock()
+    
+    def store(self, recipient: str, message: Union[Message, dict]):
+        """Keep a message until ``recipient`` connects"""
+        payload = (message.to_bytes() if isinstance(message, Message)
+                   else json.dumps(message).encode('utf-8'))
+        
+        with self._lock, self.database.connection as connection:
+            connection.execute(
+                "INSERT INTO pending_messages (recipient, payload) VALUES (?, ?)",
+                (recipient, payload)
+            )
+            # Everything up to the newest message beyond the limit goes
+            dropped = connection.execute(
+                """
+                DELETE FROM pending_messages WHERE recipient = ? AND id <= (
+                    SELECT id FROM pending_messages WHERE recipient = ?
+                    ORDER BY id DESC LIMIT 1 OFFSET ?
+                )
+                """,
+                (recipient, recipient, self.max_per_user)
+            ).rowcount
+            self.stored += 1
+            self.dropped += dropped
+        
+        if dropped:
+            logger.warning(f"Offline queue of {recipient} full, dropped {dropped} messages")
+    
+    def fetch(self, recipient: str, limit: int = ServerConfig.OFFLINE_BATCH,
+              after: int = 0) -> list:
+        """
+        Oldest messages waiting for a recipient, from ID ``after`` (excluded)
+        
+        Returns:
+            [(id, message dict)], to be passed to ``remove`` once sent
+        """
+        with self._lock:
+            rows = self.database.connection.execute(
+                "SELECT id, payload FROM pending_messages WHERE recipient = ? AND id > ? "
+                "ORDER BY id LIMIT ?",
+                (recipient, after, limit)
+            ).fetchall()
+        return [(row["id"], json.loads(row["payload"])) for row in rows]
+    
+    def remove(self, recipient: str, first: int, last: int) -> int:
+        """Forget a recipient's messages with IDs ``first`` to ``last`` once forwarded"""
+        with self._lock, self.database.connection as connection:
+            removed = connection.execute(
+                "DELETE FROM pending_messages WHERE recipient = ? AND id BETWEEN ? AND ?",
+                (recipient, first, last)
+            ).rowcount
+            self.forwarded += removed
+        return removed
+    
+    def pending(self, recipient: str) -> int:
+        """Number of messages waiting for a recipient"""
+        with self._lock:
+            row = self.database.connection.execute(
+                "SELECT COUNT(*) FROM pending_messages WHERE recipient = ?", (recipient,)
+            ).fetchone()
+        return row[0]
@@ -2,120 +2,211 @@
 
 import json
 import struct
-from typing import Dict, Any, Union
-from dataclasses import dataclass, asdict
+import time
+from typing import Dict, Any, NamedTuple, Optional, Union
+from dataclasses import dataclass, field
 from datetime import datetime
 
 from src.core.enums import MessageType, CallType
+from src.network.codec import CODEC_JSON, encode_payload
+from src.network.compression import compress_payload, decompress_payload
 
 
 PROTOCOL_VERSION = 1
 MAGIC_NUMBER = b"NEAR"
 MESSAGE_HEADER_SIZE = 20  # bytes
+MAX_FRAME_SIZE = 16 * 1024 * 1024  # largest payload a FrameDecoder accepts
+MAX_REASSEMBLY_SIZE = 64 * 1024 * 1024  # bytes of fragmented frames a FrameDecoder holds
+FRAGMENT_SIZE = 64 * 1024  # default payload bytes per fragment
+READ_SIZE = 64 * 1024  # bytes offered to each recv_into
 
+HEADER_STRUCT = struct.Struct('>4sBIIBBH3s')
 
-@dataclass
+# Frame types (first reserved header byte)
+FRAME_DATA = 0  # JSON message
+FRAME_ACK = 1  # binary cumulative acknowledgement
+FRAME_BATCH = 2  # several complete frames coalesced by the sender
+
+# Frame flags (second reserved header byte)
+FLAG_COMPRESSED = 0x01  # payload is zlib-deflated, see src.network.compression
+FLAG_FRAGMENT = 0x02  # payload is a slice of a larger frame (see Protocol.fragment)
+FLAG_FIRST = 0x04  # first fragment of its stream
+FLAG_LAST = 0x08  # last fragment of its stream
+
+# Acknowledgement modes
+ACK_PER_MESSAGE = "per_message"
+ACK_CUMULATIVE = "cumulative"
+ACK_MODES = (ACK_PER_MESSAGE, ACK_CUMULATIVE)
+MAX_SACK_RANGES = 8
+
+SACK_COUNT_STRUCT = struct.Struct('>H')
+SACK_RANGE_STRUCT = struct.Struct('>II')
+
+
+class Frame(NamedTuple):
+    """A decoded frame; payload may be a memoryview into the decoder buffer"""
+    message_id: int
+    payload: Any
+    frame_type: int = FRAME_DATA
+    flags: int = 0
+
+
+def _now_ms() -> int:
+    """Current time in epoch milliseconds"""
+    return time.time_ns() // 1_000_000
+
+
+_encode_str = json.encoder.encode_basestring_ascii
+_TEXT = MessageType.TEXT.name
+_FILE = MessageType.FILE.name
+
+
+@dataclass(slots=True)
 class Message:
-    """Base message structure"""
+    """
+    Base message structure
+    
+    Slotted, with ``timestamp`` in epoch milliseconds. ``to_bytes`` writes
+    the JSON form directly, without going through a dict, and keeps it:
+    treat a message as immutable once it has been serialized.
+    """
     sender: str
-    timestamp: str
+    timestamp: int
     message_type: str
     content: Dict[str, Any]
     message_id: str = None
+    _json: Optional[bytes] = field(default=None, init=False, repr=False, compare=False)
+    
+    @property
+    def created_at(self) -> datetime:
+        """Local time the message was created"""
+        return datetime.fromtimestamp(self.timestamp / 1000)
     
     def to_dict(self) -> Dict[str, Any]:
         """Convert to dictionary"""
-        data = asdict(self)
-        return data
+        return {
+            "sender": self.sender,
+            "timestamp": self.timestamp,
+            "message_type": self.message_type,
+            "content": dict(self.content),
+            "message_id": self.message_id
+        }
+    
+    def to_bytes(self, codec: str = CODEC_JSON) -> bytes:
+        """Serialize with a payload codec (the JSON form is cached)"""
+        if codec != CODEC_JSON:
+            return encode_payload(self.to_dict(), codec)
+        
+        payload = self._json
+        if payload is None:
+            payload = (
+                f'{{"sender": {_encode_str(self.sender)}, "timestamp": {self.timestamp:d}, '
+                f'"message_type": {_encode_str(self.message_type)}, '
+                f'"content": {json.dumps(self.content)}, '
+                f'"message_id": {json.dumps(self.message_id)}}}'
+            ).encode('ascii')
+            self._json = payload
+        return payload
     
     def to_json(self) -> str:
         """Convert to JSON string"""
-        return json.dumps(self.to_dict())
+        return self.to_bytes().decode('ascii')
     
     @classmethod
     def from_json(cls, json_str: str):
         """Create message from JSON string"""
         data = json.loads(json_str)
+        if isinstance(data.get("timestamp"), str):
+            # ISO timestamp of older peers
+            data["timestamp"] = int(datetime.fromisoformat(data["timestamp"]).timestamp() * 1000)
         return cls(**data)
 
 
-@dataclass
 class TextMessage(Message):
     """Text message"""
+    __slots__ = ()
+    
     def __init__(self, sender: str, content: str, message_id: str = None):
-        super().__init__(
-            sender=sender,
-            timestamp=datetime.now().isoformat(),
-            message_type=MessageType.TEXT.name,
-            content={"text": content},
-            message_id=message_id
-        )
+        Message.__init__(self, sender, _now_ms(), _TEXT, {"text": content}, message_id)
 
 
-@dataclass
 class CallMessage(Message):
     """Call message"""
+    __slots__ = ()
+    
     def __init__(self, sender: str, call_type: str, action: str, target: str = None, 
                  message_id: str = None):
-        super().__init__(
-            sender=sender,
-            timestamp=datetime.now().isoformat(),
-            message_type="CALL",
-            content={
-                "call_type": call_type,
-                "action": action,  # initiate, accept, reject, end
-                "target": target
-            },
-            message_id=message_id
-        )
+        Message.__init__(self, sender, _now_ms(), "CALL", {
+            "call_type": call_type,
+            "action": action,  # initiate, accept, reject, end
+            "target": target
+        }, message_id)
 
 
-@dataclass
 class FileMessage(Message):
     """File transfer message"""
+    __slots__ = ()
+    
     def __init__(self, sender: str, filename: str, filesize: int, 
                  checksum: str = None, message_id: str = None):
-        super().__init__(
-            sender=sender,
-            timestamp=datetime.now().isoformat(),
-            message_type=MessageType.FILE.name,
-            content={
-                "filename": filename,
-                "filesize": filesize,
-                "checksum": checksum
-            },
-            message_id=message_id
-        )
+        Message.__init__(self, sender, _now_ms(), _FILE, {
+            "filename": filename,
+            "filesize": filesize,
+            "checksum": checksum
+        }, message_id)
 
 
 class Protocol:
     """Network protocol handler"""
     
     @staticmethod
-    def pack_message(message: Union[Message, bytes], message_id: int = 0) -> bytes:
+    def pack_message(message: Union[Message, dict, str, bytes], message_id: int = 0,
+                     frame_type: int = FRAME_DATA, codec: str = CODEC_JSON,
+                     compress_threshold: int = 0) -> bytes:
         """
         Pack a message with header for transmission
         
+        Messages and dicts are serialized with ``codec`` (JSON by default,
+        see ``src.network.codec``), strings encoded as UTF-8 and bytes used
+        as the payload as-is. Payloads of at least ``compress_threshold``
+        bytes (0: never) are compressed when that makes them smaller.
+        
         Format:
         - Magic number (4 bytes): b"NEAR"
         - Version (1 byte)
         - Message ID (4 bytes)
         - Payload size (4 bytes)
-        - Reserved (7 bytes)
+        - Frame type (1 byte)
+        - Flags (1 byte)
+        - Stream ID (2 bytes): fragments only
+        - Reserved (3 bytes)
         - Payload (variable)
         """
         if isinstance(message, Message):
-            payload = message.to_json().encode('utf-8')
+            payload = message.to_bytes(codec)
+        elif isinstance(message, dict):
+            payload = encode_payload(message, codec)
+        elif isinstance(message, str):
+            payload = message.encode('utf-8')
         else:
             payload = message
         
-        header = struct.pack(
-            '>4sBII7s',
+        flags = 0
+        if compress_threshold and len(payload) >= compress_threshold:
+            compressed = compress_payload(payload)
+            if len(compressed) < len(payload):
+                payload = compressed
+                flags |= FLAG_COMPRESSED
+        
+        header = HEADER_STRUCT.pack(
             MAGIC_NUMBER,
             PROTOCOL_VERSION,
             message_id,
             len(payload),
-            b'\x00' * 7  # Reserved
+            frame_type,
+            flags,
+            0,  # Stream ID
+            b'\x00' * 3  # Reserved
         )
         
         return header + payload
@@ -125,18 +216,50 @@ class Protocol:
         """
         Unpack a message from received data
         
+        Compressed payloads are decompressed.
+        
         Returns:
             (message_id, payload)
         """
         if len(data) < MESSAGE_HEADER_SIZE:
             raise ValueError("Incomplete message header")
         
-        header = data[:MESSAGE_HEADER_SIZE]
+        msg_id, size, frame_type, flags = Protocol.unpack_frame_header(data)
         payload = data[MESSAGE_HEADER_SIZE:]
         
-        magic, version, msg_id, size, reserved = struct.unpack(
-            '>4sBII7s',
-            header
+        if len(payload) != size:
+            raise ValueError(f"Payload size mismatch: expected {size}, got {len(payload)}")
+        
+        if flags & FLAG_COMPRESSED:
+            payload = decompress_payload(payload, MAX_FRAME_SIZE)
+        
+        return msg_id, payload
+    
+    @staticmethod
+    def unpack_header(header: bytes, offset: int = 0) -> tuple[int, int]:
+        """
+        Validate a message header
+        
+        Args:
+            header: Any bytes-like object holding the header
+            offset: Position of the header inside ``header``
+        
+        Returns:
+            (message_id, payload_size)
+        """
+        msg_id, size, frame_type, flags = Protocol.unpack_frame_header(header, offset)
+        return msg_id, size
+    
+    @staticmethod
+    def unpack_frame_header(header: bytes, offset: int = 0) -> tuple[int, int, int, int]:
+        """
+        Validate a message header
+        
+        Returns:
+            (message_id, payload_size, frame_type, flags)
+        """
+        magic, version, msg_id, size, frame_type, flags, stream_id, reserved = (
+            HEADER_STRUCT.unpack_from(header, offset)
         )
         
         if magic != MAGIC_NUMBER:
@@ -145,27 +268,179 @@ class Protocol:
         if version != PROTOCOL_VERSION:
             raise ValueError(f"Unsupported protocol version: {version}")
         
-        if len(payload) != size:
-            raise ValueError(f"Payload size mismatch: expected {size}, got {len(payload)}")
-        
-        return msg_id, payload
+        return msg_id, size, frame_type, flags
     
     @staticmethod
-    def create_handshake() -> str:
-        """Create handshake message"""
-        return json.dumps({
+    def create_handshake(ack_mode: str = None, codec: str = None,
+                         compression: str = None, batch: bool = False,
+                         fragment: bool = False, capabilities: dict = None,
+                         session: str = None, user: str = None) -> str:
+        """
+        Create handshake message, optionally requesting an ACK mode, a
+        payload codec, frame compression, batch frames and fragmentation
+        
+        ``capabilities`` (see ``src.network.capabilities``) lists every
+        option the client supports; servers that predate it read the
+        single-option fields instead. ``session`` identifies the client
+        across reconnects, so the server drops retransmitted duplicates.
+        ``user`` names the user, to whom the server forwards the messages
+        stored while they were offline (``Server.send_to_user``).
+        """
+        handshake = {
             "type": "HANDSHAKE",
             "protocol_version": PROTOCOL_VERSION,
             "timestamp": datetime.now().isoformat()
-        })
+        }
+        if ack_mode:
+            handshake["ack_mode"] = ack_mode
+        if codec:
+            handshake["codec"] = codec
+        if compression:
+            handshake["compression"] = compression
+        if batch:
+            handshake["batch"] = True
+        if fragment:
+            handshake["fragment"] = True
+        if capabilities:
+            handshake["capabilities"] = capabilities
+        if session:
+            handshake["session"] = session
+        if user:
+            handshake["user"] = user
+        return json.dumps(handshake)
     
     @staticmethod
-    def create_ack(message_id: int) -> str:
+    def create_ack(message_id: int, **fields) -> str:
         """Create acknowledgment message"""
         return json.dumps({
             "type": "ACK",
             "message_id": message_id,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": datetime.now().isoformat(),
+            **fields
+        })
+    
+    @staticmethod
+    def pack_cumulative_ack(highest: int, ranges: list = ()) -> bytes:
+        """
+        Pack a binary cumulative acknowledgement frame
+        
+        The header message ID carries the highest contiguous ID received;
+        the payload is a range count followed by (first, last) pairs of IDs
+        received above it (selective acknowledgement).
+        """
+        ranges = ranges[:MAX_SACK_RANGES]
+        payload = SACK_COUNT_STRUCT.pack(len(ranges)) + b"".join(
+            SACK_RANGE_STRUCT.pack(first, last) for first, last in ranges
+        )
+        return Protocol.pack_message(payload, highest, FRAME_ACK)
+    
+    @staticmethod
+    def unpack_cumulative_ack(payload: bytes) -> list:
+        """Decode the selective acknowledgement ranges of an ACK frame"""
+        count, = SACK_COUNT_STRUCT.unpack_from(payload)
+        offset = SACK_COUNT_STRUCT.size
+        return [
+            SACK_RANGE_STRUCT.unpack_from(payload, offset + i * SACK_RANGE_STRUCT.size)
+            for i in range(count)
+        ]
+    
+    @staticmethod
+    def pack_batch(frames: list, compress_threshold: int = 0) -> bytes:
+        """
+        Coalesce packed frames into one ``FRAME_BATCH`` frame
+        
+        The payload is the inner frames back to back, headers included, so
+        each keeps its own message ID. A single frame is returned unwrapped.
+        """
+        if len(frames) == 1:
+            return frames[0]
+        return Protocol.pack_message(b"".join(frames), 0, FRAME_BATCH,
+                                     compress_threshold=compress_threshold)
+    
+    @staticmethod
+    def unpack_batch(payload, max_frame_size: int = MAX_FRAME_SIZE):
+        """
+        Yield the inner frames of a ``FRAME_BATCH`` payload
+        
+        Raises:
+            ValueError: On a truncated or invalid inner frame
+        """
+        view = memoryview(payload)
+        offset = 0
+        while offset < len(view):
+            if len(view) - offset < MESSAGE_HEADER_SIZE:
+                raise ValueError("Truncated frame in batch")
+            msg_id, size, frame_type, flags = Protocol.unpack_frame_header(view, offset)
+            start = offset + MESSAGE_HEADER_SIZE
+            offset = start + size
+            if offset > len(view):
+                raise ValueError("Truncated frame in batch")
+            
+            inner = view[start:offset]
+            if flags & FLAG_COMPRESSED:
+                inner = decompress_payload(inner, max_frame_size)
+            yield Frame(msg_id, inner, frame_type, flags)
+    
+    @staticmethod
+    def unbatch(frames, max_frame_size: int = MAX_FRAME_SIZE):
+        """Yield frames, the inner frames of ``FRAME_BATCH`` ones in their place"""
+        for frame in frames:
+            if frame.frame_type == FRAME_BATCH:
+                yield from Protocol.unpack_batch(frame.payload, max_frame_size)
+            else:
+                yield frame
+    
+    @staticmethod
+    def pack_fragment(frame: bytes, offset: int, fragment_size: int,
+                      stream_id: int) -> tuple[bytes, int]:
+        """
+        Pack the fragment of a packed frame starting at ``offset``
+        
+        Fragments carry slices of the whole frame, header included, and
+        the message ID and frame type of that frame for diagnostics.
+        
+        Returns:
+            (fragment frame, offset of the next fragment)
+        """
+        end = min(len(frame), offset + fragment_size)
+        flags = FLAG_FRAGMENT
+        if offset == 0:
+            flags |= FLAG_FIRST
+        if end == len(frame):
+            flags |= FLAG_LAST
+        
+        msg_id, frame_type = HEADER_STRUCT.unpack_from(frame)[2:5:2]
+        header = HEADER_STRUCT.pack(
+            MAGIC_NUMBER, PROTOCOL_VERSION, msg_id, end - offset, frame_type, flags,
+            stream_id, b'\x00' * 3
+        )
+        return header + memoryview(frame)[offset:end], end
+    
+    @staticmethod
+    def fragment(frame: bytes, fragment_size: int = FRAGMENT_SIZE,
+                 stream_id: int = 1) -> list:
+        """Split a packed frame into fragments of at most ``fragment_size`` payload bytes"""
+        fragments = []
+        offset = 0
+        while offset < len(frame):
+            fragment, offset = Protocol.pack_fragment(frame, offset, fragment_size, stream_id)
+            fragments.append(fragment)
+        return fragments
+    
+    @staticmethod
+    def create_join(room: str) -> str:
+        """Create room join message"""
+        return json.dumps({
+            "type": "JOIN",
+            "room": room
+        })
+    
+    @staticmethod
+    def create_leave(room: str) -> str:
+        """Create room leave message"""
+        return json.dumps({
+            "type": "LEAVE",
+            "room": room
         })
     
     @staticmethod
@@ -175,3 +450,249 @@ class Protocol:
             "type": "HEARTBEAT",
             "timestamp": datetime.now().isoformat()
         })
+    
+    @staticmethod
+    def create_heartbeat_ack() -> str:
+        """Create heartbeat reply"""
+        return json.dumps({
+            "type": "HEARTBEAT_ACK",
+            "timestamp": datetime.now().isoformat()
+        })
+
+
+class EncodedMessage:
+    """
+    A message to fan out, packed at most once per payload codec and
+    compression threshold
+    
+    Recipients sharing a codec get the very same frame object; raw strings
+    and bytes are codec-independent and packed once for everyone. Picklable,
+    so it can travel over the cluster bus with its frames already packed.
+    
+    ``key`` is the coalescing key recipients' outbound queues use under the
+    ``"coalesce"`` overflow policy (None: never replaced).
+    """
+    
+    def __init__(self, message: Union[Message, dict, str, bytes], message_id: int = 0,
+                 key: Any = None):
+        """Initialize encoded message"""
+        self.message = message
+        self.message_id = message_id
+        self.key = key
+        self._frames: dict = {}  # {(codec, compress threshold): packed frame}
+    
+    def frame(self, codec: str = CODEC_JSON, compress_threshold: int = 0) -> bytes:
+        """Packed frame for recipients using ``codec`` and ``compress_threshold``"""
+        if not isinstance(self.message, (Message, dict)):
+            codec = CODEC_JSON
+        
+        key = (codec, compress_threshold)
+        frame = self._frames.get(key)
+        if frame is None:
+            frame = Protocol.pack_message(self.message, self.message_id, codec=codec,
+                                          compress_threshold=compress_threshold)
+            self._frames[key] = frame
+        return frame
+
+
+class FrameDecoder:
+    """
+    Incremental decoder for a stream of NEAR frames
+    
+    Bytes are received straight into one reusable bytearray (``get_buffer`` /
+    ``buffer_updated``, the same contract as ``asyncio.BufferedProtocol``) or
+    copied in with ``feed``. ``frames`` then yields every complete frame as a
+    memoryview slice of that buffer, so a single read can deliver many frames
+    and a frame split across reads is simply completed by the next one.
+    
+    Fragments are reassembled per stream ID and the frame they carry is
+    yielded once complete; the fragment streams in progress together hold
+    at most ``max_reassembly`` bytes.
+    
+    Yielded payload views are only valid until the next ``get_buffer`` or
+    ``feed`` call; copy or decode them before reading again.
+    """
+    
+    def __init__(self, max_frame_size: int = MAX_FRAME_SIZE, read_size: int = READ_SIZE,
+                 legacy_handshake: bool = False,
+                 max_reassembly: int = MAX_REASSEMBLY_SIZE):
+        """
+        Initialize decoder
+        
+        Args:
+            max_frame_size: Largest accepted payload; bounds the buffered bytes
+            read_size: Minimum free space offered to each read
+            legacy_handshake: Accept an unframed JSON document at the very
+                start of the stream (handshake of older clients) and yield it
+                as frame 0
+            max_reassembly: Bytes all unfinished fragment streams may hold;
+                also bounds the size of a reassembled frame
+        """
+        self.max_frame_size = max_frame_size
+        self.max_buffer_size = MESSAGE_HEADER_SIZE + max_frame_size
+        self.read_size = min(read_size, self.max_buffer_size)
+        self._buffer = bytearray(self.read_size)
+        self._start = 0
+        self._end = 0
+        self._legacy_json = legacy_handshake
+        self.max_reassembly = max_reassembly
+        self._streams: dict = {}  # {stream_id: bytearray of the fragments so far}
+        self._reassembly_bytes = 0
+    
+    @property
+    def buffered(self) -> int:
+        """Number of received bytes not yet returned as frames"""
+        return self._end - self._start
+    
+    def get_buffer(self, sizehint: int = -1) -> memoryview:
+        """Return a writable view of the free space at the end of the buffer"""
+        needed = max(sizehint, self.read_size, self._missing())
+        
+        if len(self._buffer) - self._end < needed:
+            pending = self.buffered
+            
+            if pending + needed > len(self._buffer) and len(self._buffer) < self.max_buffer_size:
+                # Grow into a fresh buffer so views already handed out stay intact
+                size = min(self.max_buffer_size, max(2 * len(self._buffer), pending + needed))
+                buffer = bytearray(size)
+                buffer[:pending] = self._buffer[self._start:self._end]
+                self._buffer = buffer
+            else:
+                self._buffer[:pending] = self._buffer[self._start:self._end]
+            
+            self._start = 0
+            self._end = pending
+        
+        if self._end == len(self._buffer):
+            raise ValueError("Frame buffer full")
+        
+        return memoryview(self._buffer)[self._end:]
+    
+    def buffer_updated(self, nbytes: int):
+        """Record that ``nbytes`` were written into the last buffer returned"""
+        self._end += nbytes
+    
+    def feed(self, data: bytes):
+        """Copy received bytes into the buffer"""
+        data = memoryview(data)
+        while data:
+            buffer = self.get_buffer(len(data))
+            count = min(len(buffer), len(data))
+            buffer[:count] = data[:count]
+            self.buffer_updated(count)
+            data = data[count:]
+    
+    def frames(self):
+        """
+        Yield every complete frame currently buffered
+        
+        Yields:
+            Frame with payload a memoryview, or bytes for a compressed frame
+            (decompressed here)
+        
+        Raises:
+            ValueError: On an invalid header, an oversized frame, a corrupt
+                compressed payload or a fragment stream breaking the rules
+                or the memory cap
+        """
+        view = memoryview(self._buffer)
+        
+        if self._legacy_json:
+            document = self._take_legacy_json(view)
+            if document is not None:
+                yield Frame(0, document)
+            elif self._legacy_json:
+                return  # incomplete, wait for more bytes
+        
+        while self._end - self._start >= MESSAGE_HEADER_SIZE:
+            msg_id, size, frame_type, flags = Protocol.unpack_frame_header(
+                self._buffer, self._start
+            )
+            if size > self.max_frame_size:
+                raise ValueError(f"Frame too large: {size} bytes")
+            
+            payload_start = self._start + MESSAGE_HEADER_SIZE
+            if self._end - payload_start < size:
+                break
+            
+            header_start = self._start
+            self._start = payload_start + size
+            payload = view[payload_start:self._start]
+            if flags & FLAG_FRAGMENT:
+                stream_id = HEADER_STRUCT.unpack_from(self._buffer, header_start)[6]
+                frame = self._reassemble(stream_id, flags, payload)
+                if frame is not None:
+                    yield frame
+                continue
+            if flags & FLAG_COMPRESSED:
+                payload = decompress_payload(payload, self.max_frame_size)
+            yield Frame(msg_id, payload, frame_type, flags)
+        
+        if self._start == self._end:
+            self._start = self._end = 0
+            if len(self._buffer) > self.read_size:
+                # Give back the memory a large frame needed
+                self._buffer = bytearray(self.read_size)
+    
+    def _reassemble(self, stream_id: int, flags: int, payload) -> Optional[Frame]:
+        """Add a fragment to its stream; returns the carried frame once complete"""
+        stream = self._streams.get(stream_id)
+        if flags & FLAG_FIRST:
+            if stream is not None:
+                raise ValueError(f"Fragment stream {stream_id} restarted")
+            stream = self._streams[stream_id] = bytearray()
+        elif stream is None:
+            raise ValueError(f"Fragment of unknown stream {stream_id}")
+        
+        if self._reassembly_bytes + len(payload) > self.max_reassembly:
+            raise ValueError(f"Fragment streams exceed {self.max_reassembly} bytes")
+        stream += payload
+        self._reassembly_bytes += len(payload)
+        
+        if not flags & FLAG_LAST:
+            return None
+        
+        del self._streams[stream_id]
+        self._reassembly_bytes -= len(stream)
+        if len(stream) < MESSAGE_HEADER_SIZE:
+            raise ValueError("Truncated fragmented frame")
+        msg_id, size, frame_type, inner_flags = Protocol.unpack_frame_header(stream)
+        if size != len(stream) - MESSAGE_HEADER_SIZE or inner_flags & FLAG_FRAGMENT:
+            raise ValueError("Invalid fragmented frame")
+        
+        payload = memoryview(stream)[MESSAGE_HEADER_SIZE:]
+        if inner_flags & FLAG_COMPRESSED:
+            payload = decompress_payload(payload, self.max_reassembly)
+        return Frame(msg_id, payload, frame_type, inner_flags)
+    
+    def _missing(self) -> int:
+        """Bytes still needed to complete the frame at the head of the buffer"""
+        pending = self.buffered
+        if self._legacy_json:
+            return 0
+        if pending < MESSAGE_HEADER_SIZE:
+            return MESSAGE_HEADER_SIZE - pending
+        size = HEADER_STRUCT.unpack_from(self._buffer, self._start)[3]
+        return max(0, MESSAGE_HEADER_SIZE + min(size, self.max_frame_size) - pending)
+    
+    def _take_legacy_json(self, view: memoryview):
+        """Pop an unframed JSON document from the head of the stream"""
+        if self._start == self._end:
+            return None
+        
+        if self._buffer[self._start] != ord('{'):
+            self._legacy_json = False
+            return None
+        
+        try:
+            text = str(view[self._start:self._end], 'utf-8', 'replace')
+            _, index = json.JSONDecoder().raw_decode(text)
+        except ValueError:
+            if self.buffered >= self.max_buffer_size:
+                raise ValueError("Unterminated handshake")
+            return None
+        
+        self._legacy_json = False
+        start = self._start
+        self._start += len(text[:index].encode('utf-8'))
+        return view[start:self._start]
@@ -0,0 +1,110 @@
+"""Room subscriptions for the NearMeet server"""
+
+import threading
+from typing import Any, Callable, Hashable, Optional
+
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class RoomRegistry:
+    """
+    Subscription index between rooms and client connections
+    
+    Keeps both directions (room -> members, member -> rooms) in sets, so
+    joining, leaving and dropping a disconnected client are O(1) per room
+    and publishing only touches the room's members.
+    """
+    
+    def __init__(self, on_change: Optional[Callable[[str, bool], None]] = None):
+        """
+        Initialize registry
+        
+        Args:
+            on_change: Called with (room, True) when a room gets its first
+                member and (room, False) when its last member leaves
+        """
+        self.on_change = on_change
+        self._members: dict = {}  # {room: set(member)}
+        self._rooms: dict = {}  # {member: set(room)}
+        self._lock = threading.Lock()
+    
+    def join(self, room: str, member: Hashable) -> bool:
+        """
+        Subscribe a member to a room
+        
+        Returns:
+            True if the member was not already in the room
+        """
+        with self._lock:
+            members = self._members.setdefault(room, set())
+            if member in members:
+                return False
+            members.add(member)
+            self._rooms.setdefault(member, set()).add(room)
+            
+            if len(members) == 1 and self.on_change:
+                self.on_change(room, True)
+        
+        logger.debug(f"{member} joined room {room}")
+        return True
+    
+    def leave(self, room: str, member: Hashable) -> bool:
+        """
+        Unsubscribe a member from a room
+        
+        Returns:
+            True if the member was in the room
+        """
+        with self._lock:
+            members = self._members.get(room)
+            if not members or member not in members:
+                return False
+            self._discard(room, member)
+        
+        logger.debug(f"{member} left room {room}")
+        return True
+    
+    def leave_all(self, member: Hashable) -> list:
+        """Unsubscribe a member from every room; returns the rooms left"""
+        with self._lock:
+            rooms = list(self._rooms.get(member, ()))
+            for room in rooms:
+                self._discard(room, member)
+        return rooms
+    
+    def members(self, room: str) -> list:
+        """Snapshot of a room's members"""
+        with self._lock:
+            return list(self._members.get(room, ()))
+    
+    def rooms_of(self, member: Hashable) -> list:
+        """Rooms a member is subscribed to"""
+        with self._lock:
+            return list(self._rooms.get(member, ()))
+    
+    def is_member(self, room: str, member: Hashable) -> bool:
+        """Check if a member is in a room"""
+        with self._lock:
+            return member in self._members.get(room, ())
+    
+    def get_rooms(self) -> list:
+        """List rooms with at least one member"""
+        with self._lock:
+            return list(self._members.keys())
+    
+    def _discard(self, room: str, member: Any):
+        """Remove one subscription and prune empty sets (lock held)"""
+        members = self._members[room]
+        members.discard(member)
+        if not members:
+            del self._members[room]
+            if self.on_change:
+                self.on_change(room, False)
+        
+        rooms = self._rooms.get(member)
+        if rooms is not None:
+            rooms.discard(room)
+            if not rooms:
+                del self._rooms[member]
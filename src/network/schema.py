@@ -0,0 +1,214 @@
+"""Message schemas and generated decoders for NearMeet
+
+Every message type declares its fields once with ``MessageRegistry.register``.
+The registry gives it an integer type code and generates, from that
+declaration, a slotted class and a decoder specialized to those fields:
+straight-line lookups, type and bound checks, no loops or reflection. A
+decoder turns a decoded payload dict into the typed object, or raises
+``ValueError`` before any handler runs.
+"""
+
+from typing import Any, Callable, NamedTuple, Optional
+
+from src.constants import MAX_FILE_SIZE, MAX_MESSAGE_LENGTH, MAX_USERNAME_LENGTH
+from src.core.enums import CallType
+
+_EMPTY: dict = {}
+
+
+class Field(NamedTuple):
+    """
+    One field of a message schema
+    
+    ``path`` locates the value in the payload (``"content.text"``), and
+    defaults to the field name. Optional fields may be absent or null.
+    """
+    name: str
+    types: tuple
+    path: Optional[str] = None
+    required: bool = True
+    max_length: int = 0  # strings (0: unbounded)
+    minimum: Optional[int] = None  # integers
+    maximum: Optional[int] = None
+    choices: Optional[frozenset] = None
+
+
+class TypedMessage:
+    """Base of the generated message classes"""
+    __slots__ = ()
+    
+    code = -1
+    type_name = ""
+    fields: tuple = ()
+    
+    def get(self, name: str, default: Any = None) -> Any:
+        """Dict-style access, for handlers written against raw payloads"""
+        return getattr(self, name, default)
+    
+    def __eq__(self, other) -> bool:
+        return (other.__class__ is self.__class__
+                and all(getattr(self, f.name) == getattr(other, f.name) for f in self.fields))
+    
+    def __repr__(self) -> str:
+        values = ", ".join(f"{f.name}={getattr(self, f.name)!r}" for f in self.fields)
+        return f"{self.__class__.__name__}({values})"
+
+
+class MessageRegistry:
+    """Message types by name and integer type code"""
+    
+    def __init__(self):
+        """Initialize registry"""
+        self.codes: dict = {}  # {type name: code}
+        self.classes: list = []  # [generated class] by code
+        self.decoders: list = []  # [decoder] by code
+    
+    def register(self, type_name: str, *fields: Field) -> type:
+        """
+        Declare a message type
+        
+        Args:
+            type_name: Value of the payload's ``type`` (or ``message_type``)
+            fields: Fields to decode and validate, in attribute order
+        
+        Returns:
+            The generated class; its ``code`` is the integer type code
+        """
+        if type_name in self.codes:
+            raise ValueError(f"Message type already registered: {type_name}")
+        
+        code = len(self.classes)
+        cls = _generate_class(type_name, code, fields)
+        self.codes[type_name] = code
+        self.classes.append(cls)
+        self.decoders.append(_generate_decoder(cls))
+        return cls
+    
+    def code(self, type_name: str) -> Optional[int]:
+        """Type code of a message type, None if it has no schema"""
+        return self.codes.get(type_name)
+    
+    def decode(self, message: dict) -> TypedMessage:
+        """
+        Decode a payload dict of any registered type
+        
+        Raises:
+            ValueError: Unknown type or invalid field
+        """
+        type_name = message.get("type") or message.get("message_type")
+        code = self.codes.get(type_name)
+        if code is None:
+            raise ValueError(f"No schema for message type: {type_name}")
+        return self.decoders[code](message)
+
+
+def _generate_class(type_name: str, code: int, fields: tuple) -> type:
+    """Build the slotted class of a message type"""
+    names = [field.name for field in fields]
+    source = f"def __init__(self{''.join(', ' + name for name in names)}):\n"
+    source += "".join(f"    self.{name} = {name}\n" for name in names) or "    pass\n"
+    namespace: dict = {}
+    exec(source, namespace)
+    
+    class_name = "".join(part.capitalize() for part in type_name.split("_")) + "Payload"
+    return type(class_name, (TypedMessage,), {
+        "__slots__": tuple(names),
+        "__init__": namespace["__init__"],
+        "code": code,
+        "type_name": type_name,
+        "fields": tuple(fields),
+    })
+
+
+def _generate_decoder(cls: type) -> Callable[[dict], TypedMessage]:
+    """Build the decoder of a message type from its fields"""
+    type_name = cls.type_name
+    namespace: dict = {"_cls": cls, "_dict": dict, "_EMPTY": _EMPTY, "_len": len}
+    lines = [
+        "def decode(data):",
+        "    if data.__class__ is not _dict:",
+        f"        raise ValueError({type_name + ': payload is not an object'!r})",
+    ]
+    containers = {(): "data"}
+    
+    for index, field in enumerate(cls.fields):
+        *parents, key = (field.path or field.name).split(".")
+        
+        # Nested objects are looked up once, whatever the number of fields in them
+        for depth in range(1, len(parents) + 1):
+            prefix = tuple(parents[:depth])
+            if prefix in containers:
+                continue
+            variable = f"n{len(containers)}"
+            message = f"{type_name}: {'.'.join(prefix)} is not an object"
+            lines += [
+                f"    {variable} = {containers[prefix[:-1]]}.get({prefix[-1]!r})",
+                f"    if {variable} is None:",
+                f"        {variable} = _EMPTY",
+                f"    elif {variable}.__class__ is not _dict:",
+                f"        raise ValueError({message!r})",
+            ]
+            containers[prefix] = variable
+        
+        value = f"v{index}"
+        namespace[f"T{index}"] = frozenset(field.types)
+        message = f"{type_name}: invalid {field.path or field.name}"
+        error = f"raise ValueError({message!r})"
+        lines.append(f"    {value} = {containers[tuple(parents)]}.get({key!r})")
+        
+        checks = [f"{value}.__class__ not in T{index}"]
+        if field.max_length:
+            checks.append(f"_len({value}) > {field.max_length}")
+        if field.minimum is not None:
+            checks.append(f"{value} < {field.minimum}")
+        if field.maximum is not None:
+            checks.append(f"{value} > {field.maximum}")
+        if field.choices is not None:
+            namespace[f"C{index}"] = field.choices
+            checks.append(f"{value} not in C{index}")
+        
+        if field.required:
+            lines += [f"    if {' or '.join(checks)}:", f"        {error}"]
+        else:
+            lines += [f"    if {value} is not None and ({' or '.join(checks)}):",
+                      f"        {error}"]
+    
+    lines.append(f"    return _cls({', '.join(f'v{i}' for i in range(len(cls.fields)))})")
+    exec("\n".join(lines), namespace)
+    return namespace["decode"]
+
+
+# Standard NearMeet messages
+REGISTRY = MessageRegistry()
+
+_SENDER = Field("sender", (str,), max_length=MAX_USERNAME_LENGTH)
+_TIMESTAMP = Field("timestamp", (int, str), required=False)
+_MESSAGE_ID = Field("message_id", (int, str), required=False)
+
+TextPayload = REGISTRY.register(
+    "TEXT", _SENDER, _TIMESTAMP,
+    Field("text", (str,), "content.text", max_length=MAX_MESSAGE_LENGTH),
+    _MESSAGE_ID,
+)
+CallPayload = REGISTRY.register(
+    "CALL", _SENDER, _TIMESTAMP,
+    Field("call_type", (str,), "content.call_type",
+          choices=frozenset(call_type.value for call_type in CallType)),
+    Field("action", (str,), "content.action",
+          choices=frozenset(("initiate", "accept", "reject", "end"))),
+    Field("target", (str,), "content.target", required=False,
+          max_length=MAX_USERNAME_LENGTH),
+    _MESSAGE_ID,
+)
+FilePayload = REGISTRY.register(
+    "FILE", _SENDER, _TIMESTAMP,
+    Field("filename", (str,), "content.filename", max_length=255),
+    Field("filesize", (int,), "content.filesize", minimum=0, maximum=MAX_FILE_SIZE),
+    Field("checksum", (str,), "content.checksum", required=False, max_length=128),
+    _MESSAGE_ID,
+)
+AckPayload = REGISTRY.register("ACK", Field("message_id", (int, str)))
+HeartbeatPayload = REGISTRY.register("HEARTBEAT", _TIMESTAMP)
+HeartbeatAckPayload = REGISTRY.register("HEARTBEAT_ACK", _TIMESTAMP)
+JoinPayload = REGISTRY.register("JOIN", Field("room", (str,), max_length=128))
+LeavePayload = REGISTRY.register("LEAVE", Field("room", (str,), max_length=128))
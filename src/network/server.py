@@ -1,46 +1,154 @@
 """Network server implementation"""
 
+import queue
+import select
 import socket
 import threading
-import json
-from typing import Callable, Optional
+import time
+from collections import OrderedDict
+from functools import partial
+from typing import Any, Callable, Optional, Union
 
 from src.config import ServerConfig
-from src.network.protocol import Protocol
+from src.constants import HEARTBEAT_INTERVAL
+from src.network import capabilities
+from src.network.admission import AdmissionController
+from src.network.codec import CODECS, CODEC_JSON, decode_payload
+from src.network.compression import COMPRESSION_ZLIB
+from src.network.connection import (
+    AckTracker, Connection, SequenceWindow, SocketConnection, OVERFLOW_POLICIES
+)
+from src.network.protocol import (
+    Protocol, FrameDecoder, Frame, Message, EncodedMessage,
+    FRAME_DATA, FRAME_BATCH, ACK_MODES, ACK_CUMULATIVE, MAX_FRAME_SIZE
+)
+from src.network.executor import KeyedExecutor
+from src.network.heartbeat import HeartbeatMonitor
+from src.network.lanes import LANE_CONTROL, message_lane
+from src.network.offline import OfflineQueue
+from src.network.rooms import RoomRegistry
 from src.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+ENGINES = ("threaded", "asyncio")
+
 
 class Server:
     """TCP/IP Server for NearMeet"""
     
-    def __init__(self, host: str = ServerConfig.HOST, port: int = ServerConfig.PORT):
-        """Initialize server"""
+    def __init__(self, host: str = ServerConfig.HOST, port: int = ServerConfig.PORT,
+                 engine: str = ServerConfig.ENGINE,
+                 overflow_policy: str = ServerConfig.OVERFLOW_POLICY,
+                 reuse_port: bool = False,
+                 heartbeat_interval: float = HEARTBEAT_INTERVAL,
+                 idle_timeout: float = ServerConfig.TIMEOUT,
+                 admission: Optional[AdmissionController] = None,
+                 compress_threshold: int = ServerConfig.COMPRESS_THRESHOLD,
+                 fragment_size: int = ServerConfig.FRAGMENT_SIZE,
+                 offline_queue: Optional[OfflineQueue] = None,
+                 handler_workers: int = ServerConfig.HANDLER_WORKERS):
+        """
+        Initialize server
+        
+        Args:
+            host: Interface to bind
+            port: Port to bind (0 picks a free port)
+            engine: 'threaded' (one thread per client) or 'asyncio'
+                (a single event loop holding every connection)
+            overflow_policy: What to do when a client's outbound queue is
+                full: 'drop_oldest', 'disconnect' or 'coalesce'
+            reuse_port: Set SO_REUSEPORT so several worker processes can
+                share the port (see ``src.network.cluster``)
+            heartbeat_interval: Idle seconds before a client is sent a
+                heartbeat (0 disables heartbeats and reaping)
+            idle_timeout: Seconds a client may stay silent after a
+                heartbeat before it is disconnected
+            admission: Connection caps, handshake deadline and rate limits
+                (defaults from ``ServerConfig``)
+            compress_threshold: Payload bytes from which frames to clients
+                that negotiated compression are deflated (0: never)
+            fragment_size: Frames above this many bytes are interleaved
+                with the others as fragments, for clients that negotiated
+                fragmentation (0: never)
+            offline_queue: Where ``send_to_user`` stores the messages of
+                users who are not connected (None: drop them)
+            handler_workers: Threads running the message handlers, each
+                client's messages in arrival order on the same one (0: run
+                them on the thread reading the client)
+        """
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown server engine: {engine}")
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+        
         self.host = host
         self.port = port
+        self.engine = engine
+        self.overflow_policy = overflow_policy
+        self.reuse_port = reuse_port
         self.server_socket: Optional[socket.socket] = None
         self.running = False
-        self.clients: dict = {}  # {client_address: client_socket}
+        self.clients: dict = {}  # {client_address: connection}
+        self.users: dict = {}  # {user name: connection}, users named at handshake
         self.client_lock = threading.Lock()
         self.message_handlers: list[Callable] = []
+        self.rooms = RoomRegistry(on_change=self._on_room_change)  # members are connections
+        self.bus = None  # WorkerBus when running as a cluster worker
+        self.heartbeats = (HeartbeatMonitor(heartbeat_interval, idle_timeout)
+                           if heartbeat_interval else None)
+        self.admission = admission or AdmissionController()
+        self.compress_threshold = compress_threshold
+        self.fragment_size = fragment_size
+        self.capabilities = capabilities.offer(
+            codecs=CODECS,
+            ack_modes=ACK_MODES,
+            compression=(COMPRESSION_ZLIB,) if compress_threshold else (),
+            batch=True,
+            fragment=fragment_size > 0,
+            max_frame_size=MAX_FRAME_SIZE,
+            receive_batch=True
+        )
+        self.sessions: OrderedDict = OrderedDict()  # {session: SequenceWindow}, oldest first
+        self._session_lock = threading.Lock()
+        self.offline_queue = offline_queue
+        self._offline_lock = threading.Lock()  # one forwarder at a time
+        self.executor = (KeyedExecutor(handler_workers, name="server-handler")
+                         if handler_workers else None)
+        self._asyncio_engine = None
+        self._retired_pause_events = 0
     
     def start(self) -> bool:
         """Start the server"""
         try:
+            if self.engine == "asyncio":
+                from src.network.async_server import AsyncioEngine
+                
+                self.running = True
+                self._asyncio_engine = AsyncioEngine(self)
+                self.port = self._asyncio_engine.start()
+                logger.info(f"Server started on {self.host}:{self.port} (asyncio)")
+                return True
+            
             self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if self.reuse_port:
+                self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
             self.server_socket.bind((self.host, self.port))
             self.server_socket.listen(ServerConfig.MAX_CLIENTS)
+            self.port = self.server_socket.getsockname()[1]
             
             self.running = True
             logger.info(f"Server started on {self.host}:{self.port}")
             
             # Start accepting connections in a separate thread
             threading.Thread(target=self._accept_connections, daemon=True).start()
+            if self.timer_interval:
+                threading.Thread(target=self._timer_loop, daemon=True).start()
             return True
-            
+        
         except Exception as e:
+            self.running = False
             logger.error(f"Failed to start server: {e}", exc_info=True)
             return False
     
@@ -51,9 +159,9 @@ class Server:
             
             # Close all client connections
             with self.client_lock:
-                for client_socket in self.clients.values():
+                for connection in self.clients.values():
                     try:
-                        client_socket.close()
+                        connection.close()
                     except:
                         pass
                 self.clients.clear()
@@ -62,8 +170,15 @@ class Server:
             if self.server_socket:
                 self.server_socket.close()
             
-            logger.info("Server stopped")
+            if self._asyncio_engine:
+                self._asyncio_engine.stop()
+                self._asyncio_engine = None
             
+            if self.executor:
+                self.executor.shutdown(wait=False)
+            
+            logger.info("Server stopped")
+        
         except Exception as e:
             logger.error(f"Error stopping server: {e}", exc_info=True)
     
@@ -72,71 +187,66 @@ class Server:
         while self.running:
             try:
                 client_socket, client_address = self.server_socket.accept()
+                if not self.admission.admit(client_address):
+                    client_socket.close()
+                    continue
                 logger.info(f"New connection from {client_address}")
                 
-                with self.client_lock:
-                    self.clients[client_address] = client_socket
+                connection = SocketConnection(client_socket, client_address,
+                                              self.overflow_policy)
+                self._add_client(client_address, connection)
+                connection.start()
                 
                 # Handle client in a separate thread
                 threading.Thread(
                     target=self._handle_client,
-                    args=(client_socket, client_address),
+                    args=(connection, client_address),
                     daemon=True
                 ).start()
-                
+            
             except Exception as e:
                 if self.running:
                     logger.error(f"Error accepting connection: {e}")
     
-    def _handle_client(self, client_socket: socket.socket, client_address: tuple):
+    def _handle_client(self, connection: SocketConnection, client_address: tuple):
         """Handle individual client connection"""
+        client_socket = connection.socket
+        decoder = FrameDecoder(read_size=ServerConfig.BUFFER_SIZE, legacy_handshake=True)
+        
         try:
-            # Receive initial handshake
-            data = client_socket.recv(ServerConfig.BUFFER_SIZE)
-            if not data:
-                return
-            
-            # Parse and respond to handshake
-            message = json.loads(data.decode('utf-8'))
-            logger.debug(f"Handshake from {client_address}: {message}")
-            
-            # Send acknowledgment
-            ack = Protocol.create_ack(0)
-            client_socket.sendall(ack.encode('utf-8'))
-            
-            # Continue receiving messages
             while self.running:
-                data = client_socket.recv(ServerConfig.BUFFER_SIZE)
-                if not data:
+                # Flow control: wait while this client's replies back up,
+                # then handle what is buffered before reading more
+                connection.wait_readable()
+                if connection.queue.closed:
                     break
+                if not self._handle_frames(connection, decoder):
+                    self._flush_acks(connection)  # nothing is read for a while
+                    continue
                 
-                try:
-                    # Try to unpack message
-                    msg_id, payload = Protocol.unpack_message(data)
-                    message = json.loads(payload.decode('utf-8'))
-                    
-                    logger.debug(f"Message from {client_address}: {message}")
-                    
-                    # Call registered handlers
-                    for handler in self.message_handlers:
-                        handler(client_address, message)
-                    
-                    # Send acknowledgment
-                    ack = Protocol.create_ack(msg_id)
-                    client_socket.sendall(ack.encode('utf-8'))
-                    
-                except Exception as e:
-                    logger.error(f"Error processing message: {e}")
-                    
+                tracker = connection.ack_tracker
+                if tracker and tracker.pending:
+                    # Wait at most the ACK delay (the writer shares the socket,
+                    # so no socket timeout), then flush the cumulative ACK
+                    readable, _, _ = select.select([client_socket], [], [], ServerConfig.ACK_DELAY)
+                    if not readable:
+                        self._flush_acks(connection)
+                        continue
+                
+                nbytes = client_socket.recv_into(decoder.get_buffer())
+                if not nbytes:
+                    break
+                decoder.buffer_updated(nbytes)
+                connection.touch()
+        
         except Exception as e:
             logger.error(f"Error handling client {client_address}: {e}")
         
         finally:
             # Remove client from list
-            with self.client_lock:
-                if client_address in self.clients:
-                    del self.clients[client_address]
+            self._remove_client(client_address, connection)
             
+            connection.close()
             try:
                 client_socket.close()
             except:
@@ -144,31 +254,516 @@ class Server:
             
             logger.info(f"Client disconnected: {client_address}")
     
+    @property
+    def timer_interval(self) -> Optional[float]:
+        """Period of the timer wheels (heartbeats, handshake deadlines)"""
+        intervals = [self.admission.tick_interval]
+        if self.heartbeats:
+            intervals.append(self.heartbeats.tick_interval)
+        intervals = [interval for interval in intervals if interval]
+        return min(intervals) if intervals else None
+    
+    def _run_timers(self):
+        """Advance the timer wheels"""
+        if self.heartbeats:
+            self.heartbeats.tick()
+        self.admission.tick()
+    
+    def _timer_loop(self):
+        """Drive the timer wheels (threaded engine)"""
+        while self.running:
+            time.sleep(self.timer_interval)
+            self._run_timers()
+    
+    def _add_client(self, client_address: tuple, connection: Connection):
+        """Register an admitted client and start its deadlines and limits"""
+        connection.rate_limiter = self.admission.create_limiter()
+        with self.client_lock:
+            self.clients[client_address] = connection
+        
+        self.admission.watch(connection)
+        if self.heartbeats:
+            self.heartbeats.add(connection)
+    
+    def _remove_client(self, client_address: tuple, connection):
+        """Forget a disconnected client and its room subscriptions"""
+        with self.client_lock:
+            if self.clients.get(client_address) is connection:
+                del self.clients[client_address]
+            if connection.user and self.users.get(connection.user) is connection:
+                del self.users[connection.user]
+        
+        if self.heartbeats:
+            self.heartbeats.remove(connection)
+        self.admission.unwatch(connection)
+        self.admission.release(client_address)
+        self.rooms.leave_all(connection)
+        
+        with self.client_lock:
+            self._retired_pause_events += connection.pause_events
+    
+    def _handle_frames(self, connection: Connection, decoder: FrameDecoder) -> bool:
+        """
+        Handle the buffered frames of a client
+        
+        One read may carry several frames, or only part of one. Messages
+        deferred by a full handler worker go first.
+        
+        Returns:
+            False if flow control, the rate limit or a full handler worker
+            paused the client before all were handled
+        """
+        if connection.deferred and not self._submit_deferred(connection):
+            return False
+        for frame in decoder.frames():
+            self._handle_frame(connection, frame)
+            if connection.queue.saturated or connection.throttled:
+                return False
+        return True
+    
+    def _handle_frame(self, connection: Connection, frame: Frame):
+        """Process one decoded frame from a client"""
+        if not connection.handshake_done:
+            ack = self._process_handshake(connection, frame.payload)
+            if ack is None:
+                connection.close()
+                return
+            connection.send(ack, lane=LANE_CONTROL)
+            connection.handshake_done = True
+            self.admission.unwatch(connection)
+            if connection.offline_backlog:
+                self._forward_offline(connection)
+            return
+        
+        if frame.frame_type == FRAME_BATCH:
+            self._handle_batch(connection, frame)
+            return
+        if frame.frame_type != FRAME_DATA:
+            return
+        
+        # Charged before decoding; a client over its rate is handled but
+        # not read from again until its buckets refill
+        limiter = connection.rate_limiter
+        if limiter:
+            delay = limiter.throttle(len(frame.payload))
+            if delay:
+                logger.debug(f"Rate limit exceeded by {connection.address}, "
+                             f"throttled for {delay:.3f}s")
+                connection.throttle(delay)
+        
+        # Retransmitted duplicates skip the handlers but are acknowledged
+        # again. A frame the window accepted is acknowledged even if a
+        # handler fails: its retransmission would be taken for a duplicate,
+        # and the gap would stall cumulative ACKs for good
+        if connection.sequences is None or connection.sequences.accept(frame.message_id):
+            try:
+                if not self._process_message(connection, frame.payload):
+                    return
+            except Exception as e:
+                logger.error(f"Error processing message: {e}")
+        else:
+            logger.debug(f"Duplicate frame {frame.message_id} from {connection.address}")
+        
+        tracker = connection.ack_tracker
+        if tracker is None:
+            ack = Protocol.create_ack(frame.message_id)
+            connection.send(Protocol.pack_message(ack, frame.message_id), lane=LANE_CONTROL)
+        elif tracker.record(frame.message_id):
+            connection.send(tracker.build_frame(), lane=LANE_CONTROL)
+    
+    def _handle_batch(self, connection: Connection, frame: Frame):
+        """Handle the inner frames of a batch one by one (batches do not nest)"""
+        try:
+            for inner in Protocol.unpack_batch(frame.payload):
+                if inner.frame_type == FRAME_DATA:
+                    self._handle_frame(connection, inner)
+        except ValueError as e:
+            logger.error(f"Invalid batch from {connection.address}: {e}")
+    
+    def _flush_acks(self, connection: Connection):
+        """Send a pending cumulative ACK"""
+        tracker = connection.ack_tracker
+        if tracker and tracker.pending:
+            connection.send(tracker.build_frame(), lane=LANE_CONTROL)
+    
+    def _process_handshake(self, connection: Connection, payload: bytes) -> Optional[bytes]:
+        """
+        Decode a handshake payload, negotiate options and return the packed ACK
+        
+        Returns:
+            None if the client must be dropped (user name taken)
+        """
+        message = decode_payload(payload)
+        logger.debug(f"Handshake from {connection.address}: {message}")
+        
+        selected = capabilities.select(capabilities.from_handshake(message), self.capabilities)
+        if selected["ack_mode"] == ACK_CUMULATIVE:
+            connection.ack_tracker = AckTracker()
+        connection.codec = selected["codec"]
+        if selected["compression"] == COMPRESSION_ZLIB:
+            connection.compress_threshold = self.compress_threshold
+        connection.max_frame_size = selected["max_frame_size"]
+        if selected["fragment"]:
+            connection.queue.fragment_size = min(self.fragment_size, selected["max_frame_size"])
+        connection.receive_batch = selected["receive_batch"]
+        
+        resume = {}
+        session = message.get("session")
+        if isinstance(session, str) and 0 < len(session) <= 64:
+            connection.session = session
+            connection.sequences = self._resume_session(session)
+            resume["resume"] = connection.sequences.contiguous()
+            if connection.ack_tracker:
+                connection.ack_tracker.highest = resume["resume"]
+        
+        user = message.get("user")
+        if isinstance(user, str) and 0 < len(user) <= 64 and not self._claim_user(connection, user):
+            return None
+        
+        # Flat fields: clients that predate capabilities read them as before
+        return Protocol.pack_message(
+            Protocol.create_ack(0, **selected, **resume,
+                                compress_threshold=connection.compress_threshold,
+                                fragment_size=connection.queue.fragment_size)
+        )
+    
+    def _claim_user(self, connection: Connection, user: str) -> bool:
+        """
+        Name a connection after the user its handshake claims
+        
+        Names are not authenticated (trusted LAN): a name held by a live
+        connection is only handed over to a connection of the same session,
+        i.e. the same client reconnecting before its old connection timed
+        out, which is then closed.
+        
+        Returns:
+            False if another session holds the name
+        """
+        with self.client_lock:
+            holder = self.users.get(user)
+            if holder is not None and (connection.session is None
+                                       or holder.session != connection.session):
+                logger.warning(f"User name {user!r} already in use, refusing {connection.address}")
+                return False
+            connection.user = user
+            connection.offline_backlog = self.offline_queue is not None
+            self.users[user] = connection
+        
+        if holder is not None:
+            logger.info(f"User {user} resumed from {connection.address}")
+            holder.close()
+        return True
+    
+    def _resume_session(self, session: str) -> SequenceWindow:
+        """Sequence window of a client session, kept across its reconnects"""
+        with self._session_lock:
+            window = self.sessions.get(session)
+            if window is None:
+                window = self.sessions[session] = SequenceWindow()
+                if len(self.sessions) > ServerConfig.MAX_SESSIONS:
+                    self.sessions.popitem(last=False)
+            else:
+                self.sessions.move_to_end(session)
+            return window
+    
+    def _process_message(self, connection: Connection, payload: bytes) -> bool:
+        """
+        Decode a payload and run the handlers, or queue them for the workers
+        
+        Returns:
+            False for heartbeat traffic, which is not acknowledged
+        """
+        message = decode_payload(payload)
+        client_address = connection.address
+        
+        logger.debug(f"Message from {client_address}: {message}")
+        
+        message_type = message.get("type")
+        if message_type == "HEARTBEAT":
+            self.send_to_client(client_address, Protocol.create_heartbeat_ack(),
+                                lane=LANE_CONTROL)
+            return False
+        elif message_type == "HEARTBEAT_ACK":
+            return False
+        elif message_type == "JOIN":
+            self.join_room(client_address, message.get("room"))
+        elif message_type == "LEAVE":
+            self.leave_room(client_address, message.get("room"))
+        
+        if self.executor is None:
+            self._run_handlers(client_address, message)
+        elif connection.deferred or not self._submit(connection, message):
+            # Acknowledged all the same: the message is held here until its
+            # worker has room, and the client is not read in the meantime
+            connection.deferred.append(message)
+            if not connection.throttled:
+                connection.throttle(ServerConfig.HANDLER_RETRY_DELAY)
+        return True
+    
+    def _run_handlers(self, client_address: tuple, message: dict):
+        """Call the registered handlers"""
+        for handler in self.message_handlers:
+            handler(client_address, message)
+    
+    def _submit(self, connection: Connection, message: dict) -> bool:
+        """Queue a message for the handler worker of its client; False if that one is full"""
+        try:
+            self.executor.submit(connection.address, self._run_handlers, connection.address,
+                                 message, block=False)
+        except queue.Full:
+            return False
+        return True
+    
+    def _submit_deferred(self, connection: Connection) -> bool:
+        """Queue the deferred messages in order; False, pausing the client, if the worker is full"""
+        deferred = connection.deferred
+        while deferred:
+            if not self._submit(connection, deferred[0]):
+                connection.throttle(ServerConfig.HANDLER_RETRY_DELAY)
+                return False
+            deferred.popleft()
+        return True
+    
+    def broadcast(self, message: Union[Message, dict, str, bytes],
+                  exclude_address: tuple = None, message_id: int = 0,
+                  key: Any = None) -> int:
+        """
+        Serialize and pack a message once per codec and queue it for every client
+        
+        All outbound queues of clients sharing a codec hold the same
+        immutable frame, so fan-out costs one serialization per codec in
+        use plus the writers' (vectored) sends. With the ``"coalesce"``
+        overflow policy, a full queue replaces its pending frame with the
+        same ``key`` (e.g. ``("presence", user)``) by this one.
+        
+        Returns:
+            Number of local clients the frame was queued for
+        """
+        encoded = EncodedMessage(message, message_id, key)
+        if self.bus:
+            encoded.frame(CODEC_JSON)  # pack before pickling for the other workers
+            self.bus.broadcast(encoded, exclude_address)
+        return self._fan_out(encoded, exclude_address)
+    
+    def _fan_out(self, encoded: EncodedMessage, exclude_address: tuple = None) -> int:
+        """Queue a message for every client"""
+        with self.client_lock:
+            connections = list(self.clients.items())
+        
+        lane = message_lane(encoded.message)
+        count = 0
+        for address, connection in connections:
+            if exclude_address and address == exclude_address:
+                continue
+            
+            if connection.send(encoded.frame(connection.codec, connection.compress_threshold),
+                               key=encoded.key, lane=lane):
+                count += 1
+        return count
+    
+    def publish(self, room: str, message: Union[Message, dict, str, bytes],
+                exclude_address: tuple = None, message_id: int = 0,
+                key: Any = None) -> int:
+        """
+        Send a message to the members of a room only
+        
+        ``key`` is the coalescing key, as for ``broadcast``.
+        
+        Returns:
+            Number of local members the frame was queued for
+        """
+        encoded = EncodedMessage(message, message_id, key)
+        if self.bus:
+            encoded.frame(CODEC_JSON)
+            self.bus.publish(room, encoded, exclude_address)
+        return self._deliver_to_room(room, encoded, exclude_address)
+    
+    def _deliver_to_room(self, room: str, encoded: EncodedMessage,
+                         exclude_address: tuple = None) -> int:
+        """Queue a message for a room's local members"""
+        lane = message_lane(encoded.message)
+        count = 0
+        for connection in self.rooms.members(room):
+            if exclude_address and connection.address == exclude_address:
+                continue
+            
+            if connection.send(encoded.frame(connection.codec, connection.compress_threshold),
+                               key=encoded.key, lane=lane):
+                count += 1
+        return count
+    
+    def _on_room_change(self, room: str, active: bool):
+        """Tell the other workers whether this one has members in a room"""
+        if self.bus:
+            self.bus.set_interest(room, active)
+    
+    def join_room(self, client_address: tuple, room: str) -> bool:
+        """Subscribe a connected client to a room"""
+        if not room:
+            return False
+        
+        with self.client_lock:
+            connection = self.clients.get(client_address)
+        
+        if connection is None:
+            return False
+        return self.rooms.join(room, connection)
+    
+    def leave_room(self, client_address: tuple, room: str) -> bool:
+        """Unsubscribe a connected client from a room"""
+        with self.client_lock:
+            connection = self.clients.get(client_address)
+        
+        if connection is None:
+            return False
+        return self.rooms.leave(room, connection)
+    
+    def get_room_members(self, room: str) -> list:
+        """Get the addresses of a room's members"""
+        return [connection.address for connection in self.rooms.members(room)]
+    
     def broadcast_message(self, message: str, exclude_address: tuple = None):
-        """Broadcast a message to all connected clients"""
+        """
+        Broadcast a message to all connected clients
+        
+        Frames are queued on each client's outbound queue, so this returns
+        immediately even if some clients are slow to read.
+        """
         try:
-            with self.client_lock:
-                for address, client_socket in self.clients.items():
-                    if exclude_address and address == exclude_address:
-                        continue
-                    
-                    try:
-                        client_socket.sendall(message.encode('utf-8'))
-                    except Exception as e:
-                        logger.error(f"Failed to send message to {address}: {e}")
+            self.broadcast(message, exclude_address)
         
         except Exception as e:
             logger.error(f"Error broadcasting message: {e}")
     
-    def send_to_client(self, client_address: tuple, message: str) -> bool:
-        """Send a message to a specific client"""
+    def reply(self, client_address: tuple, request: dict, response: dict) -> bool:
+        """Answer a client's request (``Client.request``) with a response message"""
+        return self.send_to_client(client_address,
+                                   dict(response, reply_to=request.get("request_id")))
+    
+    def send_to_user(self, user: str, message: Union[Message, dict]) -> bool:
+        """
+        Send a message to a user by name, storing it while they are offline
+        
+        Users name themselves at handshake (``Client(user=...)``), without
+        authentication (see ``_claim_user``). Stored messages are forwarded
+        in batch frames when the user connects again; until they all are,
+        new ones are stored behind them rather than sent ahead.
+        
+        Returns:
+            True if the message was queued for the user's connection or stored
+        """
+        with self.client_lock:
+            connection = self.users.get(user)
+        if connection is not None and not connection.offline_backlog:
+            return self.send_to_client(connection.address, message)
+        if self.offline_queue is None:
+            return False
+        
         try:
-            with self.client_lock:
-                if client_address in self.clients:
-                    self.clients[client_address].sendall(message.encode('utf-8'))
-                    return True
+            self.offline_queue.store(user, message)
+        except Exception as e:
+            logger.error(f"Error storing message for {user}: {e}")
             return False
         
+        # The user may have connected, or caught up, in the meantime
+        with self.client_lock:
+            connection = self.users.get(user)
+        if connection is not None:
+            self._forward_offline(connection, stored=True)
+        return True
+    
+    def _forward_offline(self, connection: Connection, stored: bool = False):
+        """
+        Send a user the messages stored while offline, oldest first
+        
+        Clients that read batch frames get up to ``ServerConfig.OFFLINE_BATCH``
+        messages per frame, within their frame size; a message too large for
+        the client is skipped and stays stored. Forwarding pauses while the client's outbound
+        queue is saturated and resumes once it drains. Stored messages are
+        deleted once their frame is written; the others are forwarded again
+        on the user's next connection. ``stored``: a message was just stored
+        for the user, possibly after the last pass found nothing.
+        """
+        user = connection.user
+        with self._offline_lock:
+            if stored:
+                connection.offline_backlog = True
+            try:
+                while connection.offline_backlog:
+                    if connection.queue.saturated:
+                        connection.on_drained = lambda: self._forward_offline(connection)
+                        if connection.queue.saturated:
+                            return
+                        connection.on_drained = None  # drained meanwhile
+                    
+                    stored = self.offline_queue.fetch(user, ServerConfig.OFFLINE_BATCH,
+                                                      after=connection.offline_cursor)
+                    if not stored:
+                        connection.offline_backlog = False
+                        return
+                    
+                    # A batch is compressed as a whole, not frame by frame
+                    threshold = 0 if connection.receive_batch else connection.compress_threshold
+                    frames = [(message_id, message_id,
+                               Protocol.pack_message(message, codec=connection.codec,
+                                                     compress_threshold=threshold))
+                              for message_id, message in stored]
+                    if connection.receive_batch:
+                        frames = self._batch_offline(connection, frames)
+                    
+                    for first, last, frame in frames:
+                        if not connection.fits(frame):
+                            logger.warning(f"Stored message {first} too large for {user}")
+                            connection.offline_cursor = last
+                            continue
+                        if not connection.send(frame, on_written=partial(
+                                self.offline_queue.remove, user, first, last)):
+                            return
+                        connection.offline_cursor = last
+                        if connection.queue.saturated:
+                            break
+            except Exception as e:
+                logger.error(f"Error forwarding stored messages to {user}: {e}")
+    
+    @staticmethod
+    def _batch_offline(connection: Connection, frames: list) -> list:
+        """Group (first ID, last ID, frame) entries into batch frames the client accepts"""
+        limit = connection.max_frame_size
+        groups = [[]]
+        size = 0
+        for entry in frames:
+            if groups[-1] and not connection.queue.fragment_size and size + len(entry[2]) > limit:
+                groups.append([])
+                size = 0
+            groups[-1].append(entry)
+            size += len(entry[2])
+        
+        return [(group[0][0], group[-1][1],
+                 Protocol.pack_batch([frame for _, _, frame in group],
+                                     connection.compress_threshold))
+                for group in groups]
+    
+    def send_to_client(self, client_address: tuple,
+                       message: Union[Message, dict, str, bytes],
+                       lane: Optional[int] = None,
+                       key: Any = None) -> bool:
+        """
+        Send a message to a specific client, encoded with its codec and compression
+        
+        The priority lane defaults to the one of the message's type; ``key``
+        is the coalescing key, as for ``broadcast``.
+        """
+        try:
+            with self.client_lock:
+                connection = self.clients.get(client_address)
+            
+            if connection is None:
+                return False
+            return connection.send(Protocol.pack_message(
+                message, codec=connection.codec,
+                compress_threshold=connection.compress_threshold
+            ), key=key, lane=message_lane(message) if lane is None else lane)
+        
         except Exception as e:
             logger.error(f"Error sending message to {client_address}: {e}")
             return False
@@ -187,6 +782,35 @@ class Server:
         with self.client_lock:
             return len(self.clients)
     
+    def get_flow_stats(self) -> dict:
+        """
+        Flow control counters
+        
+        Returns:
+            ``paused``: clients currently not being read from;
+            ``pause_events``: times any client was paused since start
+        """
+        with self.client_lock:
+            connections = list(self.clients.values())
+            retired = self._retired_pause_events
+        
+        return {
+            "paused": sum(1 for connection in connections if connection.queue.saturated),
+            "pause_events": retired + sum(connection.pause_events for connection in connections)
+        }
+    
+    def get_admission_stats(self) -> dict:
+        """Admission counters plus the number of rate-limit pauses"""
+        with self.client_lock:
+            connections = list(self.clients.values())
+        
+        stats = self.admission.get_stats()
+        stats["rate_limited"] = sum(
+            connection.rate_limiter.limited
+            for connection in connections if connection.rate_limiter
+        )
+        return stats
+    
     def get_connected_clients(self) -> list:
         """Get list of connected client addresses"""
         with self.client_lock:
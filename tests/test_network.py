@@ -1,14 +1,73 @@
 """Tests for network module"""
 
+import asyncio
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+
 import pytest
 from src.network.server import Server
+from src.network.codec import BinaryCodec, decode_payload
+from src.network.compression import compress_payload, decompress_payload
+from src.network.admission import AdmissionController, TokenBucket
+from src.network import capabilities
+from src.network.correlation import RequestTracker
+from src.network.connection import (
+    AckTracker, Connection, OutboundQueue, RetransmitBuffer, SequenceWindow, send_frames
+)
+from src.network.executor import KeyedExecutor
+from src.network.handlers import MessageHandler
+from src.database.db import Database
+from src.network.offline import OfflineQueue
+from src.network.lanes import (
+    LANE_CONTROL, LANE_INTERACTIVE, LaneScheduler, message_lane
+)
+from src.network.heartbeat import TimerWheel
+from src.network.rooms import RoomRegistry
+from src.network.schema import REGISTRY, Field, MessageRegistry, TextPayload
+from src.network.cluster import ServerCluster
 from src.network.client import Client
-from src.network.protocol import Protocol, TextMessage
+from src.network.async_client import AsyncClient, backoff_delay
+from src.core.enums import ConnectionStatus
+from src.network.protocol import (
+    Protocol, Message, TextMessage, CallMessage, FileMessage, FrameDecoder, FRAME_ACK,
+    FRAME_BATCH, FLAG_COMPRESSED, FLAG_FIRST, MESSAGE_HEADER_SIZE
+)
 from src.utils.logger import setup_logging
 
 setup_logging()
 
 
+def _connect_raw(server: Server) -> socket.socket:
+    """Open a raw socket to a running server and complete the handshake"""
+    sock = socket.create_connection(("127.0.0.1", server.port), timeout=5)
+    sock.sendall(Protocol.pack_message(Protocol.create_handshake().encode('utf-8')))
+    assert _recv_frame(sock)["type"] == "ACK"
+    return sock
+
+
+def _recv_payload(sock: socket.socket) -> bytes:
+    """Read exactly one frame from a socket and return its (decompressed) payload"""
+    header = b""
+    while len(header) < 20:
+        header += sock.recv(20 - len(header))
+    msg_id, size = Protocol.unpack_header(header)
+    payload = b""
+    while len(payload) < size:
+        payload += sock.recv(size - len(payload))
+    return Protocol.unpack_message(header + payload)[1]
+
+
+def _recv_frame(sock: socket.socket) -> dict:
+    """Read exactly one frame from a socket and decode its JSON payload"""
+    return json.loads(_recv_payload(sock))
+
+
 class TestProtocol:
     """Test Protocol class"""
     
@@ -21,12 +80,69 @@ class TestProtocol:
         assert msg_id == 0
         assert payload == msg.to_json().encode('utf-8')
     
+    def test_message_serialization(self):
+        """Test the direct JSON form matches the dict form and is cached"""
+        msg = FileMessage(sender="zoé", filename='a "b".pdf', filesize=12, message_id="m1")
+        
+        assert not hasattr(msg, "__dict__")
+        assert isinstance(msg.timestamp, int)
+        assert json.loads(msg.to_bytes()) == msg.to_dict()
+        assert msg.to_bytes() is msg.to_bytes()
+        assert decode_payload(msg.to_bytes("binary")) == msg.to_dict()
+        
+        legacy = json.dumps({**msg.to_dict(), "timestamp": "2026-01-15T10:00:00"})
+        assert Message.from_json(legacy).created_at == datetime(2026, 1, 15, 10)
+    
+    def test_compressed_round_trip(self):
+        """Test large payloads are compressed and small ones left alone"""
+        log = "\n".join(f"2026-01-01 12:00:{i % 60:02d} INFO worker {i} ready"
+                        for i in range(200))
+        msg = TextMessage(sender="test", content=log)
+        packed = Protocol.pack_message(msg, 5, compress_threshold=1024)
+        
+        assert Protocol.unpack_frame_header(packed)[3] & FLAG_COMPRESSED
+        assert len(packed) < len(msg.to_json()) / 4
+        msg_id, payload = Protocol.unpack_message(packed)
+        assert msg_id == 5
+        assert json.loads(payload)["content"] == {"text": log}
+        
+        small = Protocol.pack_message(b"hi", compress_threshold=1024)
+        assert Protocol.unpack_frame_header(small)[3] == 0
+        # Incompressible payloads are sent as they are
+        noise = os.urandom(512)
+        assert Protocol.pack_message(noise, compress_threshold=16)[20:] == noise
+    
+    def test_decompression_bounded(self):
+        """Test rejecting corrupt payloads and payloads inflating past the cap"""
+        with pytest.raises(ValueError):
+            decompress_payload(compress_payload(b"x" * 10000), 1000)
+        with pytest.raises(ValueError):
+            decompress_payload(b"not deflate", 1000)
+    
     def test_create_handshake(self):
         """Test creating a handshake message"""
         handshake = Protocol.create_handshake()
         assert "HANDSHAKE" in handshake
         assert "protocol_version" in handshake
     
+    def test_batch_round_trip(self):
+        """Test a batch frame carries frames with their own IDs and flags"""
+        frames = [Protocol.pack_message(f"line {i}".encode('utf-8'), i + 1) for i in range(50)]
+        frames.append(Protocol.pack_message(b"y" * 4000, 51, compress_threshold=1024))
+        batch = Protocol.pack_batch(frames, compress_threshold=1024)
+        
+        msg_id, size, frame_type, flags = Protocol.unpack_frame_header(batch)
+        assert frame_type == FRAME_BATCH
+        assert flags & FLAG_COMPRESSED
+        payload = Protocol.unpack_message(batch)[1]
+        inner = [(f.message_id, bytes(f.payload)) for f in Protocol.unpack_batch(payload)]
+        assert inner[:50] == [(i + 1, f"line {i}".encode('utf-8')) for i in range(50)]
+        assert inner[50] == (51, b"y" * 4000)
+        
+        assert Protocol.pack_batch(frames[:1]) is frames[0]
+        with pytest.raises(ValueError):
+            list(Protocol.unpack_batch(b"".join(frames[:2])[:-3]))
+    
     def test_create_ack(self):
         """Test creating an acknowledgment"""
         ack = Protocol.create_ack(123)
@@ -34,6 +150,864 @@ class TestProtocol:
         assert "message_id" in ack
 
 
+def _cluster_setup(server: Server):
+    """Worker setup used by the cluster tests"""
+    def handler(address, message):
+        if message.get("type") == "SHOUT":
+            server.broadcast({"type": "TEXT", "content": message["content"]})
+        elif message.get("type") == "ROOM_SHOUT":
+            server.publish(message["room"], {"type": "TEXT", "room": message["room"]})
+    
+    server.register_message_handler(handler)
+
+
+class TestBinaryCodec:
+    """Test the compact binary payload codec"""
+    
+    def test_round_trip(self):
+        """Test known and unknown fields, nesting and scalar types"""
+        data = {
+            "type": "CUSTOM", "room": "lobby", "score": -42, "ratio": 0.5,
+            "flags": [True, False, None], "nested": {"big": 2 ** 70, "text": "héllo"}
+        }
+        assert BinaryCodec.decode(BinaryCodec.encode(data)) == data
+    
+    def test_messages_smaller_than_json(self):
+        """Test TEXT, CALL and FILE messages shrink and keep their fields"""
+        for message in (TextMessage(sender="alice", content="Hello"),
+                        CallMessage(sender="bob", call_type="video", action="initiate"),
+                        FileMessage(sender="carol", filename="a.pdf", filesize=123456)):
+            data = message.to_dict()
+            encoded = BinaryCodec.encode(data)
+            decoded = decode_payload(encoded)
+            
+            assert len(encoded) < len(message.to_json()) / 2
+            assert decoded["message_type"] == data["message_type"]
+            assert decoded["content"] == data["content"]
+            assert decoded["timestamp"] == data["timestamp"]
+    
+    def test_json_detection(self):
+        """Test decode_payload still accepts JSON"""
+        assert decode_payload(b'{"type": "PING"}') == {"type": "PING"}
+    
+    def test_truncated(self):
+        """Test rejecting a truncated payload"""
+        encoded = BinaryCodec.encode({"text": "hello"})
+        with pytest.raises(ValueError):
+            BinaryCodec.decode(encoded[:-2])
+
+
+class TestMessageRegistry:
+    """Test message schemas, generated decoders and typed dispatch"""
+    
+    def test_decode_standard_messages(self):
+        """Test TEXT, CALL and FILE payloads become typed objects"""
+        text = REGISTRY.decode(TextMessage(sender="alice", content="Hello").to_dict())
+        assert isinstance(text, TextPayload)
+        assert (text.sender, text.text) == ("alice", "Hello")
+        
+        call = REGISTRY.decode(CallMessage(sender="bob", call_type="video",
+                                           action="initiate").to_dict())
+        assert (call.call_type, call.action, call.target) == ("video", "initiate", None)
+        
+        file = REGISTRY.decode(FileMessage(sender="carol", filename="a.pdf",
+                                           filesize=12).to_dict())
+        assert (file.filename, file.filesize) == ("a.pdf", 12)
+    
+    def test_reject_malformed(self):
+        """Test wrong types, bounds, choices and missing objects"""
+        base = TextMessage(sender="alice", content="Hello").to_dict()
+        for content in ({"text": 5}, {"text": "x" * 10001}, "Hello", None):
+            with pytest.raises(ValueError):
+                REGISTRY.decode({**base, "content": content})
+        
+        call = CallMessage(sender="bob", call_type="video", action="initiate").to_dict()
+        call["content"]["action"] = "explode"
+        with pytest.raises(ValueError):
+            REGISTRY.decode(call)
+        
+        file = FileMessage(sender="carol", filename="a.pdf", filesize=12).to_dict()
+        file["content"]["filesize"] = True
+        with pytest.raises(ValueError):
+            REGISTRY.decode(file)
+    
+    def test_custom_schema(self):
+        """Test registering a type and dispatching it by code"""
+        registry = MessageRegistry()
+        Typing = registry.register("TYPING", Field("user", (str,)),
+                                   Field("active", (bool,), "state.active", required=False))
+        handler = MessageHandler(registry)
+        seen = []
+        handler.register("TYPING", seen.append)
+        handler.register("LEGACY", lambda message: message["value"])
+        
+        handler.handle({"type": "TYPING", "user": "alice", "state": {"active": True}})
+        handler.handle({"type": "TYPING", "user": 3})
+        assert seen == [Typing("alice", True)]
+        assert Typing.code == 0 and seen[0].get("active")
+        assert handler.handle({"type": "LEGACY", "value": 7}) == 7
+        
+        with pytest.raises(ValueError):
+            registry.register("TYPING")
+
+
+class TestMiddleware:
+    """Test MessageHandler middleware chains"""
+    
+    def test_order_and_rewrite(self):
+        """Test global middleware wraps per-type middleware, both in order added"""
+        handler = MessageHandler()
+        calls = []
+        
+        def tag(name):
+            def middleware(message, call_next):
+                calls.append(name)
+                return call_next(dict(message, path=message.get("path", "") + name))
+            return middleware
+        
+        handler.register("CUSTOM", lambda message: message["path"])
+        handler.use(tag("b"), "CUSTOM")
+        handler.use(tag("a"))
+        handler.use(tag("c"), "CUSTOM")
+        handler.use(tag("x"), "OTHER")
+        assert handler.handle({"type": "CUSTOM"}) == "abc"
+        assert calls == ["a", "b", "c"]
+    
+    def test_short_circuit(self):
+        """Test middleware can stop a message before the handler"""
+        handler = MessageHandler()
+        handled = []
+        handler.register("TEXT", handled.append)
+        handler.use(lambda message, call_next: (None if message.sender == "spammer"
+                                                else call_next(message)))
+        
+        for sender in ("spammer", "alice"):
+            handler.handle({"type": "TEXT", "sender": sender, "content": {"text": "hi"}})
+        assert [message.sender for message in handled] == ["alice"]
+    
+    def test_composed_once(self):
+        """Test an empty chain dispatches to the handler itself"""
+        handler = MessageHandler()
+        target = lambda message: message  # noqa: E731
+        handler.register("CUSTOM", target)
+        assert handler._chains["CUSTOM"] is target
+        
+        handler.use(lambda message, call_next: call_next(message))
+        chain = handler._chains["CUSTOM"]
+        assert chain is not target
+        handler.handle({"type": "CUSTOM"})
+        assert handler._chains["CUSTOM"] is chain
+        assert handler.get_handler("CUSTOM") is target
+
+
+class TestKeyedDispatch:
+    """Test worker pool dispatch of MessageHandler"""
+    
+    def test_per_key_order(self):
+        """Test tasks of one key run in submission order across workers"""
+        executor = KeyedExecutor(workers=4, max_pending=16)
+        seen = {key: [] for key in "abcdef"}
+        futures = [executor.submit(key, seen[key].append, n)
+                   for n in range(200) for key in "abcdef"]
+        for future in futures:
+            future.result(5)
+        executor.shutdown()
+        assert all(values == list(range(200)) for values in seen.values())
+    
+    def test_slow_sender_does_not_block_others(self):
+        """Test a blocked handler only holds back its own sender's messages"""
+        handler = MessageHandler(workers=2)
+        release = threading.Event()
+        handled = []
+        
+        def handle(message):
+            if message["sender"] == "slow":
+                release.wait(5)
+            handled.append(message["sender"])
+            return message["sender"]
+        
+        handler.register("CUSTOM", handle)
+        senders = ["slow"]
+        # A sender hashing to another worker than "slow"
+        senders.append(next(f"user{n}" for n in range(100)
+                            if hash(f"user{n}") % 2 != hash("slow") % 2))
+        slow = handler.submit({"type": "CUSTOM", "sender": senders[0]})
+        fast = handler.submit({"type": "CUSTOM", "sender": senders[1]})
+        
+        assert fast.result(5) == senders[1]
+        assert not slow.done()
+        assert handler.get_dispatch_stats()["CUSTOM"]["queued"] == 1
+        release.set()
+        assert slow.result(5) == "slow"
+        handler.shutdown()
+        
+        stats = handler.get_dispatch_stats()["CUSTOM"]
+        assert stats["queued"] == 0
+        assert stats["handled"] == 2
+        assert 0 < stats["latency_avg"] <= stats["latency_max"]
+    
+    def test_control_lane_first(self):
+        """Test a control task overtakes the chat tasks queued on its worker"""
+        executor = KeyedExecutor(workers=1)
+        release = threading.Event()
+        order = []
+        executor.submit("busy", release.wait, 5)
+        futures = [executor.submit(n, order.append, f"chat {n}") for n in range(3)]
+        futures.append(executor.submit("call", order.append, "accept", lane=LANE_CONTROL))
+        release.set()
+        for future in futures:
+            future.result(5)
+        executor.shutdown()
+        
+        assert order == ["accept", "chat 0", "chat 1", "chat 2"]
+        with pytest.raises(RuntimeError):
+            executor.submit("late", order.append, "late")
+    
+    def test_full_worker_fails_fast(self):
+        """Test a non-blocking submit to a full worker raises instead of waiting"""
+        handler = MessageHandler(workers=1, max_pending=1)
+        release = threading.Event()
+        handler.register("CUSTOM", lambda message: release.wait(5))
+        running = handler.submit({"type": "CUSTOM", "sender": "a"})
+        deadline = time.monotonic() + 5
+        while not running.running() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        queued = handler.submit({"type": "CUSTOM", "sender": "a"}, block=False)
+        
+        with pytest.raises(queue.Full):
+            handler.submit({"type": "CUSTOM", "sender": "a"}, block=False)
+        assert handler.get_dispatch_stats()["CUSTOM"]["queued"] == 2
+        release.set()
+        assert queued.result(5)
+        handler.shutdown()
+    
+    def test_inline_without_workers(self):
+        """Test submit handles in the caller when no pool is configured"""
+        handler = MessageHandler(workers=0)
+        handler.register("CUSTOM", lambda message: threading.get_ident())
+        assert handler.submit({"type": "CUSTOM"}).result(0) == threading.get_ident()
+        assert handler.get_dispatch_stats()["CUSTOM"]["handled"] == 1
+
+
+class TestLanes:
+    """Test priority lane classification and scheduling"""
+    
+    def test_message_lane(self):
+        """Test lanes follow the message type"""
+        assert message_lane(CallMessage("alice", "audio", "accept", "bob")) == LANE_CONTROL
+        assert message_lane({"type": "HEARTBEAT"}) == LANE_CONTROL
+        assert message_lane(TextMessage("alice", "hi")) == LANE_INTERACTIVE
+        assert message_lane(FileMessage("alice", "a.bin", 10)) == LANE_INTERACTIVE
+        assert message_lane(b"raw") == LANE_INTERACTIVE
+    
+    def test_weighted_round_robin(self):
+        """Test busy lanes share picks by weight, spread out, idle ones give way"""
+        scheduler = LaneScheduler((2, 1))
+        lanes = ([1], [1])
+        assert [scheduler.pick(lanes) for _ in range(6)] == [0, 1, 0, 0, 1, 0]
+        
+        assert {scheduler.pick(([], [1])) for _ in range(5)} == {1}
+        with pytest.raises(ValueError):
+            LaneScheduler((1, 0))
+        with pytest.raises(ValueError):
+            LaneScheduler((1, 1, 1))
+
+
+class TestCapabilities:
+    """Test capability negotiation"""
+    
+    SERVER = capabilities.offer(codecs=("json", "binary"), ack_modes=("per_message", "cumulative"),
+                                compression=("zlib",), batch=True, fragment=True,
+                                max_frame_size=1024)
+    
+    def test_fastest_common_options(self):
+        """Test the fastest option both sides support is selected, whatever the order"""
+        offered = capabilities.offer(codecs=("binary", "json"),
+                                     ack_modes=("per_message", "cumulative"),
+                                     compression=("none", "zlib"), batch=True, fragment=True,
+                                     max_frame_size=4096)
+        assert capabilities.select(offered, self.SERVER) == {
+            "codec": "json", "ack_mode": "cumulative", "compression": "zlib",
+            "encryption": "none", "batch": True, "fragment": True, "max_frame_size": 1024,
+            "receive_batch": False
+        }
+    
+    def test_unsupported_options_fall_back(self):
+        """Test options the server lacks, or unknown ones, give the defaults"""
+        server = capabilities.offer(codecs=("json",))
+        offered = capabilities.offer(codecs=("binary", "msgpack"), ack_modes=("cumulative",),
+                                     compression=("zlib",), encryption=("aes-gcm",),
+                                     batch=True, fragment=True, max_frame_size=512)
+        assert capabilities.select(offered, server) == {
+            "codec": "json", "ack_mode": "per_message", "compression": "none",
+            "encryption": "none", "batch": False, "fragment": False, "max_frame_size": 512,
+            "receive_batch": False
+        }
+    
+    def test_legacy_handshake_fields(self):
+        """Test a handshake without capabilities negotiates its single-option fields"""
+        message = json.loads(Protocol.create_handshake(ack_mode="cumulative", codec="binary",
+                                                       batch=True))
+        assert capabilities.select(capabilities.from_handshake(message), self.SERVER) == {
+            "codec": "binary", "ack_mode": "cumulative", "compression": "none",
+            "encryption": "none", "batch": True, "fragment": False, "max_frame_size": 1024,
+            "receive_batch": False
+        }
+        assert capabilities.select(capabilities.from_handshake({}), self.SERVER)["codec"] == "json"
+    
+    def test_malformed_offer(self):
+        """Test malformed capability values are ignored"""
+        offered = {"codecs": "binary", "ack_modes": None, "batch": "yes", "max_frame_size": -1}
+        selected = capabilities.select(offered, self.SERVER)
+        assert selected["codec"] == "json"
+        assert selected["ack_mode"] == "per_message"
+        assert selected["batch"] is False
+        assert selected["max_frame_size"] == 1024
+
+
+class TestFrameDecoder:
+    """Test FrameDecoder class"""
+    
+    def test_coalesced_frames(self):
+        """Test one read delivering many frames"""
+        decoder = FrameDecoder()
+        decoder.feed(b"".join(
+            Protocol.pack_message(f"msg {i}".encode('utf-8'), i) for i in range(40)
+        ))
+        
+        frames = [(f.message_id, bytes(f.payload)) for f in decoder.frames()]
+        assert frames == [(i, f"msg {i}".encode('utf-8')) for i in range(40)]
+        assert decoder.buffered == 0
+    
+    def test_split_frame(self):
+        """Test a frame split across reads, including inside the header"""
+        decoder = FrameDecoder(read_size=16)
+        packed = Protocol.pack_message(b"x" * 100, 3)
+        
+        for offset in range(0, len(packed), 7):
+            assert not [bytes(f.payload) for f in decoder.frames()]
+            decoder.feed(packed[offset:offset + 7])
+        
+        assert [(f.message_id, bytes(f.payload)) for f in decoder.frames()] == [(3, b"x" * 100)]
+    
+    def test_recv_into(self):
+        """Test reading through get_buffer/buffer_updated"""
+        decoder = FrameDecoder()
+        packed = Protocol.pack_message(b"hello", 1) * 3
+        
+        buffer = decoder.get_buffer()
+        buffer[:len(packed)] = packed
+        decoder.buffer_updated(len(packed))
+        
+        payloads = [bytes(f.payload) for f in decoder.frames()]
+        assert payloads == [b"hello"] * 3
+    
+    def test_fragment_reassembly(self):
+        """Test interleaved fragment streams between regular frames"""
+        big = Protocol.pack_message(b"a" * 5000, 7)
+        compressed = Protocol.pack_message(b"b" * 5000, 8, compress_threshold=100)
+        first = Protocol.fragment(big, 1000, stream_id=1)
+        second = Protocol.fragment(compressed, 10, stream_id=2)
+        
+        decoder = FrameDecoder()
+        decoder.feed(first[0] + second[0] + Protocol.pack_message(b"chat", 9))
+        decoder.feed(b"".join(second[1:]) + b"".join(first[1:]))
+        
+        frames = [(f.message_id, bytes(f.payload)) for f in decoder.frames()]
+        assert frames == [(9, b"chat"), (8, b"b" * 5000), (7, b"a" * 5000)]
+    
+    def test_fragment_errors(self):
+        """Test the reassembly memory cap and fragments of unknown streams"""
+        fragments = Protocol.fragment(Protocol.pack_message(b"x" * 5000), 1000)
+        decoder = FrameDecoder(max_reassembly=3000)
+        decoder.feed(b"".join(fragments))
+        with pytest.raises(ValueError):
+            list(decoder.frames())
+        
+        decoder = FrameDecoder()
+        decoder.feed(fragments[1])
+        with pytest.raises(ValueError):
+            list(decoder.frames())
+    
+    def test_oversized_frame(self):
+        """Test rejecting a frame above the size bound"""
+        decoder = FrameDecoder(max_frame_size=64)
+        decoder.feed(Protocol.pack_message(b"x" * 65)[:40])
+        
+        with pytest.raises(ValueError):
+            list(decoder.frames())
+    
+    def test_invalid_magic(self):
+        """Test rejecting garbage"""
+        decoder = FrameDecoder()
+        decoder.feed(b"X" * 40)
+        
+        with pytest.raises(ValueError):
+            list(decoder.frames())
+    
+    def test_legacy_handshake(self):
+        """Test an unframed JSON handshake followed by frames"""
+        decoder = FrameDecoder(legacy_handshake=True)
+        handshake = Protocol.create_handshake().encode('utf-8')
+        decoder.feed(handshake + Protocol.pack_message(b"{}", 5))
+        
+        frames = [(f.message_id, bytes(f.payload)) for f in decoder.frames()]
+        assert frames == [(0, handshake), (5, b"{}")]
+
+
+class TestOutboundQueue:
+    """Test OutboundQueue class"""
+    
+    def test_fifo(self):
+        """Test frames come out in order"""
+        queue = OutboundQueue(max_frames=10)
+        for i in range(3):
+            assert queue.put(bytes([i]))
+        
+        assert [queue.get_nowait() for _ in range(4)] == [b"\x00", b"\x01", b"\x02", None]
+    
+    def test_drop_oldest(self):
+        """Test the drop_oldest policy"""
+        queue = OutboundQueue(max_frames=2, policy="drop_oldest")
+        for data in (b"a", b"b", b"c"):
+            assert queue.put(data)
+        
+        assert queue.dropped == 1
+        assert [queue.get_nowait(), queue.get_nowait()] == [b"b", b"c"]
+    
+    def test_byte_bound(self):
+        """Test the byte bound"""
+        queue = OutboundQueue(max_frames=100, max_bytes=10, policy="drop_oldest")
+        queue.put(b"x" * 6)
+        queue.put(b"y" * 6)
+        
+        assert len(queue) == 1
+        assert queue.buffered_bytes == 6
+    
+    def test_disconnect(self):
+        """Test the disconnect policy"""
+        queue = OutboundQueue(max_frames=1, policy="disconnect")
+        assert queue.put(b"a")
+        assert not queue.put(b"b")
+        assert queue.overflowed
+        assert queue.closed
+    
+    def test_coalesce(self):
+        """Test the coalesce policy"""
+        queue = OutboundQueue(max_frames=2, policy="coalesce")
+        queue.put(b"typing 1", key="typing")
+        queue.put(b"text")
+        queue.put(b"typing 2", key="typing")
+        
+        assert [queue.get_nowait(), queue.get_nowait()] == [b"typing 2", b"text"]
+    
+    def test_fragment_interleaving(self):
+        """Test large frames yield to regular frames one fragment at a time"""
+        queue = OutboundQueue(fragment_size=1000)
+        queue.put(Protocol.pack_message(b"x" * 4500, 1))
+        queue.put(b"chat 1")
+        
+        assert queue.get_nowait() == b"chat 1"
+        fragments = [queue.get_nowait()]
+        assert Protocol.unpack_frame_header(fragments[0])[3] & FLAG_FIRST
+        queue.put(b"chat 2")
+        queue.put(b"chat 3")
+        batch = queue.get_many(8)
+        assert batch[:2] == [b"chat 2", b"chat 3"] and len(batch) == 3
+        fragments.append(batch[2])
+        
+        while len(queue):
+            fragments.extend(queue.get_many(1))
+        assert len(fragments) == 5 and queue.buffered_bytes == 0
+        decoder = FrameDecoder()
+        decoder.feed(b"".join(fragments))
+        assert [bytes(f.payload) for f in decoder.frames()] == [b"x" * 4500]
+    
+    def test_written_callbacks(self):
+        """Test on_written follows its frame: after the last fragment, never once dropped"""
+        written = []
+        queue = OutboundQueue(max_frames=1, policy="drop_oldest", fragment_size=1000)
+        queue.put(b"dropped", on_written=lambda: written.append("dropped"))
+        queue.put(b"kept", on_written=lambda: written.append("kept"))
+        queue.put(b"x" * 2500, on_written=lambda: written.append("stream"))
+        
+        assert queue.get_nowait() == b"kept"
+        assert queue.pop_written()[0]() is None and written == ["kept"]
+        queue.get_nowait()
+        assert queue.pop_written() == []
+        while len(queue):
+            queue.get_nowait()
+        [callback] = queue.pop_written()
+        callback()
+        assert written == ["kept", "stream"]
+        
+        queue.put(b"closed", on_written=lambda: written.append("closed"))
+        queue.get_nowait()
+        queue.close()
+        assert queue.pop_written() == []
+    
+    def test_priority_lanes(self):
+        """Test control frames go first and the others keep their order, whatever their size"""
+        queue = OutboundQueue()
+        queue.put(b"h" * 20000)
+        queue.put(b"chat 1")
+        queue.put(b"chat 2")
+        queue.put(b"accept", lane=LANE_CONTROL)
+        
+        assert [queue.get_nowait() for _ in range(4)] == [
+            b"accept", b"h" * 20000, b"chat 1", b"chat 2"
+        ]
+    
+    def test_drop_interactive_first(self):
+        """Test drop_oldest sheds chat frames before older control frames"""
+        queue = OutboundQueue(max_frames=2, policy="drop_oldest")
+        queue.put(b"ack", lane=LANE_CONTROL)
+        queue.put(b"chat 1")
+        queue.put(b"chat 2")
+        
+        assert queue.dropped == 1
+        assert [queue.get_nowait(), queue.get_nowait()] == [b"ack", b"chat 2"]
+    
+    def test_unknown_policy(self):
+        """Test rejecting an unknown policy"""
+        with pytest.raises(ValueError):
+            OutboundQueue(policy="block")
+    
+    def test_reject_and_drain(self):
+        """Test the reject policy refuses frames and a draining queue empties before closing"""
+        queue = OutboundQueue(max_frames=1, policy="reject")
+        assert queue.put(b"a")
+        assert not queue.put(b"b")
+        assert queue.dropped == 1 and not queue.closed
+        
+        queue.close(drain=True)
+        assert not queue.put(b"c")
+        assert queue.get(timeout=1) == b"a"
+        assert queue.get(timeout=1) is None
+    
+    def test_watermarks(self):
+        """Test saturation turns on at the high mark and off at the low mark"""
+        changes = []
+        queue = OutboundQueue(max_frames=8, max_bytes=1 << 20, high_water=0.5,
+                              low_water=0.25, on_saturation=lambda: changes.append(queue.saturated))
+        for i in range(4):
+            queue.put(b"x")
+        assert queue.saturated and changes == [True]
+        
+        queue.get_nowait()
+        assert queue.saturated
+        queue.get_many(2)
+        assert not queue.saturated and changes == [True, False]
+        assert queue.saturation_events == 1
+    
+    def test_send_frames_vectored(self):
+        """Test gathering many frames, larger than the socket buffer, in order"""
+        left, right = socket.socketpair()
+        frames = [bytes([i]) * 50000 for i in range(20)]
+        
+        writer = threading.Thread(target=send_frames, args=(left, frames))
+        writer.start()
+        
+        received = b""
+        while len(received) < 50000 * 20:
+            received += right.recv(1 << 20)
+        writer.join()
+        
+        assert received == b"".join(frames)
+        left.close()
+        right.close()
+
+
+class TestAckTracker:
+    """Test cumulative ACK bookkeeping"""
+    
+    def test_contiguous(self):
+        """Test the contiguous point advances in order"""
+        tracker = AckTracker(every=3)
+        assert not tracker.record(1)
+        assert not tracker.record(2)
+        assert tracker.record(3)
+        assert tracker.highest == 3
+        assert tracker.ranges() == []
+    
+    def test_out_of_order(self):
+        """Test gaps are reported as selective ranges and then filled"""
+        tracker = AckTracker(every=100)
+        for message_id in (1, 3, 4, 6):
+            tracker.record(message_id)
+        assert tracker.highest == 1
+        assert tracker.ranges() == [(3, 4), (6, 6)]
+        
+        tracker.record(2)
+        assert tracker.highest == 4
+        assert tracker.ranges() == [(6, 6)]
+    
+    def test_frame_round_trip(self):
+        """Test packing and decoding a cumulative ACK frame"""
+        tracker = AckTracker(every=100)
+        for message_id in (1, 2, 5):
+            tracker.record(message_id)
+        
+        decoder = FrameDecoder()
+        decoder.feed(tracker.build_frame())
+        frame = next(decoder.frames())
+        assert frame.frame_type == FRAME_ACK
+        assert frame.message_id == 2
+        assert Protocol.unpack_cumulative_ack(frame.payload) == [(5, 5)]
+        assert tracker.pending == 0
+
+
+class TestSequenceWindow:
+    """Test the duplicate detection window"""
+    
+    def test_duplicates(self):
+        """Test repeated sequences are rejected, in or out of order"""
+        window = SequenceWindow(size=8)
+        assert [window.accept(n) for n in (1, 2, 2, 4, 3, 3, 0, 0)] == [
+            True, True, False, True, True, False, True, True
+        ]
+        assert window.contiguous() == 4
+    
+    def test_slides(self):
+        """Test sequences behind the window count as duplicates"""
+        window = SequenceWindow(size=8)
+        for sequence in (1, 2, 12):
+            assert window.accept(sequence)
+        assert not window.accept(4)
+        assert window.accept(5)
+        assert not window.accept(5)
+        assert window.highest == 12
+        assert window.contiguous() == 5
+        assert window._bits < 1 << 8
+    
+    def test_jump_past_window(self):
+        """Test a far-ahead sequence resets the bits instead of shifting them"""
+        window = SequenceWindow(size=8)
+        assert window.accept(3)
+        assert window.accept(2 ** 40)
+        assert window._bits == 1
+        assert not window.accept(3)
+        assert window.accept(2 ** 40 - 1)
+
+
+class TestRetransmitBuffer:
+    """Test the client's unacknowledged frames and their delivery futures"""
+    
+    def test_delivery_futures(self):
+        """Test futures complete on cumulative or selective acknowledgement, or on discard"""
+        buffer = RetransmitBuffer(size=3)
+        futures = {}
+        for sequence in range(1, 4):
+            futures[sequence] = Future()
+            buffer.add(sequence, b"frame", futures[sequence])
+        
+        # A full window refuses new frames and leaves those in flight alone
+        assert buffer.full
+        with pytest.raises(BufferError):
+            buffer.add(4, b"frame", Future())
+        assert not any(future.done() for future in futures.values())
+        
+        buffer.acknowledge(1, [(3, 3)])
+        assert futures[1].result(0) == 1 and futures[3].result(0) == 3
+        assert not futures[2].done() and not buffer.full
+        
+        buffer.discard(2, BufferError("full"))
+        with pytest.raises(BufferError):
+            futures[2].result(0)
+        assert not buffer
+
+
+class TestOfflineQueue:
+    """Test the store-and-forward queue of offline recipients"""
+    
+    def test_per_recipient_order_and_limit(self):
+        """Test each recipient's messages come back in order, oldest dropped beyond the limit"""
+        queue = OfflineQueue(Database(":memory:", check_same_thread=False), max_per_user=3)
+        for n in range(5):
+            queue.store("bob", {"type": "CUSTOM", "n": n})
+        queue.store("carol", TextMessage("alice", "hi"))
+        
+        assert queue.pending("bob") == 3 and queue.dropped == 2
+        stored = queue.fetch("bob", limit=2)
+        assert [message["n"] for _, message in stored] == [2, 3]
+        assert [message["n"] for _, message in queue.fetch("bob", after=stored[0][0])] == [3, 4]
+        assert queue.remove("bob", stored[1][0], stored[1][0]) == 1
+        assert [message["n"] for _, message in queue.fetch("bob")] == [2, 4]
+        assert queue.fetch("carol")[0][1]["content"] == {"text": "hi"}
+
+
+class TestRequestTracker:
+    """Test request/response correlation"""
+    
+    def test_resolve_out_of_order(self):
+        """Test replies complete their own futures whatever their order"""
+        tracker = RequestTracker()
+        (first, future1), (second, future2) = tracker.register(5), tracker.register(5)
+        assert tracker.in_flight == 2
+        
+        assert tracker.resolve(second, {"n": 2})
+        assert tracker.resolve(first, {"n": 1})
+        assert not tracker.resolve(first, {"n": 1})
+        assert future1.result(0) == {"n": 1}
+        assert future2.result(0) == {"n": 2}
+        assert tracker.in_flight == 0
+        assert tracker.completed == 2
+        assert 0 < tracker.rtt_avg <= tracker.rtt_max
+    
+    def test_timeouts(self):
+        """Test requests expire in deadline order, not registration order"""
+        tracker = RequestTracker()
+        slow = tracker.register(5)[1]
+        request_id, fast = tracker.register(0.05)
+        
+        with pytest.raises(TimeoutError):
+            fast.result(2)
+        assert not tracker.resolve(request_id, {})
+        assert not slow.done()
+        assert tracker.timed_out == 1
+        assert tracker.in_flight == 1
+
+
+class TestTimerWheel:
+    """Test the hashed timer wheel"""
+    
+    def test_expiry_order(self):
+        """Test deadlines expire on the right tick"""
+        wheel = TimerWheel(tick=1, slots=8)
+        wheel.advance(0)
+        wheel.schedule("a", 2)
+        wheel.schedule("b", 1)
+        wheel.schedule("c", 2.5)
+        
+        assert wheel.advance(1) == ["b"]
+        assert wheel.advance(2) == ["a"]
+        assert wheel.advance(3) == ["c"]
+        assert len(wheel) == 0
+    
+    def test_multiple_rounds(self):
+        """Test deadlines longer than one revolution"""
+        wheel = TimerWheel(tick=1, slots=4)
+        wheel.advance(0)
+        wheel.schedule("late", 10)
+        
+        assert wheel.advance(9) == []
+        assert wheel.advance(10) == ["late"]
+    
+    def test_cancel_and_reschedule(self):
+        """Test cancelling and moving a deadline"""
+        wheel = TimerWheel(tick=1, slots=8)
+        wheel.advance(0)
+        wheel.schedule("a", 1)
+        wheel.schedule("b", 1)
+        assert wheel.cancel("a")
+        assert not wheel.cancel("a")
+        wheel.schedule("b", 3)
+        
+        assert wheel.advance(2) == []
+        assert wheel.advance(3) == ["b"]
+
+
+class TestAdmission:
+    """Test admission control and rate limiting"""
+    
+    def test_token_bucket(self):
+        """Test burst, refill and oversized requests"""
+        bucket = TokenBucket(rate=10, capacity=5)
+        bucket._updated = 0
+        assert all(bucket.consume(1, now=0) for _ in range(5))
+        assert not bucket.consume(1, now=0)
+        assert bucket.consume(1, now=0.1)
+        
+        assert not bucket.consume(50, now=0.2)
+        assert bucket.consume(50, now=1)
+        assert not bucket.consume(1, now=1)
+    
+    def test_token_bucket_debt(self):
+        """Test taking tokens past zero reports how long to wait"""
+        bucket = TokenBucket(rate=10, capacity=2)
+        bucket._updated = 0
+        assert bucket.take(1, now=0) == 0
+        assert bucket.take(1, now=0) == 0
+        assert bucket.take(1, now=0) == pytest.approx(0.1)
+        assert bucket.take(1, now=0.1) == pytest.approx(0.1)
+        assert bucket.take(1, now=0.5) == 0
+    
+    def test_connection_caps(self):
+        """Test the global and per-IP caps"""
+        admission = AdmissionController(max_connections=3, max_per_ip=2)
+        assert admission.admit(("10.0.0.1", 1))
+        assert admission.admit(("10.0.0.1", 2))
+        assert not admission.admit(("10.0.0.1", 3))
+        assert admission.admit(("10.0.0.2", 1))
+        assert not admission.admit(("10.0.0.3", 1))
+        
+        admission.release(("10.0.0.1", 1))
+        assert admission.admit(("10.0.0.3", 1))
+        assert admission.get_stats()["rejected"] == 2
+    
+    @pytest.mark.parametrize("engine", ["threaded", "asyncio"])
+    def test_server_enforcement(self, engine):
+        """Test caps, handshake deadline and message rate on a live server"""
+        admission = AdmissionController(max_connections=2, max_per_ip=0, handshake_timeout=0.2,
+                                        message_rate=50, message_burst=5, byte_rate=0)
+        server = Server(host="127.0.0.1", port=0, engine=engine, admission=admission)
+        received = []
+        server.register_message_handler(lambda address, message: received.append(message))
+        assert server.start()
+        try:
+            silent = socket.create_connection(("127.0.0.1", server.port), timeout=5)
+            client = _connect_raw(server)
+            refused = socket.create_connection(("127.0.0.1", server.port), timeout=5)
+            assert refused.recv(4096) == b""
+            
+            assert silent.recv(4096) == b""
+            assert admission.get_stats()["handshake_timeouts"] == 1
+            
+            # Beyond the burst, frames are paced at the rate instead of dropped
+            request = Protocol.pack_message(TextMessage(sender="t", content="x"))
+            started = time.monotonic()
+            client.sendall(request * 20)
+            acks = 0
+            while acks < 20:
+                acks += 1 if _recv_frame(client)["type"] == "ACK" else 0
+            
+            assert time.monotonic() - started >= 0.2
+            assert server.get_admission_stats()["rate_limited"] == 15
+            assert len(received) == 20
+            
+            for sock in (silent, client, refused):
+                sock.close()
+        finally:
+            server.stop()
+
+
+class TestRoomRegistry:
+    """Test RoomRegistry class"""
+    
+    def test_join_leave(self):
+        """Test joining and leaving rooms"""
+        rooms = RoomRegistry()
+        assert rooms.join("general", "a")
+        assert not rooms.join("general", "a")
+        assert rooms.join("general", "b")
+        
+        assert sorted(rooms.members("general")) == ["a", "b"]
+        assert rooms.leave("general", "a")
+        assert not rooms.leave("general", "a")
+        assert rooms.members("general") == ["b"]
+    
+    def test_leave_all(self):
+        """Test dropping a member from every room"""
+        rooms = RoomRegistry()
+        rooms.join("general", "a")
+        rooms.join("dev", "a")
+        rooms.join("dev", "b")
+        
+        assert sorted(rooms.leave_all("a")) == ["dev", "general"]
+        assert rooms.rooms_of("a") == []
+        assert rooms.get_rooms() == ["dev"]
+
+
 class TestServer:
     """Test Server class"""
     
@@ -44,10 +1018,848 @@ class TestServer:
         assert server.port == 9999
         assert not server.running
     
+    def test_broadcast_shares_one_frame(self):
+        """Test fan-out serializes once and queues the same buffer"""
+        server = Server(host="127.0.0.1", port=9999)
+        queued = {}
+        
+        class FakeConnection:
+            def __init__(self, address):
+                self.address = address
+                self.codec = "json"
+                self.compress_threshold = 0
+            
+            def send(self, data, key=None, lane=None):
+                queued[self.address] = data
+                return True
+        
+        for port in (1, 2, 3):
+            server.clients[("10.0.0.1", port)] = FakeConnection(port)
+        
+        msg = TextMessage(sender="test", content="Hello")
+        count = server.broadcast(msg, exclude_address=("10.0.0.1", 3))
+        
+        assert count == 2
+        assert queued[1] is queued[2]
+        assert Protocol.unpack_message(queued[1])[1] == msg.to_json().encode('utf-8')
+    
+    def test_broadcast_coalesce_key(self):
+        """Test broadcast, publish and send_to_client keys replace queued frames"""
+        server = Server(host="127.0.0.1", port=9999, overflow_policy="coalesce")
+        connection = Connection(("10.0.0.1", 1), policy="coalesce")
+        connection.queue = OutboundQueue(max_frames=2, policy="coalesce")
+        server.clients[connection.address] = connection
+        server.join_room(connection.address, "lobby")
+        
+        server.broadcast({"type": "PRESENCE", "user": "bob", "status": "away"},
+                         key=("presence", "bob"))
+        server.publish("lobby", {"type": "TEXT", "content": "hi"})
+        server.send_to_client(connection.address,
+                              {"type": "PRESENCE", "user": "bob", "status": "online"},
+                              key=("presence", "bob"))
+        
+        frames = [Protocol.unpack_message(connection.queue.get())[1] for _ in range(2)]
+        assert [json.loads(frame) for frame in frames] == [
+            {"type": "PRESENCE", "user": "bob", "status": "online"},
+            {"type": "TEXT", "content": "hi"},
+        ]
+        assert connection.queue.dropped == 1
+    
+    @pytest.mark.parametrize("engine", ["threaded", "asyncio"])
+    def test_broadcast_framed(self, engine):
+        """Test clients receive broadcasts as regular frames"""
+        server = Server(host="127.0.0.1", port=0, engine=engine)
+        assert server.start()
+        try:
+            socks = [_connect_raw(server) for _ in range(3)]
+            assert server.broadcast({"type": "TEXT", "n": 1}) == 3
+            
+            for sock in socks:
+                assert _recv_frame(sock) == {"type": "TEXT", "n": 1}
+                sock.close()
+        finally:
+            server.stop()
+    
+    @pytest.mark.parametrize("engine", ["threaded", "asyncio"])
+    def test_room_publish(self, engine):
+        """Test publishing only reaches room members"""
+        server = Server(host="127.0.0.1", port=0, engine=engine)
+        joined = threading.Event()
+        
+        def handler(address, message):
+            if message.get("type") == "JOIN" and len(server.get_room_members("general")) == 2:
+                joined.set()
+        
+        server.register_message_handler(handler)
+        assert server.start()
+        try:
+            members = [_connect_raw(server) for _ in range(2)]
+            outsider = _connect_raw(server)
+            for sock in members:
+                sock.sendall(Protocol.pack_message(Protocol.create_join("general"), 1))
+                assert _recv_frame(sock)["type"] == "ACK"
+            assert joined.wait(5)
+            
+            assert server.publish("general", {"type": "TEXT", "room": "general"}) == 2
+            assert server.broadcast({"type": "TEXT", "room": None}) == 3
+            
+            for sock in members:
+                assert _recv_frame(sock)["room"] == "general"
+            assert _recv_frame(outsider)["room"] is None
+            
+            members[0].close()
+            deadline = time.monotonic() + 5
+            while len(server.get_room_members("general")) > 1 and time.monotonic() < deadline:
+                time.sleep(0.05)
+            assert len(server.get_room_members("general")) == 1
+            
+            for sock in members[1:] + [outsider]:
+                sock.close()
+        finally:
+            server.stop()
+    
+    @pytest.mark.parametrize("engine", ["threaded", "asyncio"])
+    def test_slow_client_does_not_block_broadcast(self, engine):
+        """Test broadcasting past a client that never reads"""
+        server = Server(host="127.0.0.1", port=0, engine=engine)
+        assert server.start()
+        try:
+            stalled = _connect_raw(server)
+            reader = _connect_raw(server)
+            chunk = "x" * 65536
+            
+            start = time.monotonic()
+            for _ in range(50):
+                server.broadcast_message(chunk)
+            assert time.monotonic() - start < 1
+            
+            received = 0
+            while received < 50 * (len(chunk) + 20):
+                received += len(reader.recv(1 << 20))
+            
+            stalled.close()
+            reader.close()
+        finally:
+            server.stop()
+    
+    @pytest.mark.parametrize("engine", ["threaded", "asyncio"])
+    def test_overflow_disconnect(self, engine):
+        """Test dropping a client whose queue overflows"""
+        server = Server(host="127.0.0.1", port=0, engine=engine,
+                        overflow_policy="disconnect")
+        assert server.start()
+        try:
+            stalled = _connect_raw(server)
+            chunk = "x" * 65536
+            
+            for _ in range(400):
+                server.broadcast_message(chunk)
+            
+            deadline = time.monotonic() + 5
+            while server.get_client_count() and time.monotonic() < deadline:
+                time.sleep(0.05)
+            assert server.get_client_count() == 0
+            stalled.close()
+        finally:
+            server.stop()
+    
+    @pytest.mark.parametrize("engine", ["threaded", "asyncio"])
+    def test_pipelined_frames(self, engine):
+        """Test frames coalesced into one write and split across writes"""
+        server = Server(host="127.0.0.1", port=0, engine=engine)
+        received = []
+        done = threading.Event()
+        
+        def handler(address, message):
+            received.append(message["n"])
+            if len(received) == 50:
+                done.set()
+        
+        server.register_message_handler(handler)
+        assert server.start()
+        try:
+            sock = _connect_raw(server)
+            stream = b"".join(
+                Protocol.pack_message(json.dumps({"n": i}).encode('utf-8'), i)
+                for i in range(50)
+            )
+            sock.sendall(stream[:333])
+            sock.sendall(stream[333:])
+            
+            assert done.wait(5)
+            assert received == list(range(50))
+            sock.close()
+        finally:
+            server.stop()
+    
+    @pytest.mark.parametrize("engine", ["threaded", "asyncio"])
+    def test_cumulative_acks(self, engine):
+        """Test a burst is acknowledged by a few cumulative ACK frames"""
+        server = Server(host="127.0.0.1", port=0, engine=engine)
+        assert server.start()
+        try:
+            sock = socket.create_connection(("127.0.0.1", server.port), timeout=5)
+            handshake = Protocol.create_handshake(ack_mode="cumulative")
+            sock.sendall(Protocol.pack_message(handshake))
+            assert _recv_frame(sock)["ack_mode"] == "cumulative"
+            
+            sock.sendall(b"".join(
+                Protocol.pack_message(TextMessage(sender="t", content=str(i)), message_id=i)
+                for i in range(1, 101)
+            ))
+            
+            decoder = FrameDecoder()
+            highest, acks = 0, 0
+            while highest < 100:
+                decoder.feed(sock.recv(4096))
+                for frame in decoder.frames():
+                    assert frame.frame_type == FRAME_ACK
+                    highest = frame.message_id
+                    acks += 1
+            
+            assert acks < 10
+            sock.close()
+        finally:
+            server.stop()
+    
+    @pytest.mark.parametrize("engine", ["threaded", "asyncio"])
+    def test_idle_client_reaped(self, engine):
+        """Test an idle client gets a heartbeat and is dropped if it stays silent"""
+        server = Server(host="127.0.0.1", port=0, engine=engine,
+                        heartbeat_interval=0.2, idle_timeout=0.2)
+        assert server.start()
+        try:
+            responsive = _connect_raw(server)
+            silent = _connect_raw(server)
+            
+            assert _recv_frame(silent)["type"] == "HEARTBEAT"
+            assert _recv_frame(responsive)["type"] == "HEARTBEAT"
+            responsive.sendall(Protocol.pack_message(Protocol.create_heartbeat_ack()))
+            
+            assert silent.recv(4096) == b""
+            deadline = time.time() + 5
+            while server.get_client_count() > 1 and time.time() < deadline:
+                time.sleep(0.01)
+            assert server.get_client_count() == 1
+            assert server.heartbeats.reaped == 1
+            
+            responsive.close()
+            silent.close()
+        finally:
+            server.stop()
+    
+    @pytest.mark.parametrize("engine", ["threaded", "asyncio"])
+    def test_flow_control_pauses_flooding_client(self, engine):
+        """Test a client that does not read its replies is paused, not dropped"""
+        server = Server(host="127.0.0.1", port=0, engine=engine,
+                        overflow_policy="disconnect")
+        reply = "x" * 65536
+        server.register_message_handler(
+            lambda address, message: server.send_to_client(address, reply)
+        )
+        assert server.start()
+        try:
+            sock = _connect_raw(server)
+            request = Protocol.pack_message(TextMessage(sender="t", content="go"))
+            sock.sendall(request * 300)
+            
+            deadline = time.monotonic() + 5
+            while not server.get_flow_stats()["paused"] and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert server.get_flow_stats()["pause_events"] >= 1
+            
+            replies = 0
+            decoder = FrameDecoder()
+            while replies < 300:
+                decoder.feed(sock.recv(1 << 20))
+                replies += sum(1 for frame in decoder.frames() if len(frame.payload) == len(reply))
+            
+            assert server.get_client_count() == 1
+            assert server.get_flow_stats()["paused"] == 0
+            sock.close()
+        finally:
+            server.stop()
+    
+    @pytest.mark.parametrize("engine", ["threaded", "asyncio"])
+    def test_binary_codec_negotiation(self, engine):
+        """Test a binary client alongside a JSON client"""
+        server = Server(host="127.0.0.1", port=0, engine=engine)
+        received = []
+        server.register_message_handler(lambda address, message: received.append(message))
+        assert server.start()
+        try:
+            binary = socket.create_connection(("127.0.0.1", server.port), timeout=5)
+            handshake = Protocol.create_handshake(codec="binary")
+            binary.sendall(Protocol.pack_message(handshake))
+            assert _recv_frame(binary)["codec"] == "binary"
+            plain = _connect_raw(server)
+            
+            msg = TextMessage(sender="test", content="Hello")
+            binary.sendall(Protocol.pack_message(msg, message_id=1, codec="binary"))
+            _recv_frame(binary)
+            assert received[0]["content"] == {"text": "Hello"}
+            assert received[0]["message_type"] == "TEXT"
+            
+            server.broadcast(msg)
+            assert decode_payload(_recv_payload(binary))["sender"] == "test"
+            assert _recv_payload(plain) == msg.to_json().encode('utf-8')
+            
+            binary.close()
+            plain.close()
+        finally:
+            server.stop()
+    
+    @pytest.mark.parametrize("engine", ["threaded", "asyncio"])
+    def test_compression_negotiation(self, engine):
+        """Test compressed frames both ways with a client that negotiated zlib"""
+        server = Server(host="127.0.0.1", port=0, engine=engine, compress_threshold=256)
+        received = []
+        server.register_message_handler(lambda address, message: received.append(message))
+        assert server.start()
+        try:
+            sock = socket.create_connection(("127.0.0.1", server.port), timeout=5)
+            sock.sendall(Protocol.pack_message(Protocol.create_handshake(compression="zlib")))
+            ack = _recv_frame(sock)
+            assert ack["compression"] == "zlib"
+            assert ack["compress_threshold"] == 256
+            plain = _connect_raw(server)
+            
+            msg = TextMessage(sender="test", content="history line\n" * 500)
+            sock.sendall(Protocol.pack_message(msg, message_id=1, compress_threshold=256))
+            _recv_frame(sock)
+            assert received[0]["content"] == msg.content
+            
+            server.broadcast(msg)
+            header = sock.recv(20, socket.MSG_WAITALL)
+            msg_id, size, frame_type, flags = Protocol.unpack_frame_header(header)
+            assert flags & FLAG_COMPRESSED
+            assert size < 1024
+            payload = sock.recv(size, socket.MSG_WAITALL)
+            assert Protocol.unpack_message(header + payload)[1] == msg.to_json().encode('utf-8')
+            
+            header = plain.recv(20, socket.MSG_WAITALL)
+            assert Protocol.unpack_frame_header(header)[3] == 0
+            
+            sock.close()
+            plain.close()
+        finally:
+            server.stop()
+    
+    @pytest.mark.parametrize("engine", ["threaded", "asyncio"])
+    def test_capability_negotiation(self, engine):
+        """Test the server answers a capability offer with the fastest common options"""
+        server = Server(host="127.0.0.1", port=0, engine=engine, compress_threshold=0,
+                        fragment_size=65536)
+        assert server.start()
+        try:
+            sock = socket.create_connection(("127.0.0.1", server.port), timeout=5)
+            offered = capabilities.offer(codecs=("binary", "json"),
+                                         ack_modes=("per_message", "cumulative"),
+                                         compression=("zlib",), fragment=True,
+                                         max_frame_size=4096)
+            handshake = Protocol.create_handshake(codec="binary", capabilities=offered)
+            sock.sendall(Protocol.pack_message(handshake))
+            ack = _recv_frame(sock)
+            assert ack["codec"] == "json"
+            assert ack["ack_mode"] == "cumulative"
+            assert ack["compression"] == "none"
+            assert ack["encryption"] == "none"
+            assert ack["batch"] is False
+            assert ack["max_frame_size"] == 4096
+            assert ack["fragment_size"] == 4096
+            sock.close()
+        finally:
+            server.stop()
+    
+    @pytest.mark.parametrize("engine", ["threaded", "asyncio"])
+    def test_session_resume_deduplicates(self, engine):
+        """Test frames retransmitted on a new connection of a session reach handlers once"""
+        server = Server(host="127.0.0.1", port=0, engine=engine)
+        received = []
+        server.register_message_handler(lambda address, message: received.append(message["n"]))
+        assert server.start()
+        try:
+            for ids, resume in (((1, 2), 0), ((2, 3), 2)):
+                sock = socket.create_connection(("127.0.0.1", server.port), timeout=5)
+                sock.sendall(Protocol.pack_message(Protocol.create_handshake(session="s1")))
+                assert _recv_frame(sock)["resume"] == resume
+                for message_id in ids:
+                    sock.sendall(Protocol.pack_message({"type": "CUSTOM", "n": message_id},
+                                                       message_id))
+                    assert _recv_frame(sock)["message_id"] == message_id
+                sock.close()
+            
+            assert received == [1, 2, 3]
+        finally:
+            server.stop()
+    
+    def test_no_session_no_dedup(self):
+        """Test a connection without a session may reuse message IDs"""
+        server = Server(host="127.0.0.1", port=0)
+        received = []
+        server.register_message_handler(lambda address, message: received.append(message["n"]))
+        assert server.start()
+        try:
+            sock = _connect_raw(server)
+            for n in range(3):
+                sock.sendall(Protocol.pack_message({"type": "CUSTOM", "n": n}, 7))
+                assert _recv_frame(sock)["message_id"] == 7
+            sock.close()
+            
+            assert received == [0, 1, 2]
+        finally:
+            server.stop()
+    
+    def test_failed_handler_still_acknowledged(self):
+        """Test a frame whose handler raises is acknowledged, so its sender moves on"""
+        server = Server(host="127.0.0.1", port=0)
+        received = []
+        
+        def handler(address, message):
+            received.append(message["n"])
+            if message["n"] == 2:
+                raise RuntimeError("handler failed")
+        
+        server.register_message_handler(handler)
+        assert server.start()
+        try:
+            sock = socket.create_connection(("127.0.0.1", server.port), timeout=5)
+            sock.sendall(Protocol.pack_message(Protocol.create_handshake(session="s1")))
+            assert _recv_frame(sock)["type"] == "ACK"
+            for n in (1, 2, 3, 2):
+                sock.sendall(Protocol.pack_message({"type": "CUSTOM", "n": n}, n))
+                assert _recv_frame(sock)["message_id"] == n
+            sock.close()
+            
+            assert received == [1, 2, 3]
+        finally:
+            server.stop()
+    
+    @pytest.mark.parametrize("engine", ["threaded", "asyncio"])
+    def test_handler_workers_pause_client(self, engine):
+        """Test a full handler worker holds the client's next message and stops reading it"""
+        server = Server(host="127.0.0.1", port=0, engine=engine, handler_workers=1)
+        server.executor.shutdown(wait=False)
+        server.executor = KeyedExecutor(workers=1, max_pending=1)
+        started = threading.Event()
+        release = threading.Event()
+        received = []
+        
+        def handler(address, message):
+            started.set()
+            release.wait(5)
+            received.append((threading.current_thread().name, message["n"]))
+        
+        server.register_message_handler(handler)
+        assert server.start()
+        try:
+            sock = _connect_raw(server)
+            sock.sendall(Protocol.pack_message({"type": "CUSTOM", "n": 1}, 1))
+            assert _recv_frame(sock)["message_id"] == 1
+            assert started.wait(5)
+            for n in range(2, 6):
+                sock.sendall(Protocol.pack_message({"type": "CUSTOM", "n": n}, n))
+            
+            # One message running, one queued, one deferred; the rest unread
+            assert [_recv_frame(sock)["message_id"] for _ in range(2)] == [2, 3]
+            sock.settimeout(0.2)
+            with pytest.raises(socket.timeout):
+                _recv_payload(sock)
+            [connection] = server.clients.values()
+            assert len(connection.deferred) == 1
+            
+            release.set()
+            sock.settimeout(5)
+            assert [_recv_frame(sock)["message_id"] for _ in range(2)] == [4, 5]
+            sock.close()
+            
+            deadline = time.monotonic() + 5
+            while len(received) < 5 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert [n for _, n in received] == [1, 2, 3, 4, 5]
+            assert threading.current_thread().name not in {name for name, _ in received}
+        finally:
+            release.set()
+            server.stop()
+    
+    def test_client_retransmits_after_reconnect(self):
+        """Test messages the server did not acknowledge are resent once reconnected"""
+        server = Server(host="127.0.0.1", port=0, admission=AdmissionController(
+            message_rate=0.001, byte_rate=0, message_burst=2))
+        received = []
+        server.register_message_handler(lambda address, message: received.append(message["n"]))
+        assert server.start()
+        client = Client("127.0.0.1", server.port)
+        try:
+            assert client.connect()
+            for n in range(4):
+                assert client.send_message({"type": "CUSTOM", "n": n})
+            
+            # The third message exceeds the burst: the server stops reading
+            # and never sees the fourth
+            deadline = time.monotonic() + 5
+            while len(client.unacked) > 1 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert client.unacked.sequences() == [4]
+            
+            client.disconnect()
+            time.sleep(0.1)
+            assert client.connect()
+            while client.unacked and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert not client.unacked
+            assert received == [0, 1, 2, 3]
+        finally:
+            client.disconnect()
+            server.stop()
+    
+    @pytest.mark.parametrize("engine", ["threaded", "asyncio"])
+    def test_pipelined_requests(self, engine):
+        """Test many requests in flight on one connection each get their own reply"""
+        server = Server(host="127.0.0.1", port=0, engine=engine)
+        
+        def handler(address, message):
+            if message.get("type") == "LOOKUP":
+                server.reply(address, message, {"type": "USER", "name": message["name"]})
+        
+        server.register_message_handler(handler)
+        assert server.start()
+        client = Client("127.0.0.1", server.port)
+        unsolicited = []
+        client.register_message_handler(unsolicited.append)
+        try:
+            assert client.connect()
+            futures = [client.request({"type": "LOOKUP", "name": f"user{n}"}, timeout=5)
+                       for n in range(50)]
+            assert [f.result(5)["name"] for f in futures] == [f"user{n}" for n in range(50)]
+            assert client.requests.in_flight == 0
+            assert client.requests.completed == 50
+            assert not [m for m in unsolicited if isinstance(m, dict) and "reply_to" in m]
+            
+            with pytest.raises(TimeoutError):
+                client.request({"type": "IGNORED"}, timeout=0.1).result(2)
+        finally:
+            client.disconnect()
+            server.stop()
+    
+    def test_request_not_connected(self):
+        """Test a request that cannot be sent fails at once"""
+        client = Client("127.0.0.1", 5000)
+        with pytest.raises(ConnectionError):
+            client.request({"type": "LOOKUP"}).result(1)
+        assert client.requests.in_flight == 0
+    
+    @pytest.mark.parametrize("engine", ["threaded", "asyncio"])
+    def test_coalesced_batches(self, engine):
+        """Test a coalescing client's batches reach the handlers message by message"""
+        server = Server(host="127.0.0.1", port=0, engine=engine)
+        received = []
+        done = threading.Event()
+        
+        def handler(address, message):
+            received.append(message["n"])
+            if len(received) == 300:
+                done.set()
+        
+        server.register_message_handler(handler)
+        assert server.start()
+        client = Client("127.0.0.1", server.port, coalesce_delay=0.005, coalesce_max=64)
+        try:
+            assert client.connect()
+            deadline = time.monotonic() + 5
+            while not client.batching and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert client.batching
+            
+            for n in range(300):
+                assert client.send_message({"type": "CUSTOM", "n": n})
+            
+            assert done.wait(5)
+            assert received == list(range(300))
+            assert 5 <= client.batches_sent < 300
+        finally:
+            client.disconnect()
+            server.stop()
+    
+    @pytest.mark.parametrize("engine", ["threaded", "asyncio"])
+    def test_offline_messages_forwarded(self, engine):
+        """Test messages to an offline user are stored and delivered on connect"""
+        offline = OfflineQueue(Database(":memory:", check_same_thread=False))
+        server = Server(host="127.0.0.1", port=0, engine=engine, offline_queue=offline)
+        assert server.start()
+        received = []
+        done = threading.Event()
+        
+        def handler(message):
+            if isinstance(message, dict) and message.get("type") == "CUSTOM":
+                received.append(message["n"])
+                if len(received) == 100:
+                    done.set()
+        
+        client = Client("127.0.0.1", server.port, user="bob")
+        client.register_message_handler(handler)
+        try:
+            for n in range(99):
+                assert server.send_to_user("bob", {"type": "CUSTOM", "n": n})
+            assert offline.pending("bob") == 99
+            
+            assert client.connect()
+            deadline = time.monotonic() + 5
+            while "bob" not in server.users and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert server.send_to_user("bob", {"type": "CUSTOM", "n": 99})
+            
+            assert done.wait(5)
+            assert received == list(range(100))
+            while offline.pending("bob") and time.monotonic() < deadline:
+                time.sleep(0.01)  # rows go once the writer is done with them
+            assert offline.pending("bob") == 0 and offline.forwarded >= 99
+            assert server.send_to_user("carol", {"type": "CUSTOM"})
+            assert offline.pending("carol") == 1
+        finally:
+            client.disconnect()
+            server.stop()
+    
+    def test_offline_forwarding_resumes_on_drain(self):
+        """Test forwarding pauses on saturation, resumes on drain and deletes written rows only"""
+        offline = OfflineQueue(Database(":memory:", check_same_thread=False))
+        server = Server(host="127.0.0.1", port=9999, offline_queue=offline)
+        for n in range(10):
+            server.send_to_user("bob", {"type": "CUSTOM", "n": n})
+        
+        connection = Connection(("10.0.0.1", 1))
+        connection.queue = OutboundQueue(max_frames=4, on_saturation=connection._on_saturation)
+        assert server._claim_user(connection, "bob")
+        server._forward_offline(connection)
+        assert connection.queue.saturated and connection.offline_backlog
+        assert offline.pending("bob") == 10
+        
+        # A live message waits behind the stored ones
+        assert server.send_to_user("bob", {"type": "CUSTOM", "n": 10})
+        
+        written = []
+        while True:
+            frames = connection.queue.get_many(1)
+            if not frames:
+                break
+            connection._frames_written()
+            written.extend(frames)
+        
+        assert [json.loads(Protocol.unpack_message(frame)[1])["n"] for frame in written] == (
+            list(range(11)))
+        assert offline.pending("bob") == 0 and not connection.offline_backlog
+    
+    def test_offline_batch_removed_after_fragments(self):
+        """Test a stored batch sent as fragments is deleted once its last fragment is written"""
+        offline = OfflineQueue(Database(":memory:", check_same_thread=False))
+        server = Server(host="127.0.0.1", port=9999, offline_queue=offline)
+        for n in range(64):
+            server.send_to_user("bob", {"type": "CUSTOM", "n": n, "text": "x" * 3000})
+        
+        connection = Connection(("10.0.0.1", 1))
+        connection.receive_batch = True
+        connection.queue.fragment_size = 16384
+        assert server._claim_user(connection, "bob")
+        server._forward_offline(connection)
+        assert offline.pending("bob") == 64
+        
+        fragments = 0
+        while True:
+            frames = connection.queue.get_many(1)
+            if not frames:
+                break
+            fragments += 1
+            connection._frames_written()
+        
+        assert fragments > 1
+        assert offline.pending("bob") == 0 and not connection.offline_backlog
+    
+    def test_negotiated_frame_size(self):
+        """Test frames above the client's frame size are refused or split into batches that fit"""
+        offline = OfflineQueue(Database(":memory:", check_same_thread=False))
+        server = Server(host="127.0.0.1", port=9999, offline_queue=offline)
+        for n in range(6):
+            text = "x" * (2000 if n == 3 else 100)
+            server.send_to_user("bob", {"type": "CUSTOM", "n": n, "text": text})
+        
+        connection = Connection(("10.0.0.1", 1))
+        connection.receive_batch = True
+        connection.max_frame_size = 500
+        assert not connection.send(Protocol.pack_message({"text": "x" * 600}))
+        assert not connection.queue.closed and not len(connection.queue)
+        
+        assert server._claim_user(connection, "bob")
+        server._forward_offline(connection)
+        frames = []
+        while len(connection.queue):
+            frames.extend(connection.queue.get_many(1))
+            connection._frames_written()
+        
+        assert len(frames) > 1
+        assert all(len(frame) - MESSAGE_HEADER_SIZE <= 500 for frame in frames)
+        decoder = FrameDecoder()
+        decoder.feed(b"".join(frames))
+        assert [json.loads(bytes(frame.payload))["n"]
+                for frame in Protocol.unbatch(decoder.frames())] == [0, 1, 2, 4, 5]
+        assert offline.pending("bob") == 1 and not connection.offline_backlog
+        
+        connection.queue.fragment_size = 400
+        assert connection.send(Protocol.pack_message({"text": "x" * 600}))
+    
+    @pytest.mark.parametrize("engine", ["threaded", "asyncio"])
+    def test_user_name_not_taken_over(self, engine):
+        """Test a live user name is refused to another session, handed over within one"""
+        server = Server(host="127.0.0.1", port=0, engine=engine)
+        assert server.start()
+        
+        def connect(session):
+            sock = socket.create_connection(("127.0.0.1", server.port), timeout=5)
+            sock.sendall(Protocol.pack_message(
+                Protocol.create_handshake(session=session, user="bob")))
+            return sock
+        
+        try:
+            first = connect("s1")
+            assert _recv_frame(first)["type"] == "ACK"
+            
+            intruder = connect("s2")
+            assert intruder.recv(4096) == b""
+            assert server.users["bob"].session == "s1"
+            
+            second = connect("s1")
+            assert _recv_frame(second)["type"] == "ACK"
+            assert first.recv(4096) == b""
+            for sock in (first, intruder, second):
+                sock.close()
+        finally:
+            server.stop()
+    
+    def test_control_skips_batch(self):
+        """Test call signalling is sent at once while chat waits for its batch"""
+        server = Server(host="127.0.0.1", port=0)
+        received = []
+        arrived = threading.Event()
+        
+        def handler(address, message):
+            received.append(message.get("message_type") or message.get("type"))
+            arrived.set()
+        
+        server.register_message_handler(handler)
+        assert server.start()
+        client = Client("127.0.0.1", server.port, coalesce_delay=2, coalesce_max=64)
+        try:
+            assert client.connect()
+            deadline = time.monotonic() + 5
+            while not client.batching and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert client.batching
+            
+            assert client.send_message(TextMessage("alice", "hi"))
+            assert client.send_message(CallMessage("alice", "audio", "accept", "bob"))
+            assert arrived.wait(1)
+            assert received == ["CALL"]
+        finally:
+            client.disconnect()
+            server.stop()
+    
+    @pytest.mark.parametrize("engine", ["threaded", "asyncio"])
+    def test_large_payload_interleaved(self, engine):
+        """Test a chat frame overtakes a large payload already in flight"""
+        server = Server(host="127.0.0.1", port=0, engine=engine, fragment_size=65536)
+        assert server.start()
+        try:
+            sock = socket.create_connection(("127.0.0.1", server.port), timeout=5)
+            sock.sendall(Protocol.pack_message(Protocol.create_handshake(fragment=True)))
+            assert _recv_frame(sock)["fragment_size"] == 65536
+            
+            big = b"f" * (8 * 1024 * 1024)
+            server.broadcast(big)
+            time.sleep(0.05)
+            server.broadcast(b"chat")
+            
+            decoder = FrameDecoder()
+            received = []
+            while len(received) < 2:
+                nbytes = sock.recv_into(decoder.get_buffer())
+                assert nbytes
+                decoder.buffer_updated(nbytes)
+                received.extend(bytes(f.payload) for f in decoder.frames())
+            
+            assert received[0] == b"chat"
+            assert received[1] == big
+            sock.close()
+        finally:
+            server.stop()
+    
+    def test_fragmented_upload(self):
+        """Test a client sends a large message as fragments"""
+        server = Server(host="127.0.0.1", port=0, fragment_size=65536)
+        received = []
+        done = threading.Event()
+        
+        def handler(address, message):
+            received.append(message)
+            done.set()
+        
+        server.register_message_handler(handler)
+        assert server.start()
+        client = Client("127.0.0.1", server.port)
+        try:
+            assert client.connect()
+            deadline = time.monotonic() + 5
+            while not client.fragment_size and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert client.fragment_size == 65536
+            
+            text = "log line\n" * 100000
+            assert client.send_message(TextMessage(sender="test", content=text))
+            assert done.wait(5)
+            assert received[0]["content"] == {"text": text}
+        finally:
+            client.disconnect()
+            server.stop()
+    
     def test_get_client_count(self):
         """Test getting client count"""
         server = Server(host="127.0.0.1", port=9999)
         assert server.get_client_count() == 0
+    
+    def test_unknown_engine(self):
+        """Test rejecting an unknown engine"""
+        with pytest.raises(ValueError):
+            Server(host="127.0.0.1", port=9999, engine="fork")
+    
+    @pytest.mark.parametrize("engine", ["threaded", "asyncio"])
+    def test_engine_round_trip(self, engine):
+        """Test receiving a message and sending to a client with each engine"""
+        server = Server(host="127.0.0.1", port=0, engine=engine)
+        received = []
+        done = threading.Event()
+        
+        def handler(address, message):
+            received.append(message)
+            done.set()
+        
+        server.register_message_handler(handler)
+        assert server.start()
+        try:
+            sock = _connect_raw(server)
+            msg = TextMessage(sender="test", content="Hello")
+            sock.sendall(Protocol.pack_message(msg, message_id=7))
+            
+            assert done.wait(5)
+            assert received[0]["content"] == {"text": "Hello"}
+            assert _recv_frame(sock)["message_id"] == 7
+            
+            assert server.get_client_count() == 1
+            address = server.get_connected_clients()[0]
+            assert server.send_to_client(address, "ping")
+            assert _recv_payload(sock) == b"ping"
+            sock.close()
+        finally:
+            server.stop()
+        
+        assert not server.running
 
 
 class TestClient:
@@ -64,3 +1876,230 @@ class TestClient:
         """Test connection status"""
         client = Client(host="127.0.0.1", port=5000)
         assert not client.is_connected()
+        with pytest.raises(ConnectionError):
+            client.submit({"type": "CUSTOM"}).result(0)
+    
+    def test_delivery_future(self):
+        """Test a submitted message's future completes once acknowledged"""
+        server = Server(host="127.0.0.1", port=0)
+        assert server.start()
+        client = Client("127.0.0.1", server.port)
+        try:
+            assert client.connect()
+            delivery = client.submit({"type": "CUSTOM"})
+            assert delivery.result(5) == 1
+        finally:
+            client.disconnect()
+            server.stop()
+    
+    def test_send_does_not_block(self):
+        """Test sending to a peer that stopped reading returns at once"""
+        listener = socket.create_server(("127.0.0.1", 0))
+        client = Client("127.0.0.1", listener.getsockname()[1])
+        try:
+            assert client.connect()
+            peer, _ = listener.accept()  # never reads
+            start = time.monotonic()
+            deliveries = [client.submit({"type": "CUSTOM", "data": "x" * 262144})
+                          for _ in range(64)]
+            assert time.monotonic() - start < 2
+            
+            assert not any(delivery.done() and not delivery.exception()
+                           for delivery in deliveries)
+            with pytest.raises(BufferError):
+                deliveries[-1].result(0)
+            peer.close()
+        finally:
+            client.connected = False  # nothing will drain, skip the wait
+            client.disconnect()
+            listener.close()
+    
+    def test_dispatch_in_arrival_order(self):
+        """Test messages of one read reach the handlers in arrival order, control ones included"""
+        listener = socket.create_server(("127.0.0.1", 0))
+        client = Client("127.0.0.1", listener.getsockname()[1])
+        received = []
+        done = threading.Event()
+        
+        def handler(message):
+            received.append(message["type"])
+            if len(received) == 3:
+                done.set()
+        
+        client.register_message_handler(handler)
+        try:
+            assert client.connect()
+            peer, _ = listener.accept()
+            peer.sendall(b"".join(Protocol.pack_message(message) for message in (
+                {"type": "TEXT"}, {"type": "CALL"}, {"type": "TEXT"})))
+            assert done.wait(5)
+            assert received == ["TEXT", "CALL", "TEXT"]
+            peer.close()
+        finally:
+            client.connected = False
+            client.disconnect()
+            listener.close()
+    
+    def test_full_retransmit_window(self):
+        """Test a full retransmit window refuses new messages, not those in flight"""
+        listener = socket.create_server(("127.0.0.1", 0))
+        client = Client("127.0.0.1", listener.getsockname()[1])
+        client.unacked = RetransmitBuffer(size=4)
+        try:
+            assert client.connect()
+            peer, _ = listener.accept()  # never acknowledges
+            deliveries = [client.submit({"type": "CUSTOM", "n": n}) for n in range(6)]
+            
+            assert not any(delivery.done() for delivery in deliveries[:4])
+            for delivery in deliveries[4:]:
+                with pytest.raises(BufferError):
+                    delivery.result(0)
+            assert client.unacked.sequences() == [1, 2, 3, 4]
+            
+            client.unacked.acknowledge(4)
+            assert client.submit({"type": "CUSTOM"}) is not None
+            assert client.unacked.sequences() == [5]
+            peer.close()
+        finally:
+            client.connected = False
+            client.disconnect()
+            listener.close()
+
+
+class TestAsyncClient:
+    """Test AsyncClient class"""
+    
+    def test_backoff_delay(self):
+        """Test backoff bounds double per attempt up to the maximum"""
+        for attempt, bound in ((0, 1), (1, 2), (3, 8), (10, 30)):
+            delays = [backoff_delay(attempt, 1, 30) for _ in range(200)]
+            assert all(0 <= delay <= bound for delay in delays)
+            assert max(delays) > bound / 2
+    
+    def test_connect_failure(self):
+        """Test a refused connection reports an error state"""
+        async def scenario():
+            probe = socket.socket()
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+            probe.close()
+            client = AsyncClient("127.0.0.1", port)
+            assert not await client.connect()
+            assert client.status is ConnectionStatus.ERROR
+            assert not await client.send_message({"type": "CUSTOM"})
+        
+        asyncio.run(scenario())
+    
+    def test_reconnect_and_resume(self):
+        """Test a dropped client reconnects, resends and gets the messages stored meanwhile"""
+        offline = OfflineQueue(Database(":memory:", check_same_thread=False))
+        server = Server(host="127.0.0.1", port=0, offline_queue=offline)
+        received = []
+        server.register_message_handler(
+            lambda address, message: received.append(message["n"]))
+        assert server.start()
+        
+        async def scenario():
+            client = AsyncClient("127.0.0.1", server.port, reconnect_interval=0.05, user="bob")
+            states = []
+            inbox = []
+            connected = asyncio.Event()
+            reconnecting = asyncio.Event()
+            
+            def on_state(previous, status):
+                states.append(status)
+                if status is ConnectionStatus.CONNECTED:
+                    connected.set()
+                elif status is ConnectionStatus.RECONNECTING:
+                    reconnecting.set()
+            
+            async def on_message(message):
+                if message.get("type") == "CUSTOM":
+                    inbox.append(message["n"])
+            
+            client.register_state_handler(on_state)
+            client.register_message_handler(on_message)
+            assert await client.connect()
+            assert await client.send_message({"type": "CUSTOM", "n": 1})
+            server.broadcast({"type": "CUSTOM", "n": "live"})
+            while not inbox:
+                await asyncio.sleep(0.01)
+            
+            connected.clear()
+            for connection in list(server.clients.values()):
+                connection.close()
+            await asyncio.wait_for(reconnecting.wait(), 5)
+            assert await client.send_message({"type": "CUSTOM", "n": 2})
+            assert server.send_to_user("bob", {"type": "CUSTOM", "n": "missed"})
+            await asyncio.wait_for(connected.wait(), 5)
+            
+            while len(inbox) < 2 or received != [1, 2]:
+                await asyncio.sleep(0.01)
+            assert inbox == ["live", "missed"]
+            assert client.reconnects == 1
+            await client.close()
+            return states
+        
+        try:
+            states = asyncio.run(asyncio.wait_for(scenario(), 10))
+            assert states == [
+                ConnectionStatus.CONNECTING, ConnectionStatus.CONNECTED,
+                ConnectionStatus.RECONNECTING, ConnectionStatus.CONNECTED,
+                ConnectionStatus.DISCONNECTED
+            ]
+            assert received == [1, 2]
+        finally:
+            server.stop()
+
+
+@pytest.mark.skipif(not hasattr(socket, "SO_REUSEPORT"), reason="needs SO_REUSEPORT")
+class TestServerCluster:
+    """Test ServerCluster class"""
+    
+    def test_invalid_workers(self):
+        """Test rejecting an empty cluster"""
+        with pytest.raises(ValueError):
+            ServerCluster(host="127.0.0.1", port=0, workers=0)
+    
+    def test_broadcast_reaches_every_worker(self):
+        """Test a broadcast accepted by one worker reaches all clients"""
+        cluster = ServerCluster(host="127.0.0.1", port=0, workers=2, setup=_cluster_setup)
+        assert cluster.start()
+        try:
+            socks = [_connect_raw(cluster) for _ in range(8)]
+            socks[0].sendall(Protocol.pack_message({"type": "SHOUT", "content": "hi"}, 1))
+            
+            # The sender gets its ACK and the broadcast, in either order
+            first = [_recv_frame(socks[0]), _recv_frame(socks[0])]
+            assert {"type": "TEXT", "content": "hi"} in first
+            for sock in socks[1:]:
+                assert _recv_frame(sock) == {"type": "TEXT", "content": "hi"}
+                sock.close()
+            socks[0].close()
+        finally:
+            cluster.stop()
+    
+    def test_publish_routed_across_workers(self):
+        """Test a room publish only reaches members, on any worker"""
+        cluster = ServerCluster(host="127.0.0.1", port=0, workers=2, setup=_cluster_setup)
+        assert cluster.start()
+        try:
+            members = [_connect_raw(cluster) for _ in range(6)]
+            outsider = _connect_raw(cluster)
+            for sock in members:
+                sock.sendall(Protocol.pack_message(Protocol.create_join("r"), 1))
+                assert _recv_frame(sock)["type"] == "ACK"
+            time.sleep(0.2)  # room interest reaches the supervisor
+            
+            outsider.sendall(Protocol.pack_message({"type": "ROOM_SHOUT", "room": "r"}, 2))
+            assert _recv_frame(outsider)["type"] == "ACK"
+            for sock in members:
+                assert _recv_frame(sock) == {"type": "TEXT", "room": "r"}
+                sock.close()
+            
+            outsider.settimeout(0.2)
+            with pytest.raises(socket.timeout):
+                outsider.recv(1)
+            outsider.close()
+        finally:
+            cluster.stop()